@@ -0,0 +1,187 @@
+import json
+import logging
+import sqlite3
+import threading
+from time import time
+from typing import Dict, Iterable, List, Set
+from urllib.parse import urlsplit, urlunsplit
+
+from src.extractors.RecordWriter import RecordWriter
+
+
+class CrawlState:
+    """Persistent state of a crawl, stored in a SQLite database in WAL mode.
+
+    Every link is stored once under its canonical form together with its status,
+    the number of attempts and the time it was last fetched.
+    Each status change is committed right away, so an interrupted crawl can resume
+    exactly where it stopped.
+
+    The state only tracks the links, the records extracted from them are appended to the
+    journal of the stage file (see RecordWriter) before a link is marked as done. Databases
+    of older crawls also stored the records, see migrate_records.
+
+    Parameters
+    ----------
+    path : str
+        The path to the SQLite database. It is created if it does not exist.
+
+    Attributes
+    ----------
+    links : Set[str]
+        The canonical links of all known pages, used for O(1) membership checks
+    """
+
+    PENDING = 'pending'
+    DONE = 'done'
+    FAILED = 'failed'
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+
+        self.connection = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS pages ('
+            'link TEXT PRIMARY KEY, '
+            'status TEXT NOT NULL, '
+            'attempts INTEGER NOT NULL DEFAULT 0, '
+            'last_fetched REAL, '
+            'error TEXT)')
+
+        self.links: Set[str] = {row[0] for row in self.connection.execute('SELECT link FROM pages')}
+        self.logger.info('Loaded crawl state with {} links from {}'.format(len(self.links), path))
+
+    @staticmethod
+    def canonical(link: str) -> str:
+        """Returns the canonical form of a link: https, lower case host, no query, fragment or trailing slash."""
+
+        parts = urlsplit(link.strip())
+        return urlunsplit(('https', parts.netloc.lower(), parts.path.rstrip('/'), '', ''))
+
+    def __contains__(self, link: str) -> bool:
+        return self.canonical(link) in self.links
+
+    def __len__(self) -> int:
+        return len(self.links)
+
+    def add(self, links: Iterable[str], status: str = PENDING) -> List[str]:
+        """Adds the given links, skipping the ones that are already known.
+
+        Returns
+        -------
+        List[str]
+            The canonical links that were new
+        """
+
+        new_links = []
+        with self.lock:
+            for link in links:
+                link = self.canonical(link)
+                if link not in self.links:
+                    self.links.add(link)
+                    new_links.append(link)
+
+            self.connection.executemany('INSERT OR IGNORE INTO pages (link, status) VALUES (?, ?)',
+                                        [(link, status) for link in new_links])
+        return new_links
+
+    def mark_done(self, link: str) -> None:
+        """Marks a link as done."""
+
+        self.update(link, self.DONE, None)
+
+    def mark_failed(self, link: str, error: str) -> None:
+        """Marks a link as failed and stores the last error."""
+
+        self.update(link, self.FAILED, error)
+
+    def update(self, link: str, status: str, error: str | None) -> None:
+        """Sets the status and the last error of a link and counts the attempt.
+
+        Parameters
+        ----------
+        link : str
+            The link, it is added if it is not known yet
+        status : str
+            The new status: PENDING, DONE or FAILED
+        error : str | None
+            The error of the attempt, None if it succeeded
+        """
+
+        link = self.canonical(link)
+        with self.lock:
+            self.links.add(link)
+            self.connection.execute(
+                'INSERT INTO pages (link, status, attempts, last_fetched, error) VALUES (?, ?, 1, ?, ?) '
+                'ON CONFLICT(link) DO UPDATE SET status = excluded.status, attempts = attempts + 1, '
+                'last_fetched = excluded.last_fetched, error = excluded.error',
+                (link, status, time(), error))
+
+    def pending(self, max_attempts: int = 1) -> List[str]:
+        """Returns the links still to crawl.
+
+        Parameters
+        ----------
+        max_attempts : int
+            Failed links with fewer attempts than this are returned as well
+            default: 1
+
+        Returns
+        -------
+        List[str]
+            The pending links in insertion order, followed by the failed links to retry
+        """
+
+        with self.lock:
+            rows = self.connection.execute(
+                'SELECT link FROM pages WHERE status = ? OR (status = ? AND attempts < ?) ORDER BY status DESC, rowid',
+                (self.PENDING, self.FAILED, max_attempts)).fetchall()
+        return [row[0] for row in rows]
+
+    def migrate_records(self, writer: RecordWriter) -> int:
+        """Moves the records stored in the database of an older crawl to the stage file journal.
+
+        Older crawls kept the record of every done link in a record column. The records are
+        written and checkpointed to the journal first, then the column is dropped.
+
+        Parameters
+        ----------
+        writer : RecordWriter
+            The writer of the stage file
+
+        Returns
+        -------
+        int
+            The number of migrated records
+        """
+
+        with self.lock:
+            columns = [row[1] for row in self.connection.execute('PRAGMA table_info(pages)')]
+            if 'record' not in columns:
+                return 0
+            rows = self.connection.execute('SELECT record FROM pages WHERE status = ? AND record IS NOT NULL '
+                                           'ORDER BY rowid', (self.DONE,)).fetchall()
+
+        for row in rows:
+            writer.write(json.loads(row[0]))
+        writer.checkpoint()
+        with self.lock:
+            self.connection.execute('ALTER TABLE pages DROP COLUMN record')
+        self.logger.info('Migrated {} records from the crawl state to the journal'.format(len(rows)))
+        return len(rows)
+
+    def counts(self) -> Dict[str, int]:
+        """Returns the number of links per status."""
+
+        with self.lock:
+            return dict(self.connection.execute('SELECT status, COUNT(*) FROM pages GROUP BY status').fetchall())
+
+    def close(self) -> None:
+        """Closes the database connection."""
+
+        with self.lock:
+            self.connection.close()
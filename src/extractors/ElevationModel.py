@@ -0,0 +1,253 @@
+import logging
+import os
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+import numpy as np
+import tifffile
+from lxml import etree
+
+from src.extractors import GeoUtil
+
+
+class ElevationTile:
+    """A single GeoTIFF tile of an elevation model.
+
+    Only the georeferencing is read up front, the raster is memory-mapped on first use.
+
+    Parameters
+    ----------
+    path : str
+        The path to the GeoTIFF file
+    """
+
+    def __init__(self, path: str) -> None:
+        self.path = path
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            scale = page.tags['ModelPixelScaleTag'].value
+            tiepoint = page.tags['ModelTiepointTag'].value
+            nodata = page.tags.get('GDAL_NODATA')
+            self.rows, self.cols = page.shape[:2]
+
+        self.pixel_width = float(scale[0])
+        self.pixel_height = float(scale[1])
+        # the tie point maps the raster position (i, j) to the model position (x, y)
+        self.xmin = float(tiepoint[3]) - float(tiepoint[0]) * self.pixel_width
+        self.ymax = float(tiepoint[4]) + float(tiepoint[1]) * self.pixel_height
+        self.xmax = self.xmin + self.cols * self.pixel_width
+        self.ymin = self.ymax - self.rows * self.pixel_height
+        self.nodata = float(nodata.value.strip('\x00')) if nodata is not None else None
+
+    def open(self) -> np.ndarray:
+        """Returns the raster, memory-mapped if the file is uncompressed and contiguous."""
+
+        try:
+            return tifffile.memmap(self.path, mode='r')
+        except ValueError:
+            # compressed or tiled rasters cannot be mapped, a single tile fits into memory
+            logging.getLogger(__name__).debug('Could not memory-map %s, reading it instead', self.path)
+            return tifffile.imread(self.path)
+
+    def sample(self, raster: np.ndarray, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Interpolates the raster bilinearly between the four pixel centers around each point.
+
+        Points closer to the edge of the tile than half a pixel use the nearest edge pixels.
+
+        Parameters
+        ----------
+        raster : np.ndarray
+            The raster of the tile, see open
+        x : np.ndarray
+            The eastings of the points, in the CRS of the tile
+        y : np.ndarray
+            The northings of the points, in the CRS of the tile
+        """
+
+        col = np.clip((x - self.xmin) / self.pixel_width - 0.5, 0, self.cols - 1)
+        row = np.clip((self.ymax - y) / self.pixel_height - 0.5, 0, self.rows - 1)
+        col0 = np.minimum(np.floor(col).astype(np.intp), self.cols - 2) if self.cols > 1 else np.zeros_like(col, np.intp)
+        row0 = np.minimum(np.floor(row).astype(np.intp), self.rows - 2) if self.rows > 1 else np.zeros_like(row, np.intp)
+        col1 = np.minimum(col0 + 1, self.cols - 1)
+        row1 = np.minimum(row0 + 1, self.rows - 1)
+        dx = col - col0
+        dy = row - row0
+
+        corners = [raster[r, c].astype(float) for r, c in ((row0, col0), (row0, col1), (row1, col0), (row1, col1))]
+        if self.nodata is not None:
+            for corner in corners:
+                corner[corner == self.nodata] = np.nan
+
+        top = corners[0] * (1 - dx) + corners[1] * dx
+        bottom = corners[2] * (1 - dx) + corners[3] * dx
+        return top * (1 - dy) + bottom * dy
+
+
+class ElevationModel:
+    """A digital elevation model made of GeoTIFF tiles on a regular grid, e.g. swissALTI3D.
+
+    The tiles are indexed by their position in the grid, so the tile of every point is found
+    without scanning all tiles. Rasters are memory-mapped and only the most recently used
+    ``max_open`` tiles are kept open, so millions of points can be sampled without loading
+    the whole model into memory.
+
+    Parameters
+    ----------
+    folder : str
+        The folder with the GeoTIFF tiles, all in the same CRS and of the same size,
+        with offsets that are multiples of the tile size
+    crs : str (optional)
+        The CRS of the tiles
+        default: 'epsg:2056' (Swiss LV95)
+    max_open : int (optional)
+        The number of tiles kept open
+        default: 64
+    """
+
+    chunk_size = 1000000
+
+    def __init__(self, folder: str, crs: str = GeoUtil.lv95, max_open: int = 64) -> None:
+        self.folder = folder
+        self.crs = crs
+        self.max_open = max_open
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.rasters: OrderedDict[Tuple[int, int], np.ndarray] = OrderedDict()
+
+        self.tiles: Dict[Tuple[int, int], ElevationTile] = {}
+        paths = [os.path.join(folder, f) for f in sorted(os.listdir(folder)) if f.lower().endswith(('.tif', '.tiff'))]
+        tiles: List[ElevationTile] = [ElevationTile(path) for path in paths]
+        if not tiles:
+            raise ValueError('No GeoTIFF tiles in {}'.format(folder))
+
+        self.tile_width = tiles[0].xmax - tiles[0].xmin
+        self.tile_height = tiles[0].ymax - tiles[0].ymin
+        for tile in tiles:
+            self.check(tile)
+            key = self.key(tile.xmin + self.tile_width / 2, tile.ymin + self.tile_height / 2)
+            if key in self.tiles:
+                raise ValueError('Tiles {} and {} cover the same area'.format(self.tiles[key].path, tile.path))
+            self.tiles[key] = tile
+        self.logger.info('Indexed {} elevation tiles in {}'.format(len(self.tiles), folder))
+
+    def check(self, tile: ElevationTile) -> None:
+        """Makes sure the tile lies on the grid of the model, the tile keys are computed from the coordinates.
+
+        Raises
+        ------
+        ValueError
+            If the tile differs in size from the other tiles or its offset is not a multiple of the tile size
+        """
+
+        width = tile.xmax - tile.xmin
+        height = tile.ymax - tile.ymin
+        if not (np.isclose(width, self.tile_width) and np.isclose(height, self.tile_height)):
+            raise ValueError('Tile {} is {} x {}, the other tiles are {} x {}'.format(
+                tile.path, width, height, self.tile_width, self.tile_height))
+
+        columns = tile.xmin / self.tile_width
+        rows = tile.ymin / self.tile_height
+        if not (np.isclose(columns, round(columns), rtol=0, atol=1e-6)
+                and np.isclose(rows, round(rows), rtol=0, atol=1e-6)):
+            raise ValueError('Tile {} at ({}, {}) is not aligned to the grid of {} x {} tiles'.format(
+                tile.path, tile.xmin, tile.ymin, self.tile_width, self.tile_height))
+
+    def key(self, x: float, y: float) -> Tuple[int, int]:
+        return int(np.floor(x / self.tile_width)), int(np.floor(y / self.tile_height))
+
+    def raster(self, key: Tuple[int, int]) -> np.ndarray:
+        with self.lock:
+            raster = self.rasters.get(key)
+            if raster is not None:
+                self.rasters.move_to_end(key)
+                return raster
+
+            raster = self.tiles[key].open()
+            self.rasters[key] = raster
+            if len(self.rasters) > self.max_open:
+                self.rasters.popitem(last=False)
+            return raster
+
+    def sample(self, x: np.ndarray, y: np.ndarray) -> np.ndarray:
+        """Returns the elevation of the given points.
+
+        Parameters
+        ----------
+        x : np.ndarray
+            The eastings of the points, in the CRS of the model
+        y : np.ndarray
+            The northings of the points, in the CRS of the model
+
+        Returns
+        -------
+        np.ndarray
+            The bilinearly interpolated elevation, NaN for points outside the model or on nodata pixels
+        """
+
+        x = np.asarray(x, dtype=float)
+        y = np.asarray(y, dtype=float)
+        elevation = np.full(len(x), np.nan)
+
+        for start in range(0, len(x), self.chunk_size):
+            cx = x[start:start + self.chunk_size]
+            cy = y[start:start + self.chunk_size]
+            kx = np.floor(cx / self.tile_width).astype(np.int64)
+            ky = np.floor(cy / self.tile_height).astype(np.int64)
+
+            # sort the points by tile, so every tile is touched once per chunk
+            order = np.lexsort((ky, kx))
+            bounds = np.flatnonzero((np.diff(kx[order]) != 0) | (np.diff(ky[order]) != 0)) + 1
+            for group in np.split(order, bounds):
+                if len(group) == 0:
+                    continue
+                key = (int(kx[group[0]]), int(ky[group[0]]))
+                tile = self.tiles.get(key)
+                if tile is not None:
+                    elevation[start + group] = tile.sample(self.raster(key), cx[group], cy[group])
+        return elevation
+
+    def sample_wgs84(self, lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+        """Returns the elevation of points given in WGS84 latitude and longitude, see sample."""
+
+        x, y = GeoUtil.get_transformer(GeoUtil.wgs84, self.crs).transform(np.asarray(lat), np.asarray(lon))
+        return self.sample(x, y)
+
+    def enrich_gpx(self, path: str) -> int:
+        """Fills in the elevation of all track points of a GPX file from the model, replacing existing values.
+
+        Parameters
+        ----------
+        path : str
+            The path to the GPX file, it is rewritten in place
+
+        Returns
+        -------
+        int
+            The number of track points that got their elevation from the model
+        """
+
+        tree = etree.parse(path)
+        points = list(tree.getroot().iterfind('.//{*}trkpt'))
+        if not points:
+            return 0
+
+        lat = np.array([p.get('lat') for p in points], dtype=float)
+        lon = np.array([p.get('lon') for p in points], dtype=float)
+        elevation = self.sample_wgs84(lat, lon)
+
+        for point, value in zip(points, elevation.tolist()):
+            if np.isnan(value):
+                # outside the model, an existing elevation is kept
+                continue
+            ele = point.find('{*}ele')
+            if ele is None:
+                # ele is the first child of a track point in the GPX schema
+                ele = etree.Element(etree.QName(point, 'ele'))
+                point.insert(0, ele)
+            ele.text = '{:.1f}'.format(value)
+
+        tmp_path = path + '.tmp'
+        tree.write(tmp_path, xml_declaration=True, encoding='UTF-8')
+        os.replace(tmp_path, path)
+        return int(np.count_nonzero(~np.isnan(elevation)))
@@ -0,0 +1,120 @@
+import logging
+from functools import lru_cache
+from time import perf_counter
+from typing import Dict, List, Sequence
+
+import numpy as np
+from pyproj import Transformer
+
+logger = logging.getLogger(__name__)
+
+lv95 = 'epsg:2056'
+wgs84 = 'epsg:4326'
+
+
+@lru_cache(maxsize=None)
+def get_transformer(source: str = lv95, target: str = wgs84) -> Transformer:
+    """Returns the transformer between the given coordinate reference systems, created once per process.
+
+    Parameters
+    ----------
+    source : str
+        The source CRS
+        default: 'epsg:2056' (Swiss LV95)
+    target : str
+        The target CRS
+        default: 'epsg:4326' (WGS84)
+    """
+    logger.info('Creating transformer from %s to %s', source, target)
+    return Transformer.from_crs(source, target)
+
+
+def lv95_to_wgs84(coordinates: Sequence[Sequence[float]]) -> np.ndarray:
+    """Reprojects LV95 coordinates to WGS84 in a single pyproj call.
+
+    Parameters
+    ----------
+    coordinates : Sequence[Sequence[float]]
+        The (easting, northing) pairs, further dimensions such as the altitude are ignored
+
+    Returns
+    -------
+    np.ndarray
+        An array of shape (n, 2) with the latitude and longitude of each point
+    """
+    points = np.asarray(coordinates, dtype=float)
+    if points.size == 0:
+        return np.empty((0, 2))
+
+    lat, lon = get_transformer().transform(points[:, 0], points[:, 1])
+    return np.column_stack((lat, lon))
+
+
+def lv95_to_wgs84_many(geometries: Sequence[Sequence[Sequence[float]]]) -> List[np.ndarray]:
+    """Reprojects the coordinates of many geometries at once.
+
+    All coordinates are concatenated into one array and reprojected in a single call,
+    then split again at the offsets of the geometries.
+
+    Parameters
+    ----------
+    geometries : Sequence[Sequence[Sequence[float]]]
+        The coordinate lists of the geometries, e.g. the segments of many routes
+
+    Returns
+    -------
+    List[np.ndarray]
+        The latitude and longitude arrays of the geometries, in the same order
+    """
+    lengths = [len(geometry) for geometry in geometries]
+    if sum(lengths) == 0:
+        return [np.empty((0, 2)) for _ in geometries]
+
+    points = np.concatenate([np.asarray(g, dtype=float)[:, :2] for g in geometries if len(g)])
+    offsets = np.cumsum(lengths)[:-1]
+    return np.split(lv95_to_wgs84(points), offsets)
+
+
+def benchmark_reprojection(n_points: int = 100000, seed: int = 0) -> Dict[str, float]:
+    """Compares the per-point reprojection with the vectorized one on random LV95 coordinates.
+
+    Parameters
+    ----------
+    n_points : int
+        The number of coordinates
+        default: 100000
+    seed : int
+        The seed of the random coordinates
+        default: 0
+
+    Returns
+    -------
+    Dict[str, float]
+        per_point_seconds, vectorized_seconds, speedup and the largest difference in degrees
+    """
+    rng = np.random.default_rng(seed)
+    coordinates = np.column_stack((rng.uniform(2485000, 2834000, n_points),
+                                   rng.uniform(1075000, 1296000, n_points))).tolist()
+    transformer = get_transformer()
+
+    start = perf_counter()
+    per_point = [transformer.transform(*xy) for xy in coordinates]
+    per_point_seconds = perf_counter() - start
+
+    start = perf_counter()
+    vectorized = lv95_to_wgs84(coordinates)
+    vectorized_seconds = perf_counter() - start
+
+    stats = {
+        'per_point_seconds': round(per_point_seconds, 4),
+        'vectorized_seconds': round(vectorized_seconds, 4),
+        'speedup': round(per_point_seconds / vectorized_seconds, 1),
+        'max_difference': float(np.abs(np.asarray(per_point) - vectorized).max()),
+    }
+    logger.info('Reprojected %s points: %s', n_points, stats)
+    return stats
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(benchmark_reprojection())
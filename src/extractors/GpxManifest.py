@@ -0,0 +1,150 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import threading
+from typing import Any, Dict
+
+
+class GpxManifest:
+    """An index of the GPX files in a download folder, stored as ``manifest.json`` in the folder.
+
+    The manifest maps the tour id of every downloaded GPX file to its file name, size,
+    content hash and tour link. It is built from the folder once and then updated on each download,
+    so checking whether a tour was already downloaded is a dictionary lookup.
+    A loaded manifest is verified against the folder, see verify.
+
+    Files without a tour id in their name (e.g. downloaded by the browser) are indexed by their title.
+
+    Parameters
+    ----------
+    folder : str
+        The GPX download folder
+    save_every : int (optional)
+        The number of additions after which the manifest is written to disk
+        default: 50
+
+    Attributes
+    ----------
+    entries : Dict[str, Dict[str, Any]]
+        The manifest entries by tour id
+    titles : Dict[str, str]
+        The files without a tour id in their name by title
+    """
+
+    file_name = 'manifest.json'
+    tour_id_pattern = re.compile(r'-(\d+)\.gpx$')
+
+    def __init__(self, folder: str, save_every: int = 50) -> None:
+        self.folder = folder
+        self.path = os.path.join(folder, self.file_name)
+        self.save_every = save_every
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.unsaved = 0
+
+        self.entries: Dict[str, Dict[str, Any]] = {}
+        self.titles: Dict[str, str] = {}
+        if os.path.exists(self.path):
+            with open(self.path, encoding='utf-8') as f:
+                manifest = json.load(f)
+            self.entries = manifest['entries']
+            self.titles = manifest['titles']
+            self.logger.info('Loaded GPX manifest with {} files'.format(len(self.entries) + len(self.titles)))
+            self.verify()
+        else:
+            self.build()
+
+    def build(self) -> None:
+        """Indexes all GPX files in the folder and saves the manifest."""
+
+        self.logger.info('Building GPX manifest of {}'.format(self.folder))
+        for file_name in os.listdir(self.folder):
+            if not file_name.endswith('.gpx'):
+                continue
+
+            match = self.tour_id_pattern.search(file_name)
+            if match is None:
+                self.titles[file_name[:-len('.gpx')]] = file_name
+                continue
+
+            with open(os.path.join(self.folder, file_name), 'rb') as f:
+                content = f.read()
+            self.entries[match.group(1)] = self.entry(file_name, content, None)
+
+        self.save()
+        self.logger.info('Built GPX manifest with {} files'.format(len(self.entries) + len(self.titles)))
+
+    def verify(self) -> int:
+        """Drops the entries whose file was deleted or changed since it was downloaded, so it is downloaded again.
+
+        Returns
+        -------
+        int
+            The number of dropped entries
+        """
+
+        stale = []
+        for tour_id, entry in self.entries.items():
+            path = os.path.join(self.folder, entry['file'])
+            # the size is checked first, so only files of the same size are hashed
+            if not os.path.isfile(path) or os.path.getsize(path) != entry['size']:
+                stale.append(tour_id)
+                continue
+            with open(path, 'rb') as f:
+                if hashlib.sha256(f.read()).hexdigest() != entry['sha256']:
+                    stale.append(tour_id)
+        for tour_id in stale:
+            self.logger.warning('GPX file {} is missing or changed, dropping it from the manifest'.format(
+                self.entries.pop(tour_id)['file']))
+
+        missing_titles = [title for title, file_name in self.titles.items()
+                          if not os.path.isfile(os.path.join(self.folder, file_name))]
+        for title in missing_titles:
+            del self.titles[title]
+
+        dropped = len(stale) + len(missing_titles)
+        if dropped:
+            self.save()
+            self.logger.info('Dropped {} missing or changed files from the GPX manifest'.format(dropped))
+        return dropped
+
+    def __contains__(self, tour_id: str) -> bool:
+        return str(tour_id) in self.entries
+
+    def has_title(self, title: str) -> bool:
+        """Returns True if a file without tour id was downloaded for the given title."""
+
+        return title in self.titles
+
+    def add(self, tour_id: str, link: str, file_name: str, content: bytes) -> None:
+        """Adds a downloaded file to the manifest, saving it every ``save_every`` additions."""
+
+        with self.lock:
+            self.entries[str(tour_id)] = self.entry(file_name, content, link)
+            self.unsaved += 1
+            if self.unsaved >= self.save_every:
+                self.write()
+
+    def save(self) -> None:
+        """Writes the manifest to disk."""
+
+        with self.lock:
+            self.write()
+
+    def write(self) -> None:
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'entries': self.entries, 'titles': self.titles}, f, indent=1, ensure_ascii=False)
+        os.replace(tmp_path, self.path)
+        self.unsaved = 0
+
+    @staticmethod
+    def entry(file_name: str, content: bytes, link: str | None) -> Dict[str, Any]:
+        return {
+            'file': file_name,
+            'size': len(content),
+            'sha256': hashlib.sha256(content).hexdigest(),
+            'link': link,
+        }
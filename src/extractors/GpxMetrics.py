@@ -0,0 +1,199 @@
+import logging
+import os
+import re
+from typing import Dict, Tuple
+
+import numpy as np
+import pandas as pd
+from lxml import etree
+
+logger = logging.getLogger(__name__)
+
+earth_radius_m = 6371008.8
+metric_columns = ['distance', 'up', 'down', 'min', 'max']
+tour_id_pattern = re.compile(r'(\d+)')
+
+
+def read_gpx_points(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """Reads the track points of a GPX file.
+
+    Parameters
+    ----------
+    path : str
+        The path to the GPX file
+
+    Returns
+    -------
+    Tuple[np.ndarray, np.ndarray, np.ndarray]
+        The latitude, longitude and elevation of all track points, NaN for points without elevation
+    """
+    points = etree.parse(path).getroot().iterfind('.//{*}trkpt')
+    rows = [(p.get('lat'), p.get('lon'), p.findtext('{*}ele') or 'nan') for p in points]
+    if not rows:
+        empty = np.empty(0)
+        return empty, empty, empty
+
+    lat, lon, ele = np.array(rows, dtype=float).T
+    return lat, lon, ele
+
+
+def haversine_distances(lat: np.ndarray, lon: np.ndarray) -> np.ndarray:
+    """Returns the great-circle distances in meters between consecutive points.
+
+    Parameters
+    ----------
+    lat : np.ndarray
+        The latitudes in degrees
+    lon : np.ndarray
+        The longitudes in degrees
+    """
+    lat = np.radians(lat)
+    lon = np.radians(lon)
+    a = np.sin(np.diff(lat) / 2) ** 2 + np.cos(lat[:-1]) * np.cos(lat[1:]) * np.sin(np.diff(lon) / 2) ** 2
+    return 2 * earth_radius_m * np.arcsin(np.sqrt(a))
+
+
+def smooth(values: np.ndarray, window: int = 5) -> np.ndarray:
+    """Smooths the values with a centered moving average, repeating the first and last value at the edges.
+
+    Parameters
+    ----------
+    values : np.ndarray
+        The values, e.g. the elevation of the track points
+    window : int
+        The number of points averaged, 1 disables the smoothing
+        default: 5
+    """
+    if window <= 1 or len(values) < 2:
+        return values
+
+    half = window // 2
+    padded = np.concatenate((np.full(half, values[0]), values, np.full(window - 1 - half, values[-1])))
+    return np.convolve(padded, np.ones(window) / window, mode='valid')
+
+
+def track_metrics(lat: np.ndarray, lon: np.ndarray, ele: np.ndarray, window: int = 5) -> Dict[str, float]:
+    """Computes the distance and the elevation metrics of a track.
+
+    Ascent and descent are summed over the smoothed elevation profile, so the noise of
+    the elevation data does not add up. Minimum and maximum are taken from the raw elevation.
+
+    Parameters
+    ----------
+    lat : np.ndarray
+        The latitudes in degrees
+    lon : np.ndarray
+        The longitudes in degrees
+    ele : np.ndarray
+        The elevations in meters, NaN for missing values
+    window : int
+        The smoothing window of the elevation profile in points
+        default: 5
+
+    Returns
+    -------
+    Dict[str, float]
+        distance (km), up, down, min and max (m). The elevation metrics are NaN if the track has no elevation.
+    """
+    metrics = {column: np.nan for column in metric_columns}
+    if len(lat) == 0:
+        return metrics
+
+    metrics['distance'] = haversine_distances(lat, lon).sum() / 1000
+
+    known = ~np.isnan(ele)
+    if known.any():
+        # fill single missing elevations from their neighbours before smoothing
+        index = np.arange(len(ele))
+        profile = smooth(np.interp(index, index[known], ele[known]), window)
+        steps = np.diff(profile)
+        metrics['up'] = steps[steps > 0].sum()
+        metrics['down'] = -steps[steps < 0].sum()
+        metrics['min'] = ele[known].min()
+        metrics['max'] = ele[known].max()
+    return metrics
+
+
+def format_metrics(metrics: Dict[str, float]) -> Dict[str, str]:
+    """Formats the metrics the way map.schweizmobil.ch shows them, e.g. '5.29 km' and "1'210 m"."""
+
+    formatted = {}
+    for column, value in metrics.items():
+        if np.isnan(value):
+            formatted[column] = 'na'
+        elif column == 'distance':
+            formatted[column] = '{:.2f} km'.format(value)
+        else:
+            formatted[column] = '{:,} m'.format(int(round(value))).replace(',', "'")
+    return formatted
+
+
+def parse_quantities(values: pd.Series) -> pd.Series:
+    """Parses formatted quantities such as "1'210 m" or '5.29 km' to floats, NaN for 'na'."""
+
+    numbers = values.astype(str).str.replace("'", '', regex=False).str.extract(r'(-?\d+(?:\.\d+)?)')[0]
+    return numbers.astype(float)
+
+
+def compute_distance_data(folder: str, window: int = 5) -> pd.DataFrame:
+    """Computes the metrics of all GPX files in a folder.
+
+    Parameters
+    ----------
+    folder : str
+        The folder with the GPX files, the tour id is the first number in the file name
+    window : int
+        The smoothing window of the elevation profile in points
+        default: 5
+
+    Returns
+    -------
+    pd.DataFrame
+        The columns id, distance, up, down, min and max, formatted like Distance_data_without_index0.csv
+    """
+    rows = []
+    for file_name in sorted(os.listdir(folder)):
+        match = tour_id_pattern.search(file_name)
+        if not file_name.endswith('.gpx') or match is None:
+            continue
+
+        try:
+            metrics = track_metrics(*read_gpx_points(os.path.join(folder, file_name)), window=window)
+        except etree.XMLSyntaxError as e:
+            logger.warning('Could not read %s: %s', file_name, e)
+            metrics = {column: np.nan for column in metric_columns}
+        rows.append({'id': match.group(1), **format_metrics(metrics)})
+
+    logger.info('Computed the metrics of %s GPX files', len(rows))
+    return pd.DataFrame(rows, columns=['id'] + metric_columns)
+
+
+def parity_report(computed: pd.DataFrame, reference: pd.DataFrame) -> pd.DataFrame:
+    """Compares computed metrics with reference values, e.g. the ones scraped from map.schweizmobil.ch.
+
+    Parameters
+    ----------
+    computed : pd.DataFrame
+        The computed metrics, see compute_distance_data
+    reference : pd.DataFrame
+        The reference metrics with the same columns
+
+    Returns
+    -------
+    pd.DataFrame
+        Per tour id, the computed value, the reference value and the relative difference of each metric
+    """
+    merged = computed.astype({'id': str}).merge(reference.astype({'id': str}), on='id', how='inner',
+                                                  suffixes=('_local', '_reference'))
+    report = pd.DataFrame({'id': merged['id']})
+    for column in metric_columns:
+        local = parse_quantities(merged[column + '_local'])
+        scraped = parse_quantities(merged[column + '_reference'])
+        report[column + '_local'] = local
+        report[column + '_reference'] = scraped
+        report[column + '_rel_diff'] = (local - scraped) / scraped.where(scraped != 0)
+
+        rel_diff = report[column + '_rel_diff'].abs()
+        logger.info('Parity of %s: %s tours compared, median relative difference %.3f, %s within 5%%',
+                    column, rel_diff.count(), rel_diff.median(), (rel_diff <= 0.05).sum())
+    return report
@@ -0,0 +1,70 @@
+import logging
+
+import requests
+from requests.adapters import HTTPAdapter
+from selenium.webdriver.remote.webdriver import WebDriver
+from urllib3.util.retry import Retry
+
+logger = logging.getLogger(__name__)
+
+user_agent = 'Mozilla/5.0 (X11; Linux x86_64) AppleWebKit/537.36 (KHTML, like Gecko) Chrome/120.0 Safari/537.36'
+
+
+def create_session(pool_size: int = 10, retries: int = 2) -> requests.Session:
+    """Creates a requests session with a keep-alive connection pool.
+
+    Parameters
+    ----------
+    pool_size : int
+        The maximum number of pooled connections per host.
+        Should be at least the number of threads sharing the session.
+        default: 10
+    retries : int
+        The number of retries for failed connections.
+        HTTP error codes are not retried, so they can be reported to a rate limiter.
+        default: 2
+
+    Returns
+    -------
+    requests.Session
+        The initialized session
+    """
+    logger.info('Initializing new HTTP session with a pool of %s connections', pool_size)
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size,
+                          max_retries=Retry(total=retries, backoff_factor=0.5))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'User-Agent': user_agent,
+        'Accept-Encoding': 'gzip, deflate',
+        'Connection': 'keep-alive',
+    })
+    return session
+
+
+def create_session_from_driver(driver: WebDriver, pool_size: int = 10) -> requests.Session:
+    """Creates a pooled session that shares the cookies and user agent of the given driver.
+
+    Only the cookies of the page currently loaded in the driver are visible to Selenium,
+    so the driver should be on the site the session is used for.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver, e.g. after logging in
+    pool_size : int
+        The maximum number of pooled connections per host
+        default: 10
+
+    Returns
+    -------
+    requests.Session
+        The initialized session
+    """
+    session = create_session(pool_size)
+    session.headers['User-Agent'] = driver.execute_script('return navigator.userAgent;')
+    for cookie in driver.get_cookies():
+        session.cookies.set(cookie['name'], cookie['value'], domain=cookie.get('domain'), path=cookie.get('path', '/'))
+    logger.info('Copied %s cookies from the driver into the session', len(driver.get_cookies()))
+    return session
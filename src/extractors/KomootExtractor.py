@@ -1,18 +1,32 @@
+import json
 import logging
 import os
 import re
+import tempfile
+from concurrent.futures import ThreadPoolExecutor
 from itertools import islice
 from time import sleep
 
 import pandas as pd
-from typing import Dict, List
+import requests
+from typing import Any, Callable, Dict, List
 
 from bs4 import BeautifulSoup
+from lxml import html
 from selenium.common import ElementNotInteractableException, NoSuchElementException
 from selenium.webdriver.chrome.webdriver import WebDriver
 from selenium.webdriver.common.by import By
-
-from src.extractors import SeleniumUtil
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.support.wait import WebDriverWait
+
+from src.extractors import HttpUtil, SeleniumUtil
+from src.extractors.CrawlState import CrawlState
+from src.extractors.GpxManifest import GpxManifest
+from src.extractors.PageSnapshot import FieldSelector, PageSnapshot
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.RecordWriter import RecordWriter
+from src.extractors.ResponseCache import ResponseCache
+from src.extractors.RetryQueue import RetryQueue
 from src.model.Komoot.Route import KomootRoute
 import keyring
 
@@ -33,12 +47,28 @@ class KomootExtractor:
         A combination of the base_url and the route url
     login_url : str
         The login url
+    gpx_export_url : str
+        The url template of the GPX export of a tour
     max_retries : int
-        The maximum number of retries for a failed request
-    retry_wait_seconds : int
-        The number of seconds to wait between retries
+        The maximum number of retries for a failed tour page within a crawl run
+    retry_delay_seconds : float
+        The backoff after the first failure of a tour page, doubled with every further failure
+    login_timeout_seconds : int
+        The maximum number of seconds to wait for the login to complete
+    max_attempts : int
+        The number of crawl runs in which a failed route is attempted again
+    stage1_columns : List[str]
+        The columns of the stage 1 csv file
     page_objects : Dict[str, Dict[str, str]]
         A dictionary containing all relevant page objects for the different pages of the website
+    tour_fields : List[FieldSelector]
+        The fields read from the snapshot of a rendered tour page
+    props_pattern : re.Pattern
+        Matches the JSON payload embedded in the initial HTML of a tour page
+    tour_id_pattern : re.Pattern
+        Matches the tour id in a tour url
+    difficulty_labels : Dict[str, str]
+        Maps the difficulty grades of the JSON payload to the labels shown on the tour page
     """
 
     base_url = 'https://www.komoot.com'
@@ -46,8 +76,21 @@ class KomootExtractor:
     region_url = base_url + '/guide'
     route_url = base_url + '/smarttour'
     login_url = 'https://account.komoot.com/signin'
+    gpx_export_url = base_url + '/api/v007/smart_tours/{tour_id}.gpx'
     max_retries = 3
-    retry_wait_seconds = 5
+    retry_delay_seconds = 5
+    login_timeout_seconds = 60
+    max_attempts = 3
+    stage1_columns = ['link', 'title', 'difficulty', 'distance', 'elevation_up', 'elevation_down', 'duration', 'speed',
+                      'gpx_file']
+
+    props_pattern = re.compile(r'kmtBoot\.setProps\(("(?:[^"\\]|\\.)*")\)')
+    tour_id_pattern = re.compile(r'/smarttour/\D*(\d+)')
+    difficulty_labels = {
+        'easy': 'Easy',
+        'moderate': 'Intermediate',
+        'difficult': 'Expert',
+    }
 
     page_objects = {
         'discover': {
@@ -83,76 +126,321 @@ class KomootExtractor:
         }
     }
 
-    def __init__(self, driver: WebDriver, output_path: str, gpx_download_path: str) -> None:
+    tour_fields = [
+        FieldSelector('title', xpath=page_objects['tour']['title_lbl']),
+        FieldSelector('difficulty', xpath=page_objects['tour']['difficulty_lbl']),
+        FieldSelector('distance', xpath=page_objects['tour']['distance_lbl']),
+        FieldSelector('elevation_up', xpath=page_objects['tour']['elevation_up_lbl']),
+        FieldSelector('elevation_down', xpath=page_objects['tour']['elevation_down_lbl']),
+        FieldSelector('duration', xpath=page_objects['tour']['duration_lbl']),
+        FieldSelector('speed', xpath=page_objects['tour']['speed_lbl']),
+    ]
+
+    def __init__(self, driver: WebDriver, output_path: str, gpx_download_path: str, workers: int = 1,
+                 requests_per_minute: float = 12, rate_limiter: RateLimiter | None = None,
+                 http_session: requests.Session | None = None, state_path: str | None = None,
+                 snapshot_path: str | None = None, cache: ResponseCache | None = None,
+                 driver_factory: Callable[[], WebDriver] = SeleniumUtil.initialize_new_instance) -> None:
         """
         Parameters
         ----------
         driver : WebDriver
             The Selenium WebDriver used to interact with the browser
+        output_path : str
+            The path to the stage 1 csv file
+        gpx_download_path : str
+            The path to the folder the GPX files are downloaded to
+        workers : int (optional)
+            The number of concurrent WebDriver workers used to extract the tour pages.
+            The given driver is used by the first worker, all others get their own driver.
+            default: 1
+        requests_per_minute : float (optional)
+            The initial rate of the rate limiter shared by all workers
+            default: 12
+        rate_limiter : RateLimiter (optional)
+            The rate limiter used to pace all requests, e.g. to share it with other extractors
+            default: a new RateLimiter starting at requests_per_minute
+        http_session : requests.Session (optional)
+            If given, the tour pages are fetched over this session and parsed from their embedded JSON payload
+            instead of being rendered in the browser. The driver is then only used for the discover and region pages.
+            default: None
+        state_path : str (optional)
+            The path to the SQLite database holding the crawl state
+            default: the output_path with the extension .sqlite
+        snapshot_path : str (optional)
+            If given, the snapshots of the rendered tour pages are saved to this folder to replay them offline
+            default: None
+        cache : ResponseCache (optional)
+            If given, region and tour pages fetched within the TTL of their page type are read from this cache
+            and tour pages fetched over the http_session are revalidated with conditional requests
+            default: None
+        driver_factory : Callable[[], WebDriver] (optional)
+            Creates the drivers of the additional workers
+            default: SeleniumUtil.initialize_new_instance
         """
         self.driver = driver
         self.driver.implicitly_wait(15)
         self.output_path = output_path
         self.gpx_download_path = gpx_download_path
+        self.workers = max(1, workers)
+        self.rate_limiter = rate_limiter or RateLimiter(requests_per_minute / 60)
+        self.http_session = http_session
+        self.state_path = state_path or os.path.splitext(output_path)[0] + '.sqlite'
+        self.snapshot_path = snapshot_path
+        self.cache = cache
+        self.driver_factory = driver_factory
         self.logger = logging.getLogger(__name__)
 
     def extract(self) -> None:
-        """Extracts all relevant data from the Komoot website."""
+        """Extracts all relevant data from the Komoot website.
+
+        The route urls of all regions are collected first, then the tour pages are extracted
+        by ``workers`` concurrent drivers (or HTTP workers, if a http_session is set) pulling from a shared queue.
+        Every extracted route is appended to the stage 1 journal and committed to the crawl state
+        right away, so an interrupted extraction resumes with the routes that are still pending.
+        At the end, the journal is compacted into the stage 1 csv file.
+        """
 
         self.logger.info('Starting Komoot extraction...')
-        regions = self.extract_ch_regions()
+        state = CrawlState(self.state_path)
+        # every route is flushed right away, so it is on disk before it is marked as done in the crawl state
+        writer = RecordWriter(self.output_path, self.stage1_columns, key='link', batch_size=1)
+        try:
+            self.extract_with_state(state, writer)
+        finally:
+            writer.close()
+            state.close()
 
-        existing = self.read_existing_data()
+        self.logger.info('Saving Komoot data...')
+        count = writer.compact()
+        self.logger.info('Saved {} routes to csv file.'.format(count))
 
-        routes: List[KomootRoute] = existing
+    def extract_with_state(self, state: CrawlState, writer: RecordWriter) -> None:
+        """Extracts all routes not yet done in the given crawl state.
 
-        # split regions dictionary into chunks of 20
-        for chunk in self.chunks(regions, 20):
-            for region in chunk:
-                for route in self.extract_routes_from_region(region, chunk[region]):
+        Parameters
+        ----------
+        state : CrawlState
+            The crawl state of the extraction
+        writer : RecordWriter
+            The writer the extracted routes are appended to
+        """
 
-                    # check if route is already in existing routes by comparing the link
-                    if route not in [r.link for r in routes]:
-                        routes.append(self.extract_route(route))
-                        sleep(5)  # Sleep 5 seconds to avoid getting rate limited
+        # routes kept in the crawl state by older crawls are moved to the journal
+        state.migrate_records(writer)
+        # routes extracted before the crawl state existed are taken over from the output file
+        state.add([route.link for route in self.read_existing_data()], status=CrawlState.DONE)
 
-            self.logger.info('Saving current state...')
-            self.save(routes)  # Save routes after each chunk to avoid losing data
-            sleep(120)  # Sleep for 120 seconds to avoid getting rate limited
+        regions = self.extract_ch_regions()
+        for region, url in regions.items():
+            # only routes that are not known yet are added as pending
+            state.add(self.extract_routes_from_region(region, url))
 
-        self.logger.info('Finished Komoot extraction.')
+        # failed routes are delayed with backoff while the workers go on with other routes,
+        # routes that keep failing are written to a dead-letter file next to the output file
+        queue = RetryQueue(state.pending(self.max_attempts), max_attempts=self.max_retries + 1,
+                           base_delay=self.retry_delay_seconds,
+                           dead_letter_path=os.path.splitext(self.output_path)[0] + '_failed.csv')
 
-        self.logger.info('Saving Komoot data...')
-        self.save(routes)
-        self.logger.info('Saved Komoot data.')
+        self.logger.info('Extracting {} routes with {} workers...'.format(len(queue), self.workers))
+
+        if self.http_session is not None:
+            drivers: List[WebDriver | None] = [None] * self.workers
+        else:
+            drivers = [self.driver] + [self.new_worker_driver() for _ in range(self.workers - 1)]
+
+        try:
+            with ThreadPoolExecutor(max_workers=len(drivers), thread_name_prefix='komoot-worker') as pool:
+                futures = [pool.submit(self.extract_worker, d, queue, state, writer) for d in drivers]
+                for future in futures:
+                    future.result()
+        finally:
+            for d in drivers[1:]:
+                if d is not None:
+                    SeleniumUtil.close_driver(d)
+
+        self.logger.info('Finished Komoot extraction: {}, {} retries, {} given up'.format(
+            state.counts(), queue.retried, len(queue.dead)))
+        self.rate_limiter.log_stats()
+        if self.cache is not None:
+            self.cache.log_stats()
+
+    def extract_worker(self, driver: WebDriver | None, queue: RetryQueue, state: CrawlState,
+                       writer: RecordWriter) -> None:
+        """Extracts tour pages from the queue until it is empty.
+
+        A failed tour page is handed back to the queue, which schedules it again after a backoff,
+        so the worker never waits for a single page.
+
+        Parameters
+        ----------
+        driver : WebDriver | None
+            The driver owned by this worker, None to fetch the tour pages over the http_session
+        queue : RetryQueue
+            The shared queue of tour urls
+        state : CrawlState
+            The crawl state every route is committed to
+        writer : RecordWriter
+            The writer the extracted routes are appended to
+        """
 
-    def extract_gpx(self) -> None:
-        """ Extracts the GPX files for all routes in the output file.  """
+        try:
+            while (url := queue.get()) is not None:
+                try:
+                    if driver is None:
+                        route = self.extract_route_http(url)
+                    else:
+                        route = self.extract_route(url, driver=driver)
+                    writer.write(route.as_dict())
+                    state.mark_done(url)
+                except Exception as e:
+                    # every url handed out is either done or retried, otherwise the queue would wait for it forever
+                    if not queue.retry(url, str(e)):
+                        state.mark_failed(url, str(e))
+                else:
+                    queue.done(url)
+        except BaseException:
+            # the other workers stop instead of waiting for the urls in flight of this one
+            self.logger.error('Komoot worker died, stopping the extraction')
+            queue.close()
+            raise
+
+    def new_worker_driver(self) -> WebDriver:
+        """Creates the driver for an additional worker."""
+
+        driver = self.driver_factory()
+        driver.implicitly_wait(15)
+        return driver
+
+    def extract_gpx(self, concurrency: int = 4) -> None:
+        """Downloads the GPX files for all routes in the output file.
+
+        Routes already in the GPX manifest of the download folder are skipped. For the remaining ones,
+        the driver logs in once and the GPX exports are fetched over a pooled HTTP session
+        sharing the cookies of the driver, with at most ``concurrency`` downloads in flight.
+
+        Parameters
+        ----------
+        concurrency : int (optional)
+            The maximum number of parallel downloads
+            default: 4
+        """
 
         existing = self.read_existing_data()
+        os.makedirs(self.gpx_download_path, exist_ok=True)
+
+        manifest = GpxManifest(self.gpx_download_path)
+        missing = []
+        skipped = 0
+        for route in existing:
+            try:
+                tour_id = self.get_tour_id(route.link)
+            except ValueError as e:
+                # a single bad link must not stop the downloads of all other routes
+                self.logger.error('Skipping GPX download: {}'.format(e))
+                skipped += 1
+                continue
+            if tour_id not in manifest and not manifest.has_title(route.title):
+                missing.append(route)
+        self.logger.info('{} of {} GPX files already exist.'.format(len(existing) - len(missing) - skipped,
+                                                                     len(existing)))
+        if not missing:
+            return
 
         self.handle_komoot_login()
 
-        existing_gpx_files = os.listdir(self.gpx_download_path)
+        # the driver only exposes the cookies of the current page
+        self.driver.get(self.base_url)
+        session = HttpUtil.create_session_from_driver(self.driver, pool_size=concurrency)
+
+        with ThreadPoolExecutor(max_workers=concurrency, thread_name_prefix='komoot-gpx') as pool:
+            results = list(pool.map(lambda route: self.download_gpx(session, route, manifest), missing))
+        manifest.save()
 
-        for idx, route in enumerate(existing):
-            pattern = re.compile(route.title + "\.gpx$")
-            for filepath in existing_gpx_files:
-                if pattern.match(filepath):
-                    self.logger.info(f'GPX for route {route.title} already exists. Skipping...')
-                    continue
+        self.logger.info('Downloaded {} of {} GPX files.'.format(sum(results), len(missing)))
+        self.rate_limiter.log_stats()
 
-            self.logger.info(f'Downloading GPX for route {route.title}...')
+    def download_gpx(self, session: requests.Session, route: KomootRoute, manifest: GpxManifest) -> bool:
+        """Downloads the GPX export of a route and adds it to the manifest.
 
-            link = route.link.replace('https://www.komoot.com/', 'https://www.komoot.de/')
+        The file is first written to a temporary file and then moved into place,
+        so an interrupted download never leaves a truncated GPX file behind.
+        The temporary file is removed if it cannot be written or moved.
+
+        Parameters
+        ----------
+        session : requests.Session
+            The session of the logged-in user
+        route : KomootRoute
+            The route to download
+        manifest : GpxManifest
+            The manifest of the download folder
 
-            self.driver.get(link)
-            self.driver.find_element(By.XPATH, self.page_objects['tour']['gpx_download_btn']).click()
-            self.logger.info(f'Downloaded GPX for route {route.title}.')
-            sleep(5)  # Sleep 5 seconds to avoid getting rate limited
-            if idx % 40 == 0:
-                self.logger.info('Sleeping for 120 seconds...')
-                sleep(120)
+        Returns
+        -------
+        bool
+            True if the file was downloaded and saved, False if the download or the write failed
+        """
+
+        try:
+            tour_id = self.get_tour_id(route.link)
+        except ValueError as e:
+            self.logger.error(f'Could not download GPX for route {route.title}: {e}')
+            return False
+        file_name = self.get_gpx_file_name(route.title, tour_id)
+        path = os.path.join(self.gpx_download_path, file_name)
+
+        url = self.gpx_export_url.format(tour_id=tour_id)
+        self.logger.info(f'Downloading GPX for route {route.title}...')
+
+        self.rate_limiter.acquire(url)
+        try:
+            response = session.get(url, timeout=60)
+            self.rate_limiter.record(url, response.status_code)
+            response.raise_for_status()
+            if b'<gpx' not in response.content[:1024]:
+                raise ValueError('Response is not a GPX file')
+        except Exception as e:
+            self.logger.error(f'Could not download GPX for route {route.title}: {e}')
+            return False
+
+        tmp_path = None
+        try:
+            with tempfile.NamedTemporaryFile(dir=self.gpx_download_path, suffix='.tmp', delete=False) as f:
+                tmp_path = f.name
+                f.write(response.content)
+            os.replace(tmp_path, path)
+        except OSError as e:
+            # a failed write or move must not leave the temporary file behind
+            if tmp_path is not None and os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            self.logger.error(f'Could not save GPX for route {route.title}: {e}')
+            return False
+        manifest.add(tour_id, route.link, file_name, response.content)
+
+        self.logger.info(f'Downloaded GPX for route {route.title}.')
+        return True
+
+    def get_tour_id(self, link: str) -> str:
+        """Returns the tour id of a tour url.
+
+        Raises
+        ------
+        ValueError
+            If the url does not contain a tour id
+        """
+
+        match = self.tour_id_pattern.search(link)
+        if match is None:
+            raise ValueError('Could not find a tour id in {}'.format(link))
+        return match.group(1)
+
+    @staticmethod
+    def get_gpx_file_name(title: str, tour_id: str) -> str:
+        """Returns the deterministic GPX file name of a route, e.g. 'Mettlenalp loop from Riedbad-1805125.gpx'."""
+
+        title = ' '.join(re.sub(r'[\\/:*?"<>|]+', ' ', title).split())
+        return f'{title}-{tour_id}.gpx'
 
     def extract_ch_regions(self) -> Dict[str, str]:
         """Extracts all Swiss regions from the Komoot discover page. """
@@ -255,12 +543,28 @@ class KomootExtractor:
 
         routes = []
 
-        self.driver.get(url)
+        tours_list_css = self.page_objects['region']['tours_list']
+        snapshot = PageSnapshot.from_cache(self.cache, url, 'region') if self.cache is not None else None
+        if snapshot is not None and not snapshot.document.cssselect(tours_list_css):
+            # a half-rendered page is loaded again instead of being replayed until its TTL expires
+            snapshot = None
+        if snapshot is None:
+            self.rate_limiter.acquire(url)
+            self.driver.get(url)
+            # the tours list is rendered client-side, the eager page load returns before it exists
+            snapshot = PageSnapshot.from_driver(self.driver, ready_css=tours_list_css, url=url)
+            # only complete pages are cached
+            if self.cache is not None and snapshot.document.cssselect(tours_list_css):
+                snapshot.store(self.cache, 'region')
 
-        page_source = self.driver.page_source
+        page_source = snapshot.page_source
         soup = BeautifulSoup(page_source, 'lxml')
 
-        for item in soup.select_one(self.page_objects['region']['tours_list']):
+        tours_list = soup.select_one(tours_list_css)
+        if tours_list is None:
+            raise ValueError('Could not find the tours list on region page {}'.format(url))
+
+        for item in tours_list:
             link = item.find_next('a')
             self.logger.info('Extracted route: {}'.format(link.attrs['href']))
             routes.append(link.attrs['href'])
@@ -268,21 +572,21 @@ class KomootExtractor:
         self.logger.info('Extracted {} routes from region: {}'.format(len(routes), region))
         return routes
 
-    def extract_route(self, url: str, retry_count: int = 0) -> KomootRoute:
+    def extract_route(self, url: str, driver: WebDriver | None = None) -> KomootRoute:
         """Extracts all relevant data from a tour page.
 
         Parameters
         ----------
         url : str
             The url of the tour page
-        retry_count : int (optional)
-            The number of retries
-            default: 0
+        driver : WebDriver (optional)
+            The driver to load the page with
+            default: the driver of the extractor
 
         Raises
         ------
         Exception
-            If the current url does not contain the route url
+            If the current url does not contain the route url or the tour page could not be extracted
         """
 
         # if current url does not contain the route url
@@ -294,34 +598,206 @@ class KomootExtractor:
 
         self.logger.info('Extracting data from tour: {}'.format(url))
 
+        driver = driver or self.driver
+
+        if self.cache is not None:
+            snapshot = PageSnapshot.from_cache(self.cache, url, 'tour')
+            try:
+                if snapshot is not None:
+                    self.logger.info('Read tour from cache: {}'.format(url))
+                    return self.parse_route_snapshot(url, snapshot)
+            except ValueError as e:
+                self.logger.warning('Could not read tour from cache, fetching it again: {}'.format(e))
+
+        self.rate_limiter.acquire(url)
         try:
-            self.driver.get(url)
+            driver.get(url)
 
-            title = self.driver.find_element(By.XPATH, self.page_objects['tour']['title_lbl']).text.strip()
-            difficulty = self.driver.find_element(By.XPATH, self.page_objects['tour']['difficulty_lbl']).text.strip()
-            distance = self.driver.find_element(By.XPATH, self.page_objects['tour']['distance_lbl']).text.strip()
-            elevation_up = self.driver.find_element(By.XPATH,
-                                                    self.page_objects['tour']['elevation_up_lbl']).text.strip()
-            elevation_down = self.driver.find_element(By.XPATH,
-                                                      self.page_objects['tour']['elevation_down_lbl']).text.strip()
-            duration = self.driver.find_element(By.XPATH, self.page_objects['tour']['duration_lbl']).text.strip()
-            speed = self.driver.find_element(By.XPATH, self.page_objects['tour']['speed_lbl']).text.strip()
+            # read all fields from a single snapshot instead of one WebDriver round-trip per field
+            snapshot = PageSnapshot.from_driver(driver, ready_xpath=self.page_objects['tour']['title_lbl'], url=url)
+            if self.snapshot_path is not None:
+                snapshot.save(self.snapshot_path)
+            route = self.parse_route_snapshot(url, snapshot)
+            if self.cache is not None:
+                snapshot.store(self.cache, 'tour')
 
-            self.logger.info('Extracted data from tour: {} -> {}'.format(title, url))
+            self.logger.info('Extracted data from tour: {} -> {}'.format(route.title, url))
+            self.rate_limiter.success(url)
 
-            return KomootRoute(url, title, difficulty, None, distance, elevation_up, elevation_down, duration, speed)
+            return route
         except Exception as e:
             self.logger.error('Could not extract data from tour: {}'.format(url))
             self.logger.error(e)
-            if retry_count < self.max_retries:
-                wait_seconds = self.retry_wait_seconds ** (retry_count + 1)
 
-                self.logger.info('Retrying in {} seconds...'.format(wait_seconds))
-                sleep(wait_seconds)
-                return self.extract_route(url, retry_count + 1)
+            # slow down the whole host, the retry is scheduled by the caller
+            self.rate_limiter.failure(url)
+            raise
+
+    def parse_route_snapshot(self, url: str, snapshot: PageSnapshot) -> KomootRoute:
+        """Builds a route from the snapshot of a rendered tour page.
+
+        Parameters
+        ----------
+        url : str
+            The url of the tour page
+        snapshot : PageSnapshot
+            The snapshot of the tour page, taken from the driver or loaded from disk
+
+        Raises
+        ------
+        ValueError
+            If any of the tour fields is missing
+        """
+
+        record = snapshot.extract(self.tour_fields)
+        if not record.complete:
+            raise ValueError('Missing fields {} on tour page {}'.format(record.misses, url))
+
+        return KomootRoute(url, record['title'], record['difficulty'], None, record['distance'],
+                           record['elevation_up'], record['elevation_down'], record['duration'], record['speed'])
+
+    def extract_route_http(self, url: str) -> KomootRoute:
+        """Extracts all relevant data from a tour page without rendering it in the browser.
+
+        The page is fetched over the http_session and the tour is read from the JSON payload
+        embedded in its initial HTML.
+
+        Parameters
+        ----------
+        url : str
+            The url of the tour page
+
+        Raises
+        ------
+        Exception
+            If the url is not a route url or the tour page could not be extracted
+        """
+
+        if self.route_url not in url:
+            err = 'Could not extract route, as url is not a route url.'
+            self.logger.error(err)
+            raise Exception(err)
+
+        self.logger.info('Fetching tour: {}'.format(url))
+
+        try:
+            if self.cache is not None:
+                # fresh pages are read from disk, stale ones are revalidated with a conditional request
+                response = self.cache.get(self.http_session, url, 'tour', rate_limiter=self.rate_limiter, timeout=30)
             else:
-                self.logger.info('Max retries exceeded. Skipping...')
-                return None
+                self.rate_limiter.acquire(url)
+                response = self.http_session.get(url, timeout=30)
+                self.rate_limiter.record(url, response.status_code)
+            response.raise_for_status()
+
+            route = self.parse_route_page(url, response.text)
+
+            self.logger.info('Extracted data from tour: {} -> {}'.format(route.title, url))
+            return route
+        except Exception as e:
+            self.logger.error('Could not extract data from tour: {}'.format(url))
+            self.logger.error(e)
+            raise
+
+    def parse_route_page(self, url: str, page_source: str) -> KomootRoute:
+        """Builds a route from the JSON payload embedded in the HTML of a tour page.
+
+        The values are formatted the same way the rendered page shows them,
+        so the stage 1 csv does not depend on how a route was extracted.
+
+        Parameters
+        ----------
+        url : str
+            The url of the tour page
+        page_source : str
+            The HTML of the tour page
+
+        Raises
+        ------
+        ValueError
+            If the page does not contain a tour payload
+        """
+
+        tour = self.find_tour(self.read_page_props(page_source))
+        if tour is None:
+            raise ValueError('Could not find the tour in the page payload of {}'.format(url))
+
+        difficulty = tour.get('difficulty') or {}
+        grade = difficulty.get('grade', '') if isinstance(difficulty, dict) else str(difficulty)
+
+        distance_mi = tour['distance'] / 1609.344
+        duration_s = tour['duration']
+        speed_mph = distance_mi / (duration_s / 3600) if duration_s else 0
+
+        return KomootRoute(
+            url,
+            tour['name'].strip(),
+            self.difficulty_labels.get(grade, grade),
+            None,
+            '{} mi'.format(f'{distance_mi:.3g}' if distance_mi < 100 else f'{distance_mi:.0f}'),
+            self.format_elevation(tour['elevation_up']),
+            self.format_elevation(tour['elevation_down']),
+            '{:02d}:{:02d}'.format(int(duration_s // 3600), int(duration_s % 3600 // 60)),
+            '{:.1f} mph'.format(speed_mph),
+        )
+
+    @staticmethod
+    def format_elevation(meters: float) -> str:
+        """Formats an elevation like the tour page, in feet rounded to the nearest 25 ft, e.g. '1,225 ft'."""
+
+        feet = int(meters / 0.3048 / 25 + 0.5) * 25
+        return '{:,} ft'.format(feet)
+
+    def read_page_props(self, page_source: str) -> Dict[str, Any]:
+        """Reads the JSON payload embedded in a komoot page.
+
+        Parameters
+        ----------
+        page_source : str
+            The HTML of the page
+
+        Raises
+        ------
+        ValueError
+            If the page does not contain a payload
+        """
+
+        document = html.fromstring(page_source)
+        for script in document.iter('script'):
+            match = self.props_pattern.search(script.text or '')
+            if match:
+                # the payload is a JSON document inside a JavaScript string literal
+                return json.loads(json.loads(match.group(1)))
+
+        raise ValueError('Page does not contain a kmtBoot payload')
+
+    @classmethod
+    def find_tour(cls, props: Any) -> Dict[str, Any] | None:
+        """Finds the tour object in the page payload.
+
+        Parameters
+        ----------
+        props : Any
+            The page payload or a part of it
+
+        Returns
+        -------
+        Dict[str, Any] | None
+            The first object containing all tour facts, None if there is none
+        """
+
+        if isinstance(props, dict):
+            if {'name', 'distance', 'duration', 'elevation_up', 'elevation_down'} <= props.keys():
+                return props
+            props = props.values()
+        elif not isinstance(props, list):
+            return None
+
+        for value in props:
+            tour = cls.find_tour(value)
+            if tour is not None:
+                return tour
+        return None
 
     def handle_cookie_banner(self, accept: bool = False) -> None:
         """Handles the cookie banner if it appears.
@@ -357,7 +833,9 @@ class KomootExtractor:
         self.driver.find_element(By.XPATH, self.page_objects['login']['continue_btn']).click()
         self.driver.find_element(By.XPATH, self.page_objects['login']['password_input']).send_keys(credentials.password)
         self.driver.find_element(By.XPATH, self.page_objects['login']['login_btn']).click()
-        sleep(20)
+
+        # wait until we are redirected away from the login page
+        WebDriverWait(self.driver, self.login_timeout_seconds).until_not(EC.url_contains(self.login_url))
         self.logger.info('Logged in to Komoot.')
 
     def save(self, routes: List[KomootRoute]) -> None:
@@ -415,3 +893,4 @@ class KomootExtractor:
         it = iter(data)
         for i in range(0, len(data), size):
             yield {k: data[k] for k in islice(it, size)}
+
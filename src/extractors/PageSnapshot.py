@@ -0,0 +1,246 @@
+import hashlib
+import json
+import logging
+import os
+from time import time
+from typing import Any, Callable, Dict, Iterator, List
+
+from lxml import html
+from lxml.cssselect import CSSSelector
+from selenium.webdriver.common.by import By
+from selenium.webdriver.remote.webdriver import WebDriver
+
+from src.extractors.ResponseCache import ResponseCache
+
+logger = logging.getLogger(__name__)
+
+
+class FieldSelector:
+    """Declares how a single field is read from a page snapshot.
+
+    Parameters
+    ----------
+    name : str
+        The name of the field in the record
+    xpath : str (optional)
+        The XPath of the element(s). Either xpath or css is required.
+    css : str (optional)
+        The CSS selector of the element(s)
+    attribute : str (optional)
+        Read this attribute instead of the text of the element
+    multiple : bool (optional)
+        If true, the values of all matches are returned as a list, otherwise the first match is used
+        default: False
+    required : bool (optional)
+        If true, a missing field is reported as a miss
+        default: True
+    parse : Callable[[Any], Any] (optional)
+        Converts the extracted value, e.g. int. A failing conversion is reported as a miss.
+    """
+
+    def __init__(self, name: str, xpath: str | None = None, css: str | None = None, attribute: str | None = None,
+                 multiple: bool = False, required: bool = True, parse: Callable[[Any], Any] | None = None) -> None:
+        if (xpath is None) == (css is None):
+            raise ValueError('Field {} needs either an xpath or a css selector'.format(name))
+
+        self.name = name
+        self.xpath = xpath
+        self.css = CSSSelector(css) if css is not None else None
+        self.attribute = attribute
+        self.multiple = multiple
+        self.required = required
+        self.parse = parse
+
+    def select(self, document: html.HtmlElement) -> List[Any]:
+        """Returns the values of all matches in the document."""
+
+        matches = document.xpath(self.xpath) if self.xpath is not None else self.css(document)
+        values = []
+        for match in matches:
+            if isinstance(match, str):
+                # text() and @attribute XPaths return strings
+                value = match
+            elif self.attribute is not None:
+                value = match.get(self.attribute)
+            else:
+                value = match.text_content()
+
+            if value is not None:
+                value = ' '.join(value.split())
+                if value:
+                    values.append(value)
+        return values
+
+
+class SnapshotRecord:
+    """The fields read from a page snapshot.
+
+    Attributes
+    ----------
+    url : str
+        The url of the page
+    values : Dict[str, Any]
+        The values by field name, None for missing fields
+    misses : List[str]
+        The names of the required fields that could not be read
+    """
+
+    def __init__(self, url: str, values: Dict[str, Any], misses: List[str]) -> None:
+        self.url = url
+        self.values = values
+        self.misses = misses
+
+    def __getitem__(self, name: str) -> Any:
+        return self.values[name]
+
+    def get(self, name: str, default: Any = None) -> Any:
+        value = self.values.get(name)
+        return default if value is None else value
+
+    @property
+    def complete(self) -> bool:
+        """True if all required fields could be read."""
+        return not self.misses
+
+
+class PageSnapshot:
+    """The HTML of a page, taken once from the driver and evaluated in-process with lxml.
+
+    Reading all fields from one snapshot replaces one WebDriver round-trip per field.
+    Snapshots can be saved and loaded again to replay an extraction offline.
+
+    Parameters
+    ----------
+    url : str
+        The url of the page
+    page_source : str
+        The HTML of the page
+    taken_at : float (optional)
+        The unix time the snapshot was taken
+        default: now
+    """
+
+    def __init__(self, url: str, page_source: str, taken_at: float | None = None) -> None:
+        self.url = url
+        self.page_source = page_source
+        self.taken_at = taken_at if taken_at is not None else time()
+        self.document = html.fromstring(page_source)
+
+    @classmethod
+    def from_driver(cls, driver: WebDriver, ready_xpath: str | None = None,
+                    ready_css: str | None = None, url: str | None = None) -> 'PageSnapshot':
+        """Takes a snapshot of the page currently loaded in the driver.
+
+        Parameters
+        ----------
+        driver : WebDriver
+            The Selenium WebDriver used to interact with the browser
+        ready_xpath : str (optional)
+            Waits for this element with the implicit wait of the driver before taking the snapshot,
+            for pages that render their content client-side
+        ready_css : str (optional)
+            Like ready_xpath, but a CSS selector
+        url : str (optional)
+            The requested url, the snapshot is stored and looked up under it. The current url of the driver
+            differs from it after a redirect, an added query string or a locale rewrite
+            default: the current url of the driver
+
+        Raises
+        ------
+        NoSuchElementException
+            If the ready element does not appear
+        """
+        if ready_xpath is not None:
+            driver.find_element(By.XPATH, ready_xpath)
+        if ready_css is not None:
+            driver.find_element(By.CSS_SELECTOR, ready_css)
+        return cls(url or driver.current_url, driver.page_source)
+
+    @classmethod
+    def from_cache(cls, cache: ResponseCache, url: str, page_type: str) -> 'PageSnapshot | None':
+        """Returns the snapshot of the given url if the cache holds a fresh one, otherwise None.
+
+        Parameters
+        ----------
+        cache : ResponseCache
+            The response cache the snapshots are stored in
+        url : str
+            The url of the page
+        page_type : str
+            The page type, selects the TTL of the cache
+        """
+        content = cache.lookup(url, page_type)
+        if content is None:
+            return None
+        return cls(url, content.decode('utf-8'))
+
+    def store(self, cache: ResponseCache, page_type: str) -> None:
+        """Stores the snapshot in the given response cache under its url."""
+        cache.store(self.url, self.page_source.encode('utf-8'), page_type, 'utf-8')
+
+    def extract(self, fields: List[FieldSelector]) -> SnapshotRecord:
+        """Reads the given fields from the snapshot.
+
+        Parameters
+        ----------
+        fields : List[FieldSelector]
+            The fields to read
+
+        Returns
+        -------
+        SnapshotRecord
+            The values of the fields and the required fields that were missed
+        """
+
+        values: Dict[str, Any] = {}
+        misses = []
+        for field in fields:
+            matches = field.select(self.document)
+            value: Any = matches if field.multiple else (matches[0] if matches else None)
+
+            if field.parse is not None and value not in (None, []):
+                try:
+                    value = field.parse(value)
+                except (TypeError, ValueError):
+                    logger.debug('Could not parse field %s of %s: %r', field.name, self.url, value)
+                    value = None
+
+            if value in (None, []) and field.required:
+                misses.append(field.name)
+            values[field.name] = value
+
+        if misses:
+            logger.warning('Missing fields %s on %s', misses, self.url)
+        return SnapshotRecord(self.url, values, misses)
+
+    def file_name(self) -> str:
+        """Returns the file name of the snapshot, derived from its url."""
+        return hashlib.sha1(self.url.encode('utf-8')).hexdigest() + '.json'
+
+    def save(self, folder: str) -> str:
+        """Saves the snapshot to the given folder.
+
+        Returns
+        -------
+        str
+            The path of the saved snapshot
+        """
+        os.makedirs(folder, exist_ok=True)
+        path = os.path.join(folder, self.file_name())
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({'url': self.url, 'taken_at': self.taken_at, 'page_source': self.page_source}, f)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'PageSnapshot':
+        """Loads a saved snapshot."""
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        return cls(data['url'], data['page_source'], data['taken_at'])
+
+    @classmethod
+    def load_all(cls, folder: str) -> Iterator['PageSnapshot']:
+        """Loads all saved snapshots of a folder, e.g. to replay an extraction offline."""
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith('.json'):
+                yield cls.load(os.path.join(folder, file_name))
@@ -0,0 +1,205 @@
+import logging
+import threading
+from time import monotonic, sleep
+from typing import Dict
+from urllib.parse import urlparse
+
+logger = logging.getLogger(__name__)
+
+
+class TokenBucket:
+    """An adaptive token bucket for a single host.
+
+    The refill rate is decreased multiplicatively whenever a request fails
+    (429, 5xx, missing elements, ...) and increased additively while requests succeed.
+
+    Attributes
+    ----------
+    rate : float
+        The current refill rate in requests per second
+    capacity : float
+        The maximum number of tokens, i.e. the largest allowed burst
+    min_rate : float
+        The lower bound for the rate
+    max_rate : float
+        The upper bound for the rate
+    decrease_factor : float
+        The factor the rate is multiplied with on a failure
+    increase_step : float
+        The amount the rate is increased by on a success
+    allowed : int
+        The number of requests that were allowed
+    throttled : int
+        The number of requests that had to wait for a token
+    successes : int
+        The number of requests reported as successful
+    failures : int
+        The number of requests reported as failed
+    """
+
+    def __init__(self, rate: float, capacity: float = 1, min_rate: float | None = None,
+                 max_rate: float | None = None, decrease_factor: float = 0.5, increase_step: float | None = None) -> None:
+        self.rate = rate
+        self.capacity = capacity
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.max_rate = max_rate if max_rate is not None else rate * 4
+        self.decrease_factor = decrease_factor
+        self.increase_step = increase_step if increase_step is not None else rate / 10
+        self.tokens = capacity
+        self.updated = monotonic()
+        self.started: float | None = None
+        self.allowed = 0
+        self.throttled = 0
+        self.successes = 0
+        self.failures = 0
+        self.waited_seconds = 0.0
+        self.lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Blocks until a token is available and takes it.
+
+        Returns
+        -------
+        float
+            The number of seconds waited
+        """
+
+        with self.lock:
+            now = monotonic()
+            self.refill(now)
+            if self.started is None:
+                self.started = now
+
+            # reserve the token right away, so concurrent callers queue up behind each other
+            self.tokens -= 1
+            wait_seconds = -self.tokens / self.rate if self.tokens < 0 else 0.0
+
+            self.allowed += 1
+            if wait_seconds > 0:
+                self.throttled += 1
+                self.waited_seconds += wait_seconds
+
+        if wait_seconds > 0:
+            sleep(wait_seconds)
+        return wait_seconds
+
+    def refill(self, now: float) -> None:
+        """Adds the tokens accumulated since the last update."""
+
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    def success(self) -> None:
+        """Speeds the bucket up after a successful request."""
+
+        with self.lock:
+            self.refill(monotonic())
+            self.rate = min(self.max_rate, self.rate + self.increase_step)
+            self.successes += 1
+
+    def failure(self) -> None:
+        """Slows the bucket down after a failed or throttled request."""
+
+        with self.lock:
+            self.refill(monotonic())
+            self.rate = max(self.min_rate, self.rate * self.decrease_factor)
+            self.failures += 1
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the counters of this bucket.
+
+        Returns
+        -------
+        Dict[str, float]
+            allowed, throttled, successes, failures, waited_seconds, the current rate and the effective rate
+            in requests per second
+        """
+
+        with self.lock:
+            elapsed = monotonic() - self.started if self.started is not None else 0.0
+            return {
+                'allowed': self.allowed,
+                'throttled': self.throttled,
+                'successes': self.successes,
+                'failures': self.failures,
+                'waited_seconds': round(self.waited_seconds, 3),
+                'rate': round(self.rate, 4),
+                'effective_rate': round(self.allowed / elapsed, 4) if elapsed > 0 else 0.0,
+            }
+
+
+class RateLimiter:
+    """Hands out an adaptive token bucket per host.
+
+    Parameters
+    ----------
+    rate : float
+        The initial rate in requests per second for hosts without an override
+        default: 0.5
+    host_rates : Dict[str, float] (optional)
+        Initial rates for specific hosts, e.g. {'www.komoot.com': 0.2}
+    bucket_options
+        Further keyword arguments passed to every TokenBucket
+    """
+
+    retry_status_codes = {429, 500, 502, 503, 504}
+
+    def __init__(self, rate: float = 0.5, host_rates: Dict[str, float] | None = None, **bucket_options) -> None:
+        self.rate = rate
+        self.host_rates = host_rates or {}
+        self.bucket_options = bucket_options
+        self.buckets: Dict[str, TokenBucket] = {}
+        self.lock = threading.Lock()
+
+    def bucket(self, url: str) -> TokenBucket:
+        """Returns the bucket of the host of the given url, creating it if needed."""
+
+        host = urlparse(url).netloc or url
+        with self.lock:
+            if host not in self.buckets:
+                rate = self.host_rates.get(host, self.rate)
+                self.buckets[host] = TokenBucket(rate, **self.bucket_options)
+            return self.buckets[host]
+
+    def acquire(self, url: str) -> float:
+        """Blocks until a request to the host of the given url is allowed.
+
+        Returns
+        -------
+        float
+            The number of seconds waited
+        """
+        return self.bucket(url).acquire()
+
+    def success(self, url: str) -> None:
+        """Reports a successful request to the host of the given url."""
+        self.bucket(url).success()
+
+    def failure(self, url: str) -> None:
+        """Reports a failed request to the host of the given url."""
+        bucket = self.bucket(url)
+        bucket.failure()
+        logger.debug('Slowed down %s to %.3f requests per second', urlparse(url).netloc, bucket.rate)
+
+    def record(self, url: str, status_code: int) -> None:
+        """Reports the status code of a response to the host of the given url.
+
+        429 and 5xx slow the host down, everything else counts as a success.
+        """
+        if status_code in self.retry_status_codes or status_code >= 500:
+            self.failure(url)
+        else:
+            self.success(url)
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        """Returns the counters of all buckets by host."""
+
+        with self.lock:
+            buckets = dict(self.buckets)
+        return {host: bucket.stats() for host, bucket in buckets.items()}
+
+    def log_stats(self) -> None:
+        """Logs the counters of all buckets."""
+
+        for host, stats in self.stats().items():
+            logger.info('Rate limiter %s: %s', host, stats)
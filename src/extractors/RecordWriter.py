@@ -0,0 +1,200 @@
+import csv
+import logging
+import os
+import threading
+from typing import Any, Dict, Iterable, Iterator, List, Set
+
+
+class RecordWriter:
+    """Streams records into an append-only journal next to a csv stage file.
+
+    Records are buffered and appended to ``<path>.part`` in batches, and the journal
+    is fsynced at every checkpoint, so the cost of a checkpoint only depends on the
+    number of new records. At the end, ``compact`` merges the existing stage file
+    and the journal into the final stage file in a single pass.
+
+    An existing journal of an interrupted run is kept and appended to, a record torn by the
+    interruption is cut off first.
+
+    Parameters
+    ----------
+    path : str
+        The path to the final csv stage file
+    fieldnames : List[str]
+        The columns of the csv file
+    key : str (optional)
+        The column identifying a record. When compacting, the last record per key wins.
+        default: None, all records are kept
+    sep : str (optional)
+        The csv separator
+        default: ','
+    batch_size : int (optional)
+        The number of buffered records after which they are appended to the journal
+        default: 50
+    checkpoint_size : int (optional)
+        The number of records after which the journal is fsynced
+        default: 500
+    """
+
+    def __init__(self, path: str, fieldnames: List[str], key: str | None = None, sep: str = ',',
+                 batch_size: int = 50, checkpoint_size: int = 500) -> None:
+        self.path = path
+        self.journal_path = path + '.part'
+        self.fieldnames = fieldnames
+        self.key = key
+        self.sep = sep
+        self.batch_size = batch_size
+        self.checkpoint_size = checkpoint_size
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.buffer: List[Dict[str, Any]] = []
+        self.since_checkpoint = 0
+
+        # keys of the records already in the journal, so an interrupted run can skip them
+        self.keys: Set[str] = set()
+        resume = os.path.exists(self.journal_path) and os.path.getsize(self.journal_path) > 0
+        if resume:
+            resume = self.repair() > 0
+        if resume and key is not None:
+            self.keys = {record[key] for record in self.read(self.journal_path)}
+            self.logger.info('Resuming journal {} with {} records'.format(self.journal_path, len(self.keys)))
+
+        self.file = open(self.journal_path, 'a', newline='', encoding='utf-8')
+        self.writer = csv.DictWriter(self.file, fieldnames=fieldnames, delimiter=sep, extrasaction='ignore')
+        if not resume:
+            self.writer.writeheader()
+
+    def __enter__(self) -> 'RecordWriter':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def __contains__(self, key: Any) -> bool:
+        return str(key) in self.keys
+
+    def write(self, record: Dict[str, Any]) -> None:
+        """Buffers a record, flushing and checkpointing the journal when the batch or checkpoint size is reached."""
+
+        with self.lock:
+            self.buffer.append(record)
+            if self.key is not None:
+                self.keys.add(str(record[self.key]))
+
+            if len(self.buffer) >= self.batch_size:
+                self.flush_buffer()
+            if self.since_checkpoint >= self.checkpoint_size:
+                self.sync()
+
+    def flush(self) -> None:
+        """Appends all buffered records to the journal."""
+
+        with self.lock:
+            self.flush_buffer()
+
+    def checkpoint(self) -> None:
+        """Appends all buffered records to the journal and fsyncs it."""
+
+        with self.lock:
+            self.flush_buffer()
+            self.sync()
+
+    def flush_buffer(self) -> None:
+        if not self.buffer:
+            return
+        self.writer.writerows(self.buffer)
+        self.file.flush()
+        self.since_checkpoint += len(self.buffer)
+        self.buffer = []
+
+    def sync(self) -> None:
+        os.fsync(self.file.fileno())
+        self.since_checkpoint = 0
+
+    def compact(self, order: Iterable[Any] | None = None) -> int:
+        """Merges the existing stage file and the journal into the final stage file.
+
+        The file is written to a temporary file first and then moved into place,
+        so the stage file is never left half written. The journal is removed afterwards.
+
+        Parameters
+        ----------
+        order : Iterable[Any] (optional)
+            The keys in the order their records are written in, records of other keys are dropped.
+            Only for writers with a key.
+            default: None, the records keep the order they were first written in
+
+        Returns
+        -------
+        int
+            The number of records in the final stage file
+        """
+
+        if order is not None and self.key is None:
+            raise ValueError('Records can only be ordered by their key')
+        if not self.file.closed:
+            self.checkpoint()
+        self.close()
+
+        sources = [p for p in (self.path, self.journal_path) if os.path.exists(p)]
+        if self.key is None:
+            records: Any = [record for p in sources for record in self.read(p)]
+        else:
+            # dictionaries keep the insertion order, newer records replace older ones in place
+            records = {}
+            for p in sources:
+                for record in self.read(p):
+                    records[record[self.key]] = record
+            if order is None:
+                records = list(records.values())
+            else:
+                records = [records[key] for key in dict.fromkeys(map(str, order)) if key in records]
+
+        tmp_path = self.path + '.tmp'
+        with open(tmp_path, 'w', newline='', encoding='utf-8') as f:
+            writer = csv.DictWriter(f, fieldnames=self.fieldnames, delimiter=self.sep, extrasaction='ignore')
+            writer.writeheader()
+            writer.writerows(records)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.path)
+        os.remove(self.journal_path)
+
+        self.logger.info('Compacted {} records into {}'.format(len(records), self.path))
+        return len(records)
+
+    def repair(self) -> int:
+        """Cuts the torn last record of an interrupted write off the journal.
+
+        A record is complete at a line break outside of quotes, quotes in values are escaped by doubling them.
+
+        Returns
+        -------
+        int
+            The size of the repaired journal in bytes
+        """
+
+        with open(self.journal_path, 'rb+') as f:
+            content = f.read()
+            end = len(content)
+            while end > 0 and (content[end - 1:end] != b'\n' or content.count(b'"', 0, end) % 2):
+                end = content.rfind(b'\n', 0, end - 1) + 1
+            if end < len(content):
+                self.logger.warning('Cut {} bytes of a torn record off {}'.format(len(content) - end, self.journal_path))
+                f.truncate(end)
+        return end
+
+    def read(self, path: str) -> Iterator[Dict[str, Any]]:
+        """Reads the records of a csv file written with the same separator."""
+
+        with open(path, newline='', encoding='utf-8') as f:
+            yield from csv.DictReader(f, delimiter=self.sep)
+
+    def close(self) -> None:
+        """Flushes the buffer and closes the journal."""
+
+        with self.lock:
+            if self.file.closed:
+                return
+            self.flush_buffer()
+            self.file.close()
@@ -0,0 +1,347 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+from time import time
+from typing import Any, Dict
+from urllib.parse import parse_qsl, urlencode, urlsplit, urlunsplit
+
+import requests
+
+from src.extractors.RateLimiter import RateLimiter
+
+
+class CachedResponse:
+    """A response served by the ResponseCache, either from disk or from the network.
+
+    Attributes
+    ----------
+    url : str
+        The requested url
+    status_code : int
+        The status code of the response, 200 for responses served from disk
+    content : bytes
+        The body of the response
+    encoding : str
+        The encoding used to decode the body
+    from_cache : bool
+        True if the body was read from disk, i.e. it was fresh or revalidated with a 304
+    """
+
+    def __init__(self, url: str, status_code: int, content: bytes, encoding: str | None,
+                 from_cache: bool) -> None:
+        self.url = url
+        self.status_code = status_code
+        self.content = content
+        self.encoding = encoding or 'utf-8'
+        self.from_cache = from_cache
+
+    @property
+    def text(self) -> str:
+        return self.content.decode(self.encoding, errors='replace')
+
+    def json(self) -> Any:
+        return json.loads(self.content)
+
+    def raise_for_status(self) -> None:
+        if self.status_code >= 400:
+            raise requests.HTTPError('{} Error for url: {}'.format(self.status_code, self.url))
+
+
+class ResponseCache:
+    """An on-disk cache for pages and HTTP responses, shared by the HTTP and the Selenium scrapers.
+
+    Bodies are stored content-addressed under ``objects/`` by their SHA-256, so identical
+    pages are stored once. A SQLite index maps the canonical url of every page to its body,
+    its validators (ETag, Last-Modified), the time it was fetched and the time it was last read.
+
+    An entry is fresh for the TTL of its page type. Stale entries fetched over HTTP are revalidated
+    with a conditional request, a 304 renews them without transferring the body again.
+    Snapshots of rendered pages have no validators and are fetched again once they are stale.
+    When the stored bodies exceed ``max_mb``, the least recently read entries are evicted.
+
+    Parameters
+    ----------
+    folder : str
+        The cache folder. It is created if it does not exist.
+    ttls : Dict[str, float] (optional)
+        The time to live in seconds by page type, merged over default_ttls
+        default: None
+    max_mb : float (optional)
+        The size bound of the stored bodies in MB
+        default: 1024
+
+    Attributes
+    ----------
+    hits : int
+        The number of fresh entries served from disk
+    revalidated : int
+        The number of stale entries renewed by a 304
+    misses : int
+        The number of pages fetched from the network
+    """
+
+    default_ttls = {
+        'default': 24 * 3600,
+        'region': 24 * 3600,
+        'tour': 7 * 24 * 3600,
+        'route': 7 * 24 * 3600,
+        'route_json': 7 * 24 * 3600,
+    }
+
+    def __init__(self, folder: str, ttls: Dict[str, float] | None = None, max_mb: float = 1024) -> None:
+        self.folder = folder
+        self.objects_path = os.path.join(folder, 'objects')
+        self.ttls = dict(self.default_ttls, **(ttls or {}))
+        self.max_bytes = int(max_mb * 1024 * 1024)
+        self.logger = logging.getLogger(__name__)
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.revalidated = 0
+        self.misses = 0
+
+        os.makedirs(self.objects_path, exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(folder, 'index.sqlite'), check_same_thread=False,
+                                          isolation_level=None)
+        self.connection.execute('PRAGMA journal_mode=WAL')
+        self.connection.execute('PRAGMA synchronous=NORMAL')
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'url TEXT PRIMARY KEY, '
+            'digest TEXT NOT NULL, '
+            'page_type TEXT NOT NULL, '
+            'encoding TEXT, '
+            'etag TEXT, '
+            'last_modified TEXT, '
+            'fetched_at REAL NOT NULL, '
+            'accessed_at REAL NOT NULL)')
+        self.connection.execute('CREATE TABLE IF NOT EXISTS objects (digest TEXT PRIMARY KEY, size INTEGER NOT NULL)')
+        self.connection.execute('CREATE INDEX IF NOT EXISTS entries_accessed ON entries (accessed_at)')
+
+        self.size = self.connection.execute('SELECT COALESCE(SUM(size), 0) FROM objects').fetchone()[0]
+        self.logger.info('Opened response cache {} with {:.1f} MB'.format(folder, self.size / 1024 / 1024))
+
+    @staticmethod
+    def canonical(url: str) -> str:
+        """Returns the canonical form of a url: lower case scheme and host, sorted query, no fragment."""
+
+        parts = urlsplit(url.strip())
+        query = urlencode(sorted(parse_qsl(parts.query, keep_blank_values=True)))
+        return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path or '/', query, ''))
+
+    def ttl(self, page_type: str) -> float:
+        return self.ttls.get(page_type, self.ttls['default'])
+
+    def lookup(self, url: str, page_type: str = 'default') -> bytes | None:
+        """Returns the body of a fresh entry, None if the url is not cached or stale.
+
+        Parameters
+        ----------
+        url : str
+            The url of the page
+        page_type : str (optional)
+            The page type, selects the TTL
+            default: 'default'
+        """
+
+        entry = self.entry(url)
+        if entry is None or time() - entry['fetched_at'] >= self.ttl(page_type):
+            return None
+
+        content = self.read(url, entry)
+        if content is not None:
+            with self.lock:
+                self.hits += 1
+        return content
+
+    def store(self, url: str, content: bytes, page_type: str = 'default', encoding: str | None = None,
+              etag: str | None = None, last_modified: str | None = None) -> None:
+        """Stores the body of a page and evicts the least recently read entries if the cache is full.
+
+        Parameters
+        ----------
+        url : str
+            The url of the page
+        content : bytes
+            The body of the page
+        page_type : str (optional)
+            The page type, selects the TTL
+            default: 'default'
+        encoding : str (optional)
+            The encoding of the body
+        etag : str (optional)
+            The ETag header of the response
+        last_modified : str (optional)
+            The Last-Modified header of the response
+        """
+
+        digest = hashlib.sha256(content).hexdigest()
+        path = self.object_path(digest)
+        if not os.path.exists(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            tmp_path = '{}.{}.tmp'.format(path, threading.get_ident())
+            with open(tmp_path, 'wb') as f:
+                f.write(content)
+            os.replace(tmp_path, path)
+
+        now = time()
+        with self.lock:
+            previous = self.connection.execute('SELECT digest FROM entries WHERE url = ?',
+                                               (self.canonical(url),)).fetchone()
+            if self.connection.execute('INSERT OR IGNORE INTO objects (digest, size) VALUES (?, ?)',
+                                       (digest, len(content))).rowcount:
+                self.size += len(content)
+            self.connection.execute(
+                'INSERT OR REPLACE INTO entries '
+                '(url, digest, page_type, encoding, etag, last_modified, fetched_at, accessed_at) '
+                'VALUES (?, ?, ?, ?, ?, ?, ?, ?)',
+                (self.canonical(url), digest, page_type, encoding, etag, last_modified, now, now))
+            if previous is not None and previous[0] != digest:
+                self.release(previous[0])
+            if self.size > self.max_bytes:
+                self.evict()
+
+    def get(self, session: requests.Session, url: str, page_type: str = 'default',
+            rate_limiter: RateLimiter | None = None, **kwargs) -> CachedResponse:
+        """Fetches a url over the given session, serving fresh entries from disk and revalidating stale ones.
+
+        Parameters
+        ----------
+        session : requests.Session
+            The session used for requests that have to go to the network
+        url : str
+            The url to fetch
+        page_type : str (optional)
+            The page type, selects the TTL
+            default: 'default'
+        rate_limiter : RateLimiter (optional)
+            Paces the requests that go to the network, fresh entries are served without waiting
+            default: None
+        kwargs
+            Further arguments of session.get, e.g. cookies or timeout
+
+        Returns
+        -------
+        CachedResponse
+            The response. Only 200 responses are stored.
+        """
+
+        content = self.lookup(url, page_type)
+        if content is not None:
+            entry = self.entry(url)
+            return CachedResponse(url, 200, content, entry['encoding'] if entry else None, True)
+
+        entry = self.entry(url)
+        headers = dict(kwargs.pop('headers', None) or {})
+        if entry is not None and entry['etag']:
+            headers['If-None-Match'] = entry['etag']
+        if entry is not None and entry['last_modified']:
+            headers['If-Modified-Since'] = entry['last_modified']
+
+        if rate_limiter is not None:
+            rate_limiter.acquire(url)
+        response = session.get(url, headers=headers, **kwargs)
+        if rate_limiter is not None:
+            rate_limiter.record(url, response.status_code)
+
+        if response.status_code == 304 and entry is not None:
+            content = self.read(url, entry)
+            if content is not None:
+                self.renew(url, entry, response.headers)
+                with self.lock:
+                    self.revalidated += 1
+                return CachedResponse(url, 200, content, entry['encoding'], True)
+            # the body was evicted in the meantime, fetch it again unconditionally
+            if rate_limiter is not None:
+                rate_limiter.acquire(url)
+            response = session.get(url, **kwargs)
+            if rate_limiter is not None:
+                rate_limiter.record(url, response.status_code)
+
+        with self.lock:
+            self.misses += 1
+        if response.status_code == 200:
+            self.store(url, response.content, page_type, response.encoding,
+                       response.headers.get('ETag'), response.headers.get('Last-Modified'))
+        return CachedResponse(url, response.status_code, response.content, response.encoding, False)
+
+    def entry(self, url: str) -> Dict[str, Any] | None:
+        with self.lock:
+            row = self.connection.execute(
+                'SELECT digest, encoding, etag, last_modified, fetched_at FROM entries WHERE url = ?',
+                (self.canonical(url),)).fetchone()
+        if row is None:
+            return None
+        return dict(zip(('digest', 'encoding', 'etag', 'last_modified', 'fetched_at'), row))
+
+    def read(self, url: str, entry: Dict[str, Any]) -> bytes | None:
+        """Reads the body of an entry and marks it as recently used, None if the object is gone."""
+
+        try:
+            with open(self.object_path(entry['digest']), 'rb') as f:
+                content = f.read()
+        except FileNotFoundError:
+            return None
+
+        with self.lock:
+            self.connection.execute('UPDATE entries SET accessed_at = ? WHERE url = ?', (time(), self.canonical(url)))
+        return content
+
+    def renew(self, url: str, entry: Dict[str, Any], headers: Any) -> None:
+        """Restarts the TTL of an entry after a 304, taking over updated validators."""
+
+        with self.lock:
+            self.connection.execute(
+                'UPDATE entries SET fetched_at = ?, etag = ?, last_modified = ? WHERE url = ?',
+                (time(), headers.get('ETag', entry['etag']), headers.get('Last-Modified', entry['last_modified']),
+                 self.canonical(url)))
+
+    def evict(self) -> None:
+        """Removes the least recently read entries until the stored bodies fit into max_bytes."""
+
+        evicted = 0
+        rows = self.connection.execute('SELECT url, digest FROM entries ORDER BY accessed_at').fetchall()
+        for url, digest in rows:
+            if self.size <= self.max_bytes:
+                break
+            self.connection.execute('DELETE FROM entries WHERE url = ?', (url,))
+            self.release(digest)
+            evicted += 1
+        self.logger.info('Evicted {} entries from the response cache'.format(evicted))
+
+    def release(self, digest: str) -> None:
+        """Removes an object that is no longer referenced by any entry."""
+
+        if self.connection.execute('SELECT 1 FROM entries WHERE digest = ? LIMIT 1', (digest,)).fetchone():
+            return
+        row = self.connection.execute('SELECT size FROM objects WHERE digest = ?', (digest,)).fetchone()
+        self.connection.execute('DELETE FROM objects WHERE digest = ?', (digest,))
+        if row is not None:
+            self.size -= row[0]
+        try:
+            os.remove(self.object_path(digest))
+        except FileNotFoundError:
+            pass
+
+    def object_path(self, digest: str) -> str:
+        return os.path.join(self.objects_path, digest[:2], digest)
+
+    def stats(self) -> Dict[str, float]:
+        """Returns the hits, revalidations, misses and the size of the cache in MB."""
+
+        with self.lock:
+            return {'hits': self.hits, 'revalidated': self.revalidated, 'misses': self.misses,
+                    'size_mb': round(self.size / 1024 / 1024, 1)}
+
+    def log_stats(self) -> None:
+        """Logs the stats of the cache."""
+
+        self.logger.info('Response cache {}: {}'.format(self.folder, self.stats()))
+
+    def close(self) -> None:
+        """Closes the index."""
+
+        with self.lock:
+            self.connection.close()
@@ -0,0 +1,191 @@
+import csv
+import heapq
+import logging
+import os
+import random
+import threading
+from itertools import count
+from time import monotonic, time
+from typing import Dict, Iterable, List, Tuple
+
+
+class RetryQueue:
+    """A work queue of links that delays failed links instead of blocking a worker on them.
+
+    Links are handed out in the order they become ready. A failed link is put back with an
+    exponential backoff plus jitter, so the workers go on with other links in the meantime.
+    Links that failed ``max_attempts`` times are appended to a dead-letter csv file with their last error.
+    A worker that dies closes the queue, so the other workers stop instead of waiting for its links forever.
+
+    Parameters
+    ----------
+    links : Iterable[str] (optional)
+        The links to start with
+        default: ()
+    max_attempts : int (optional)
+        The number of attempts per link before it is dead-lettered
+        default: 4
+    base_delay : float (optional)
+        The backoff in seconds after the first failure, doubled with every further failure
+        default: 5
+    max_delay : float (optional)
+        The upper bound of the backoff in seconds
+        default: 300
+    jitter : float (optional)
+        The share of the backoff that is randomized, so retries of concurrent failures spread out
+        default: 0.5
+    dead_letter_path : str (optional)
+        The csv file exhausted links are appended to
+        default: None, exhausted links are only logged
+
+    Examples
+    --------
+    queue = RetryQueue(links)
+    try:
+        while (link := queue.get()) is not None:
+            try:
+                fetch(link)
+            except Exception as e:
+                queue.retry(link, str(e))
+            else:
+                queue.done(link)
+    except BaseException:
+        queue.close()
+        raise
+    """
+
+    dead_letter_columns = ['link', 'attempts', 'error', 'failed_at']
+
+    def __init__(self, links: Iterable[str] = (), max_attempts: int = 4, base_delay: float = 5,
+                 max_delay: float = 300, jitter: float = 0.5, dead_letter_path: str | None = None) -> None:
+        self.max_attempts = max_attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.jitter = jitter
+        self.dead_letter_path = dead_letter_path
+        self.logger = logging.getLogger(__name__)
+        self.condition = threading.Condition()
+        # serializes the writes to the dead-letter file, which happen outside of the condition
+        self.dead_letter_lock = threading.Lock()
+        self.sequence = count()
+
+        self.heap: List[Tuple[float, int, str]] = []
+        self.attempts: Dict[str, int] = {}
+        self.in_flight = 0
+        self.retried = 0
+        self.dead: List[str] = []
+        self.closed = False
+        for link in links:
+            self.put(link)
+
+    def __len__(self) -> int:
+        with self.condition:
+            return len(self.heap) + self.in_flight
+
+    def put(self, link: str, delay: float = 0) -> None:
+        """Adds a link that becomes ready after the given delay in seconds."""
+
+        with self.condition:
+            heapq.heappush(self.heap, (monotonic() + delay, next(self.sequence), link))
+            self.condition.notify()
+
+    def get(self) -> str | None:
+        """Hands out the next ready link, waiting for delayed links if none is ready.
+
+        Returns
+        -------
+        str | None
+            The link, or None once the queue is empty and no link is in flight anymore, or it was closed
+        """
+
+        with self.condition:
+            while True:
+                if self.closed:
+                    return None
+                if self.heap:
+                    ready_at = self.heap[0][0]
+                    wait_seconds = ready_at - monotonic()
+                    if wait_seconds <= 0:
+                        self.in_flight += 1
+                        return heapq.heappop(self.heap)[2]
+                    self.condition.wait(wait_seconds)
+                elif self.in_flight == 0:
+                    # nothing left and nothing that could fail and come back
+                    self.condition.notify_all()
+                    return None
+                else:
+                    self.condition.wait()
+
+    def done(self, link: str) -> None:
+        """Marks a link handed out by get as done."""
+
+        with self.condition:
+            self.in_flight -= 1
+            self.attempts.pop(link, None)
+            self.condition.notify_all()
+
+    def retry(self, link: str, error: str) -> bool:
+        """Marks a link handed out by get as failed and schedules it again with backoff.
+
+        Parameters
+        ----------
+        link : str
+            The failed link
+        error : str
+            The error of the attempt, written to the dead-letter file if the link is exhausted
+
+        Returns
+        -------
+        bool
+            True if the link was scheduled again, False if it was dead-lettered
+        """
+
+        with self.condition:
+            self.in_flight -= 1
+            attempts = self.attempts.get(link, 0) + 1
+            self.attempts[link] = attempts
+
+            exhausted = attempts >= self.max_attempts
+            if exhausted:
+                self.attempts.pop(link)
+                self.dead.append(link)
+            else:
+                delay = self.backoff(attempts)
+                self.retried += 1
+                heapq.heappush(self.heap, (monotonic() + delay, next(self.sequence), link))
+            self.condition.notify_all()
+
+        if exhausted:
+            # written outside the lock, a failing write must not leave the other workers waiting
+            self.write_dead_letter(link, attempts, error)
+            return False
+
+        self.logger.info('Retrying {} in {:.1f} s (attempt {} of {})'.format(link, delay, attempts + 1,
+                                                                            self.max_attempts))
+        return True
+
+    def close(self) -> None:
+        """Stops handing out links, e.g. when a worker died with links in flight that will never be done."""
+
+        with self.condition:
+            self.closed = True
+            self.condition.notify_all()
+
+    def backoff(self, attempts: int) -> float:
+        """Returns the delay in seconds after the given number of failed attempts."""
+
+        delay = min(self.max_delay, self.base_delay * 2 ** (attempts - 1))
+        return delay * (1 - self.jitter) + random.uniform(0, delay * self.jitter)
+
+    def write_dead_letter(self, link: str, attempts: int, error: str) -> None:
+        self.logger.warning('Giving up on {} after {} attempts: {}'.format(link, attempts, error))
+        if self.dead_letter_path is None:
+            return
+
+        with self.dead_letter_lock:
+            new_file = not os.path.exists(self.dead_letter_path) or os.path.getsize(self.dead_letter_path) == 0
+            with open(self.dead_letter_path, 'a', newline='', encoding='utf-8') as f:
+                writer = csv.writer(f)
+                if new_file:
+                    writer.writerow(self.dead_letter_columns)
+                writer.writerow([link, attempts, error, time()])
@@ -1,4 +1,3 @@
-from pyproj import Transformer
 import gpxpy
 import gpxpy.gpx
 import json
@@ -6,6 +5,8 @@ import requests
 import argparse
 import browser_cookie3
 
+from src.extractors import GeoUtil
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Converts SAC routes to GPX files')
     parser.add_argument('id', metavar='route_id', type=int, help='SAC ID of the route (last part of the URL)')
@@ -22,21 +23,21 @@ if __name__ == "__main__":
     gpx.description = data["teaser"]
     gpx.author_name = data["author"]["full_name"]
 
-    transformer = Transformer.from_crs('epsg:2056', 'epsg:4326')
+    wps = [data['departure_point']] + [wp['reference_poi'] for wp in data['waypoints']] + [data['destination_poi']]
+    geometries = [seg['geom']['coordinates'] if 'geom' in seg and seg['geom'] else [] for seg in data['segments']]
+    # the points of all segments and waypoints are reprojected in a single call
+    *segment_points, wp_points = GeoUtil.lv95_to_wgs84_many(geometries + [[wp['geom']['coordinates'] for wp in wps]])
 
-    for seg in data['segments']:
+    for seg, points in zip(data['segments'], segment_points):
         gpx_track = gpxpy.gpx.GPXTrack(name=seg['title'],description=seg['description'])
         gpx.tracks.append(gpx_track)
         gpx_segment = gpxpy.gpx.GPXTrackSegment()
         gpx_track.segments.append(gpx_segment)
 
-        if 'geom' in seg and seg['geom']:
-            for x,y in map(lambda xy: transformer.transform(*xy),seg['geom']['coordinates']):
-                gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(x,y))
+        gpx_segment.points = [gpxpy.gpx.GPXTrackPoint(lat, lon) for lat, lon in points.tolist()]
 
-    wps = [data['departure_point']] + [wp['reference_poi'] for wp in data['waypoints']] + [data['destination_poi']]
-    for wp in wps:
-        gpx_wp=gpxpy.gpx.GPXWaypoint(*transformer.transform(*wp['geom']['coordinates']),name=wp['display_name'])
+    for wp, (lat, lon) in zip(wps, wp_points.tolist()):
+        gpx_wp=gpxpy.gpx.GPXWaypoint(lat, lon, name=wp['display_name'])
         gpx.waypoints.append(gpx_wp)
 
     with open(f'SAC-{args.id} {gpx.name}.gpx','w') as f:
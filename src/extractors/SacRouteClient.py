@@ -0,0 +1,252 @@
+import json
+import logging
+import os
+import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, List, Tuple
+
+import requests
+
+from src.extractors import HttpUtil
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.ResponseCache import ResponseCache
+
+
+class SacRouteClient:
+    """Fetches the route JSON of the SAC route portal, the payload behind every tour page.
+
+    All requests share one pooled keep-alive session, go through the response cache and are
+    paced per host by the rate limiter. Every payload can be written to disk as it arrives.
+
+    Parameters
+    ----------
+    session : requests.Session (optional)
+        The session, e.g. with the cookies of a logged-in browser
+        default: a new pooled session
+    cache : ResponseCache (optional)
+        The response cache, fresh payloads are read from disk and stale ones revalidated
+        default: None
+    rate_limiter : RateLimiter (optional)
+        Paces the requests that go to the network
+        default: a new RateLimiter starting at 2 requests per second
+    lang : str (optional)
+        The language of the payload [de/en/it/fr]
+        default: 'en'
+    json_folder : str (optional)
+        If given, every payload is written to this folder as SAC-<tour id>.json
+        default: None
+    concurrency : int (optional)
+        The number of requests in flight
+        default: 8
+    """
+
+    route_url = 'https://www.sac-cas.ch/{lang}/?type=1567765346410&tx_usersaccas2020_sac2020%5BrouteId%5D={tour_id}&output_lang={lang}'
+    tour_id_pattern = re.compile(r'(\d+)(?!.*\d)')
+    columns = ['tour_id', 'title', 'subtitle', 'difficulty', 'time_ascent', 'ascent', 'time_descent', 'descent', 'link',
+               'map', 'description']
+    # a payload without these keys is not a route, a route without the other values gets 'na' for them
+    required_keys = ('title', 'segments')
+    # the values read from the payload, a column that is 'na' for every route points to a wrong key
+    fact_columns = ['subtitle', 'difficulty', 'time_ascent', 'ascent', 'time_descent', 'descent', 'description']
+
+    # the tour pages of the other languages share the slugs of the english page
+    map_link_replacements = [
+        ('/en/huts-and-tours/sac-route-portal/', '/de/huetten-und-touren/sac-tourenportal/'),
+        ('/mountain-hiking/', '/berg-und-alpinwandern/'),
+    ]
+
+    def __init__(self, session: requests.Session | None = None, cache: ResponseCache | None = None,
+                 rate_limiter: RateLimiter | None = None, lang: str = 'en', json_folder: str | None = None,
+                 concurrency: int = 8) -> None:
+        self.session = session or HttpUtil.create_session(pool_size=concurrency)
+        self.cache = cache
+        self.rate_limiter = rate_limiter or RateLimiter(2, max_rate=10)
+        self.lang = lang
+        self.json_folder = json_folder
+        self.concurrency = concurrency
+        self.logger = logging.getLogger(__name__)
+        if json_folder is not None:
+            os.makedirs(json_folder, exist_ok=True)
+
+    def fetch(self, tour_id: Any) -> Dict[str, Any]:
+        """Fetches the route JSON of a tour.
+
+        Raises
+        ------
+        requests.HTTPError
+            If the request failed
+        """
+
+        url = self.route_url.format(lang=self.lang, tour_id=tour_id)
+        if self.cache is not None:
+            response: Any = self.cache.get(self.session, url, 'route_json', rate_limiter=self.rate_limiter, timeout=30)
+        else:
+            self.rate_limiter.acquire(url)
+            response = self.session.get(url, timeout=30)
+            self.rate_limiter.record(url, response.status_code)
+        response.raise_for_status()
+
+        if self.json_folder is not None:
+            path = os.path.join(self.json_folder, 'SAC-{}.json'.format(tour_id))
+            with open(path + '.tmp', 'wb') as f:
+                f.write(response.content)
+            os.replace(path + '.tmp', path)
+        return json.loads(response.content)
+
+    def fetch_all(self, tour_ids: Iterable[Any]) -> Iterator[Tuple[Any, Dict[str, Any] | None, Exception | None]]:
+        """Fetches the route JSON of many tours concurrently.
+
+        Yields
+        ------
+        Tuple[Any, Dict[str, Any] | None, Exception | None]
+            The tour id with its payload, or with the error if it could not be fetched, in the order they arrive
+        """
+
+        with ThreadPoolExecutor(max_workers=self.concurrency, thread_name_prefix='sac-route') as pool:
+            futures = {pool.submit(self.fetch, tour_id): tour_id for tour_id in tour_ids}
+            for future in as_completed(futures):
+                try:
+                    yield futures[future], future.result(), None
+                except Exception as e:
+                    self.logger.warning('Could not fetch route {}: {}'.format(futures[future], e))
+                    yield futures[future], None, e
+
+    @classmethod
+    def get_tour_id(cls, link: str) -> str:
+        """Returns the tour id of a tour page link, the last number in the link."""
+
+        match = cls.tour_id_pattern.search(link)
+        return match.group(1) if match else 'na'
+
+    @classmethod
+    def get_map_link(cls, link: str) -> str:
+        """Returns the link of the default (german) language version of a tour page."""
+
+        for old, new in cls.map_link_replacements:
+            link = link.replace(old, new)
+        return link
+
+    @classmethod
+    def to_record(cls, link: str, data: Dict[str, Any]) -> Dict[str, str]:
+        """Maps a route JSON payload to the columns of SAC_data_without_index0.csv.
+
+        Values missing in the payload are filled with 'na', like the tour page scraper did,
+        and logged, see also check_records.
+
+        Parameters
+        ----------
+        link : str
+            The link of the tour page
+        data : Dict[str, Any]
+            The route JSON of the tour
+
+        Raises
+        ------
+        ValueError
+            If the payload lacks a required key, i.e. it is not a route JSON
+        """
+
+        missing_keys = [key for key in cls.required_keys if key not in data]
+        if missing_keys:
+            raise ValueError('Route JSON of {} has no {}'.format(link, ', '.join(missing_keys)))
+
+        segments: List[Dict[str, Any]] = data.get('segments') or [{}]
+        segment = segments[0]
+        destination = data.get('destination_poi') or {}
+
+        subtitle = cls.text(destination.get('display_name'))
+        altitude = destination.get('altitude')
+        if subtitle != 'na' and altitude is not None:
+            subtitle = '{} {} m'.format(subtitle, altitude)
+
+        record = {
+            'tour_id': cls.get_tour_id(link),
+            'title': cls.text(data.get('title')),
+            'subtitle': subtitle,
+            'difficulty': cls.text(cls.pick(data, segment, 'difficulty')),
+            'time_ascent': cls.duration(cls.pick(data, segment, 'time_ascent', 'ascent_time')),
+            'ascent': cls.height(cls.pick(data, segment, 'ascent', 'height_ascent')),
+            'time_descent': cls.duration(cls.pick(data, segment, 'time_descent', 'descent_time')),
+            'descent': cls.height(cls.pick(data, segment, 'descent', 'height_descent')),
+            'link': link,
+            'map': cls.get_map_link(link),
+            # like the tour page, only the first paragraph of the description of the first variant
+            'description': cls.text(str(segment.get('description') or data.get('teaser') or '').split('</p>')[0]),
+        }
+        missing = [column for column in cls.fact_columns if record[column] == 'na']
+        if missing:
+            logging.getLogger(__name__).debug('Route JSON of {} has no {}'.format(link, ', '.join(missing)))
+        return record
+
+    @classmethod
+    def error_record(cls, link: str) -> Dict[str, str]:
+        """Returns the record of a tour whose route JSON could not be read, like the scraper wrote dead tour pages.
+
+        All values are 'na' but the link, the map link is empty, so SacTransformer drops the tour.
+        """
+
+        record = dict.fromkeys(cls.columns, 'na')
+        record.update({'tour_id': cls.get_tour_id(link), 'link': link, 'map': ''})
+        return record
+
+    @classmethod
+    def check_records(cls, records: List[Dict[str, str]], min_records: int = 20) -> None:
+        """Makes sure no column is 'na' for all records, as it happens when a key of the payload is wrong.
+
+        Parameters
+        ----------
+        records : List[Dict[str, str]]
+            The records read from route JSON, see to_record
+        min_records : int (optional)
+            Fewer records are not checked, a few routes can lack a value by chance
+            default: 20
+
+        Raises
+        ------
+        ValueError
+            If a column has no value in any of the records
+        """
+
+        if len(records) < min_records:
+            return
+        empty = [column for column in cls.fact_columns if all(record[column] == 'na' for record in records)]
+        if empty:
+            raise ValueError('No route JSON had a value for {}, check the keys read by to_record'.format(
+                ', '.join(empty)))
+
+    @staticmethod
+    def pick(data: Dict[str, Any], segment: Dict[str, Any], *keys: str) -> Any:
+        """Returns the first of the given keys found in the first segment or else in the route itself."""
+
+        for source in (segment, data):
+            for key in keys:
+                value = source.get(key)
+                if isinstance(value, dict):
+                    value = value.get('value', value.get('title'))
+                if value not in (None, ''):
+                    return value
+        return None
+
+    @staticmethod
+    def text(value: Any) -> str:
+        if value is None:
+            return 'na'
+        text = re.sub(r'<[^>]+>', ' ', str(value))
+        return ' '.join(text.split()) or 'na'
+
+    @staticmethod
+    def duration(value: Any) -> str:
+        """Formats a duration in minutes like the tour page, e.g. '7 h' or '2:30 h'. Ranges such as '3–4 h' are kept."""
+
+        if isinstance(value, (int, float)):
+            hours, minutes = divmod(int(value), 60)
+            return '{} h'.format(hours) if minutes == 0 else '{}:{:02d} h'.format(hours, minutes)
+        return SacRouteClient.text(value)
+
+    @staticmethod
+    def height(value: Any) -> str:
+        """Formats a height in meters like the tour page, e.g. ' 1500 m'."""
+
+        if isinstance(value, (int, float)):
+            return ' {} m'.format(int(value))
+        return SacRouteClient.text(value)
@@ -0,0 +1,273 @@
+import hashlib
+import json
+import logging
+import os
+import re
+from typing import Any, Dict, Iterator, List, Set, Tuple
+from urllib.parse import urljoin
+
+import requests
+from selenium.webdriver.chrome.webdriver import WebDriver
+from selenium.webdriver.common.by import By
+
+from src.extractors import HttpUtil, SeleniumUtil
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.ResponseCache import ResponseCache
+
+
+class SchweizmobilCatalog:
+    """Builds the catalogue of the Schweizmobil Wanderland routes and stages from the JSON behind the route lists.
+
+    The route lists of schweizmobil.ch are rendered client-side from JSON responses. They are
+    captured from the performance log of the browser while the lists load, or fetched directly
+    once their urls are known, and the routes, their stages and facts are read from them.
+    The payloads are saved with their url, so a catalogue can be rebuilt from recorded JSON.
+    Only the keys below are read, a route or stage without a route url or without facts is skipped.
+
+    Parameters
+    ----------
+    json_folder : str (optional)
+        If given, every payload is written to this folder
+        default: None
+    rate_limiter : RateLimiter (optional)
+        Paces the page loads and requests
+        default: a new RateLimiter starting at 1 request per second
+
+    Attributes
+    ----------
+    payloads : Dict[str, Any]
+        The captured payloads by url
+    parents : Set[str]
+        The urls of the regional and national routes, they are listed by their stages
+    logger : logging.Logger
+        The logger for this class.
+    """
+
+    base_url = 'https://schweizmobil.ch'
+    local_list_url = 'https://schweizmobil.ch/de/wanderland/lokale-routen'
+    # the routes of these lists are made of stages
+    stage_list_urls = [
+        'https://schweizmobil.ch/de/wanderland/regionale-routen',
+        'https://schweizmobil.ch/de/wanderland/nationale-routen',
+    ]
+    api_pattern = r'schweizmobil\.ch/.*api'
+    columns = ['url', 'name', 'distance', 'altitude_up', 'altitude_down', 'duration', 'difficulty_level',
+               'fitness_level']
+
+    # the keys of the JSON the routes are read from, nothing else in a payload is read:
+    # a route list has its routes under routes_key, a route page its route under route_key
+    routes_key = 'routes'
+    route_key = 'route'
+    name_key = 'title'
+    url_key = 'url'
+    stages_key = 'stages'
+    facts_key = 'facts'
+    # the facts by column, distance and altitudes in meters, duration in minutes, levels as labels
+    fact_keys = {
+        'distance': 'distance',
+        'altitude_up': 'ascent',
+        'altitude_down': 'descent',
+        'duration': 'duration',
+        'difficulty_level': 'technicalDifficulty',
+        'fitness_level': 'physicalDifficulty',
+    }
+    # the urls of the route and stage pages, e.g. https://schweizmobil.ch/de/wanderland/route-7/etappe-18
+    route_url_pattern = re.compile(r'https://schweizmobil\.ch/de/wanderland/route-\d+(/etappe-\d+)?$')
+
+    def __init__(self, json_folder: str | None = None, rate_limiter: RateLimiter | None = None) -> None:
+        self.json_folder = json_folder
+        self.rate_limiter = rate_limiter or RateLimiter(1, max_rate=4)
+        self.payloads: Dict[str, Any] = {}
+        self.parents: Set[str] = set()
+        self.logger = logging.getLogger(__name__)
+        if json_folder is not None:
+            os.makedirs(json_folder, exist_ok=True)
+
+    def capture(self, driver: WebDriver) -> int:
+        """Loads the route lists in the browser and captures the JSON they are rendered from.
+
+        Parameters
+        ----------
+        driver : WebDriver
+            A driver started with a CrawlProfile with capture_network enabled
+
+        Returns
+        -------
+        int
+            The number of captured payloads
+        """
+
+        self.capture_page(driver, self.local_list_url, scroll=True)
+        for url in self.stage_list_urls:
+            for payload in self.capture_page(driver, url, scroll=True):
+                self.parents.update(route['url'] for route, _ in self.find_routes(payload))
+
+        # the stages of a route that are not in the list JSON are in the JSON of its page
+        with_stages = {route['url'] for payload in self.payloads.values()
+                       for route, stages in self.find_routes(payload) if stages}
+        for url in sorted(self.parents - with_stages):
+            self.capture_page(driver, url)
+        return len(self.payloads)
+
+    def capture_page(self, driver: WebDriver, url: str, scroll: bool = False) -> List[Any]:
+        """Loads a page, scrolling route lists to their end, and captures the JSON it received."""
+
+        self.rate_limiter.acquire(url)
+        driver.get(url)
+        if scroll:
+            # scroll steps are no requests, they are paced by the polling of the list only
+            SeleniumUtil.scroll_until_stable(driver, 'a[data-cy="route-card-it"]', container_selector='#main')
+        else:
+            driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-list-it"]')
+
+        captured = SeleniumUtil.get_json_responses(driver, self.api_pattern)
+        for response_url, payload in captured:
+            self.add(response_url, payload)
+        return [payload for _, payload in captured]
+
+    def fetch(self, urls: List[str], session: requests.Session | None = None,
+              cache: ResponseCache | None = None) -> int:
+        """Fetches the JSON of known urls directly, e.g. the urls of a previous capture.
+
+        Returns
+        -------
+        int
+            The number of payloads fetched
+        """
+
+        session = session or HttpUtil.create_session()
+        fetched = 0
+        for url in urls:
+            try:
+                if cache is not None:
+                    response: Any = cache.get(session, url, 'route_json', rate_limiter=self.rate_limiter, timeout=30)
+                else:
+                    self.rate_limiter.acquire(url)
+                    response = session.get(url, timeout=30)
+                    self.rate_limiter.record(url, response.status_code)
+                response.raise_for_status()
+                self.add(url, response.json())
+                fetched += 1
+            except (requests.RequestException, ValueError) as e:
+                self.logger.warning('Could not fetch {}: {}'.format(url, e))
+        return fetched
+
+    def add(self, url: str, payload: Any) -> None:
+        """Adds a payload and writes it to the json folder."""
+
+        self.payloads[url] = payload
+        if self.json_folder is not None:
+            path = os.path.join(self.json_folder, hashlib.sha256(url.encode('utf-8')).hexdigest()[:16] + '.json')
+            with open(path + '.tmp', 'w', encoding='utf-8') as f:
+                json.dump({'url': url, 'payload': payload}, f, ensure_ascii=False)
+            os.replace(path + '.tmp', path)
+
+    def load(self, folder: str | None = None) -> int:
+        """Replays the payloads recorded in a folder, see add.
+
+        Returns
+        -------
+        int
+            The number of loaded payloads
+        """
+
+        folder = folder or self.json_folder
+        for file_name in sorted(os.listdir(folder)):
+            if file_name.endswith('.json'):
+                with open(os.path.join(folder, file_name), encoding='utf-8') as f:
+                    recorded = json.load(f)
+                self.payloads[recorded['url']] = recorded['payload']
+        self.logger.info('Loaded {} payloads from {}'.format(len(self.payloads), folder))
+        return len(self.payloads)
+
+    def routes(self) -> List[Dict[str, Any]]:
+        """Returns the local routes and the stages of the regional and national routes.
+
+        Like the route lists of the website, a route with stages is replaced by its stages,
+        named after the route and the stage. Every route appears once, the first payload wins.
+
+        Returns
+        -------
+        List[Dict[str, Any]]
+            The url, name and facts of each route, in the columns of schweizmobil_stage_1.csv
+        """
+
+        found = [item for payload in self.payloads.values() for item in self.find_routes(payload)]
+        # a route with stages in any payload is listed by its stages, also where it appears without them
+        parents = self.parents | {route['url'] for route, stages in found if stages}
+
+        routes: Dict[str, Dict[str, Any]] = {}
+        for route, stages in found:
+            for stage in stages:
+                routes.setdefault(stage['url'], stage)
+            if not stages and route['url'] not in parents and route['distance'] is not None:
+                routes.setdefault(route['url'], route)
+
+        self.logger.info('Found {} routes and stages in {} payloads'.format(len(routes), len(self.payloads)))
+        return list(routes.values())
+
+    def find_routes(self, payload: Any) -> Iterator[Tuple[Dict[str, Any], List[Dict[str, Any]]]]:
+        """Yields the routes of a route list or route page payload with their stages.
+
+        Only the routes under ``routes_key`` of a list and ``route_key`` of a page are read,
+        objects that are no route, such as navigation links, are skipped.
+        """
+
+        if not isinstance(payload, dict):
+            return
+        items = payload.get(self.routes_key)
+        if not isinstance(items, list):
+            items = [payload[self.route_key]] if isinstance(payload.get(self.route_key), dict) else []
+
+        for item in items:
+            route = self.to_record(item) if isinstance(item, dict) else None
+            if route is None:
+                self.logger.debug('Skipping {!r}, it is no route'.format(item))
+                continue
+            stages = item.get(self.stages_key)
+            stages = [self.to_record(stage, prefix=route['name']) for stage in stages
+                      if isinstance(stage, dict)] if isinstance(stages, list) else []
+            # a stage needs its facts, it is not opened as a route page
+            yield route, [stage for stage in stages if stage is not None and stage['distance'] is not None]
+
+    def to_record(self, item: Dict[str, Any], prefix: str | None = None) -> Dict[str, Any] | None:
+        """Maps a route or stage object to a record, None if it has no name or no route url.
+
+        The facts are None if the object has none, e.g. a route listed by its stages.
+        """
+
+        name = item.get(self.name_key)
+        url = item.get(self.url_key)
+        if not isinstance(name, str) or not name or not isinstance(url, str):
+            return None
+        # relative urls are paths on the website, e.g. /de/wanderland/route-101/etappe-2
+        url = urljoin(self.base_url, url)
+        if not self.route_url_pattern.match(url):
+            return None
+
+        record = {'url': url, 'name': name if prefix is None else f'{prefix} {name}'}
+        facts = item.get(self.facts_key)
+        facts = facts if isinstance(facts, dict) else {}
+        for column, key in self.fact_keys.items():
+            record[column] = self.format(column, facts.get(key))
+        return record
+
+    @staticmethod
+    def format(column: str, value: Any) -> Any:
+        """Formats numeric facts like the route pages, e.g. '20 km', '1’210 m' and '2 h 49 min'.
+
+        The distance and the altitudes are given in meters, the duration in minutes.
+        Values of the wrong type are None.
+        """
+
+        if column in ('difficulty_level', 'fitness_level'):
+            return value if isinstance(value, str) and value else None
+        if not isinstance(value, (int, float)) or isinstance(value, bool):
+            return None
+        if column == 'distance':
+            # the route pages round the distance to whole kilometers
+            return '{:.0f} km'.format(value / 1000)
+        if column in ('altitude_up', 'altitude_down'):
+            return '{:,} m'.format(int(round(value))).replace(',', '’')
+        hours, minutes = divmod(int(value), 60)
+        return '{} h {} min'.format(hours, minutes) if minutes else '{} h'.format(hours)
@@ -1,45 +1,186 @@
+import base64
+import json
 import logging
 import platform
-from typing import Union
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from queue import Queue
+from time import monotonic, sleep
+from typing import Any, Callable, Dict, Iterator, List, Tuple, Union
 
+import psutil
 from selenium import webdriver
+from selenium.common import TimeoutException
 from selenium.webdriver.chrome.service import Service
 from selenium.webdriver.chrome.webdriver import WebDriver
 
 logger = logging.getLogger(__name__)
 
 
-def initialize_new_instance() -> WebDriver:
+class CrawlProfile:
+    """A lean browser profile for crawling pages we only read text from.
+
+    The browser runs headless, ``pageLoadStrategy`` is set to eager, so ``driver.get`` returns
+    once the DOM is ready, and requests for the blocked resource types and url patterns are
+    dropped by the browser via the DevTools protocol.
+
+    Parameters
+    ----------
+    blocked_resource_types : List[str]
+        The resource types to block, see resource_type_patterns
+        default: ['image', 'font', 'media']
+    blocked_url_patterns : List[str]
+        Further url patterns to block, wildcards are allowed
+        default: map tiles and trackers, see default_blocked_url_patterns
+    headless : bool
+        If true, the browser is started without a window
+        default: True
+    page_load_strategy : str
+        The Selenium page load strategy
+        default: 'eager'
+    capture_network : bool
+        If true, the network events are written to the performance log, see get_json_responses
+        default: False
+    """
+
+    resource_type_patterns = {
+        'image': ['*.png', '*.jpg', '*.jpeg', '*.gif', '*.webp', '*.avif', '*.svg', '*.ico'],
+        'font': ['*.woff', '*.woff2', '*.ttf', '*.otf', '*.eot'],
+        'media': ['*.mp4', '*.webm', '*.mp3', '*.ogg'],
+        'stylesheet': ['*.css'],
+    }
+
+    default_blocked_url_patterns = [
+        # map tiles, matched by the tile hosts only, so e.g. a page about 'tiles' is not blocked
+        '*://tile.*', '*://tiles.*', '*://*.tile.*', '*://*.tiles.*', '*://wmts*.geo.admin.ch/*', '*.pbf',
+        # analytics and trackers
+        '*google-analytics.com*', '*googletagmanager.com*', '*doubleclick.net*', '*facebook.net*',
+        '*hotjar.com*', '*sentry.io*', '*newrelic.com*', '*nr-data.net*',
+    ]
+
+    def __init__(self, blocked_resource_types: List[str] | None = None, blocked_url_patterns: List[str] | None = None,
+                 headless: bool = True, page_load_strategy: str = 'eager', capture_network: bool = False) -> None:
+        self.blocked_resource_types = blocked_resource_types if blocked_resource_types is not None \
+            else ['image', 'font', 'media']
+        self.blocked_url_patterns = blocked_url_patterns if blocked_url_patterns is not None \
+            else list(self.default_blocked_url_patterns)
+        self.headless = headless
+        self.page_load_strategy = page_load_strategy
+        self.capture_network = capture_network
+
+    def get_blocked_urls(self) -> List[str]:
+        """Returns all blocked url patterns, including the ones of the blocked resource types."""
+
+        patterns = [p for t in self.blocked_resource_types for p in self.resource_type_patterns[t]]
+        return patterns + self.blocked_url_patterns
+
+    def apply_options(self, option: webdriver.ChromeOptions) -> None:
+        """Applies the profile to the options of a driver that is about to start."""
+
+        option.page_load_strategy = self.page_load_strategy
+        if self.headless:
+            option.add_argument('--headless=new')
+        if 'image' in self.blocked_resource_types:
+            prefs = option.experimental_options.get('prefs', {})
+            prefs['profile.managed_default_content_settings.images'] = 2
+            option.add_experimental_option('prefs', prefs)
+        if self.capture_network:
+            option.set_capability('goog:loggingPrefs', {'performance': 'ALL'})
+
+    def apply_driver(self, driver: WebDriver) -> None:
+        """Applies the request blocking to a started driver."""
+
+        driver.execute_cdp_cmd('Network.enable', {})
+        driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.get_blocked_urls()})
+
+
+def initialize_new_instance(headless: bool = False, profile: CrawlProfile | None = None) -> WebDriver:
     """Initializes a new instance of the Chrome WebDriver.
     If the platform is macOS, the Brave browser is used instead of Chrome.
     Also, it is assumed that the chromedriver was installed via Homebrew.
 
+    Parameters
+    ----------
+    headless : bool
+        If true, the browser is started without a window
+        default: False
+    profile : CrawlProfile (optional)
+        A lean crawl profile to start the browser with, see CrawlProfile
+        default: None
+
     Returns
     -------
     WebDriver
         The initialized WebDriver
     """
     logger.info('Initializing new instance of Chrome')
+    option = webdriver.ChromeOptions()
+    if headless:
+        option.add_argument('--headless=new')
+    if profile is not None:
+        profile.apply_options(option)
+
     plt = platform.system()
     if plt == 'Darwin':
         logger.info('Running on macOS')
-        option = webdriver.ChromeOptions()
         option.binary_location = r'/Applications/Brave Browser.app/Contents/MacOS/Brave Browser'
-        prefs = {"download.default_directory": '/Users/pdrebes/dev/mscids/MSCIDS_CIP02/src/extractors/output/gpx'}
+        prefs = option.experimental_options.get('prefs', {})
+        prefs["download.default_directory"] = '/Users/pdrebes/dev/mscids/MSCIDS_CIP02/src/extractors/output/gpx'
         option.add_experimental_option("prefs", prefs)
 
         driver_service = Service('/opt/homebrew/bin/chromedriver')
 
         driver = webdriver.Chrome(service=driver_service, options=option)
-        logger.info('Initialized new instance of Chrome')
-        return driver
+    else:
+        logger.info('Running on Linux or Windows')
+        driver = webdriver.Chrome(options=option)
 
-    logger.info('Running on Linux or Windows')
-    driver = webdriver.Chrome()
+    if profile is not None:
+        profile.apply_driver(driver)
     logger.info('Initialized new instance of Chrome')
     return driver
 
 
+def measure_page_load(driver: WebDriver, url: str) -> Dict[str, float]:
+    """Loads the given url and measures the load time and the transferred bytes.
+
+    Run it with drivers started with and without a CrawlProfile to compare them.
+    Cross-origin resources without a Timing-Allow-Origin header report a size of 0,
+    so the byte counts are a lower bound.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver used to interact with the browser
+    url : str
+        The url to load
+
+    Returns
+    -------
+    Dict[str, float]
+        load_seconds (wall time of driver.get), document_bytes, resource_bytes, total_bytes and resources
+    """
+    start = monotonic()
+    driver.get(url)
+    load_seconds = monotonic() - start
+
+    stats = driver.execute_script("""
+        const navigation = performance.getEntriesByType('navigation')[0];
+        const resources = performance.getEntriesByType('resource');
+        return {
+            document_bytes: navigation ? navigation.transferSize : 0,
+            resource_bytes: resources.reduce((sum, r) => sum + r.transferSize, 0),
+            resources: resources.length
+        };
+    """)
+    stats['load_seconds'] = round(load_seconds, 3)
+    stats['total_bytes'] = stats['document_bytes'] + stats['resource_bytes']
+    logger.info('Loaded %s in %.2f s, %s bytes', url, load_seconds, stats['total_bytes'])
+    return stats
+
+
 def scroll_to_bottom(driver: WebDriver) -> None:
     """Scrolls to the bottom of the page.
 
@@ -68,8 +209,175 @@ def scroll_to_position(driver: WebDriver, position: Union[int, str]) -> None:
     logger.debug('Scrolled to position %s', position)
 
 
-def close_driver(driver):
-    """Closes the given WebDriver.
+def get_json_responses(driver: WebDriver, url_pattern: str | None = None) -> List[Tuple[str, Any]]:
+    """Returns the JSON responses the page received since the last call, read from the performance log.
+
+    The driver must be started with a CrawlProfile with capture_network enabled. Reading the
+    performance log empties it, bodies the browser no longer holds are skipped.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver used to interact with the browser
+    url_pattern : str (optional)
+        A regular expression the response url must match
+        default: None, all JSON responses
+
+    Returns
+    -------
+    List[Tuple[str, Any]]
+        The url and the parsed body of each response, in the order they were received
+    """
+    pattern = re.compile(url_pattern) if url_pattern is not None else None
+    responses = {}
+    for entry in driver.get_log('performance'):
+        message = json.loads(entry['message'])['message']
+        if message['method'] != 'Network.responseReceived':
+            continue
+        response = message['params']['response']
+        if 'json' in response.get('mimeType', '') and (pattern is None or pattern.search(response['url'])):
+            responses[message['params']['requestId']] = response['url']
+
+    payloads = []
+    for request_id, url in responses.items():
+        try:
+            body = driver.execute_cdp_cmd('Network.getResponseBody', {'requestId': request_id})
+            text = base64.b64decode(body['body']).decode('utf-8') if body.get('base64Encoded') else body['body']
+            payloads.append((url, json.loads(text)))
+        except Exception as e:
+            logger.debug('Could not read the response body of %s: %s', url, e)
+    logger.info('Captured %s JSON responses', len(payloads))
+    return payloads
+
+
+def scroll_until_stable(driver: WebDriver, item_selector: str, container_selector: str | None = None,
+                        quiet_seconds: float = 2.0, timeout: float = 300, poll_seconds: float = 0.2,
+                        on_scroll: Callable[[], None] | None = None, first_item_timeout: float = 30) -> int:
+    """Scrolls an infinite-scroll list until no more items are loaded.
+
+    The list is first waited for until the container and at least one item exist, a page loaded
+    eagerly returns before a client-side list is rendered. Then, after every scroll to the bottom,
+    the list is polled until either the number of items grows, then it is scrolled again, or the
+    DOM of the container has not changed for ``quiet_seconds``, then the list is complete.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver used to interact with the browser
+    item_selector : str
+        The CSS selector of the list items, e.g. 'a[data-cy="route-card-it"]'
+    container_selector : str (optional)
+        The CSS selector of the scrolled element
+        default: None, the page itself is scrolled
+    quiet_seconds : float (optional)
+        The time without DOM changes after which the list is complete
+        default: 2.0
+    timeout : float (optional)
+        The maximum time in seconds, the items loaded so far are counted after it
+        default: 300
+    poll_seconds : float (optional)
+        The polling interval
+        default: 0.2
+    on_scroll : Callable[[], None] (optional)
+        Called before every scroll. Scroll steps are paced by poll_seconds, do not spend the
+        tokens of a host rate limiter on them
+    first_item_timeout : float (optional)
+        The maximum time in seconds to wait for the container and the first item
+        default: 30
+
+    Returns
+    -------
+    int
+        The number of items in the list
+
+    Raises
+    ------
+    TimeoutException
+        If the container or the first item did not appear within first_item_timeout
+    """
+    ready_script = """
+        const container = arguments[0] ? document.querySelector(arguments[0]) : document.body;
+        return container !== null && document.querySelector(arguments[1]) !== null;
+    """
+    start = monotonic()
+    while not driver.execute_script(ready_script, container_selector, item_selector):
+        if monotonic() - start >= first_item_timeout:
+            raise TimeoutException('No item {} appeared within {} s'.format(item_selector, first_item_timeout))
+        sleep(poll_seconds)
+
+    # A mutation observer records the time of the last change in the container
+    driver.execute_script("""
+        const container = arguments[0] ? document.querySelector(arguments[0]) : document.body;
+        window.__lastMutation = performance.now();
+        if (window.__scrollObserver) window.__scrollObserver.disconnect();
+        window.__scrollObserver = new MutationObserver(() => { window.__lastMutation = performance.now(); });
+        window.__scrollObserver.observe(container, {childList: true, subtree: true});
+    """, container_selector)
+    state_script = """
+        const container = arguments[0] ? document.querySelector(arguments[0]) : document.scrollingElement;
+        if (arguments[2]) container.scrollTop = container.scrollHeight;
+        return {count: document.querySelectorAll(arguments[1]).length,
+                idle: (performance.now() - window.__lastMutation) / 1000};
+    """
+
+    start = monotonic()
+    scrolls = 0
+    count = -1
+    try:
+        while monotonic() - start < timeout:
+            if on_scroll is not None:
+                on_scroll()
+            count = driver.execute_script(state_script, container_selector, item_selector, True)['count']
+            scrolls += 1
+
+            while monotonic() - start < timeout:
+                sleep(poll_seconds)
+                state = driver.execute_script(state_script, container_selector, item_selector, False)
+                if state['count'] > count:
+                    break
+                if state['idle'] >= quiet_seconds:
+                    logger.info('Loaded %s items after %s scrolls in %.1f s', count, scrolls, monotonic() - start)
+                    return count
+        logger.warning('List still loading after %s s, got %s items', timeout, count)
+        return count
+    finally:
+        driver.execute_script("if (window.__scrollObserver) window.__scrollObserver.disconnect();")
+
+
+def get_driver_processes(driver: WebDriver) -> List[psutil.Process]:
+    """Returns the chromedriver process of the given WebDriver and all browser processes started by it.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver used to interact with the browser
+    """
+    try:
+        service = psutil.Process(driver.service.process.pid)
+        return [service] + service.children(recursive=True)
+    except (AttributeError, psutil.Error):
+        return []
+
+
+def get_driver_rss(driver: WebDriver) -> int:
+    """Returns the resident memory of the chromedriver and all browser processes in bytes.
+
+    Parameters
+    ----------
+    driver : WebDriver
+        The Selenium WebDriver used to interact with the browser
+    """
+    rss = 0
+    for process in get_driver_processes(driver):
+        try:
+            rss += process.memory_info().rss
+        except psutil.Error:
+            pass
+    return rss
+
+
+def close_driver(driver: WebDriver) -> None:
+    """Quits the given WebDriver and makes sure the whole process tree is gone.
 
     Parameters
     ----------
@@ -77,5 +385,152 @@ def close_driver(driver):
         The Selenium WebDriver used to interact with the browser
     """
     logger.info('Closing driver')
-    driver.close()
-    logger.info('Closed driver')
\ No newline at end of file
+    processes = get_driver_processes(driver)
+    try:
+        driver.quit()
+    except Exception as e:
+        logger.warning('Could not quit driver: %s', e)
+
+    # kill browser processes that survived quit(), e.g. after a crashed renderer
+    for process in processes:
+        try:
+            process.kill()
+        except psutil.Error:
+            pass
+    psutil.wait_procs(processes, timeout=5)
+    logger.info('Closed driver')
+
+
+class DriverPool:
+    """A pool of warm WebDriver instances that are recycled to keep memory flat over long crawls.
+
+    Drivers are handed out as context managers. When a driver is returned after ``max_pages``
+    page loads or with more than ``max_rss_mb`` of resident memory, its whole process tree
+    is torn down and a fresh driver takes its place.
+
+    Parameters
+    ----------
+    size : int
+        The number of drivers in the pool
+        default: 2
+    factory : Callable[[], WebDriver]
+        Creates a new driver
+        default: initialize_new_instance with the default CrawlProfile
+    max_pages : int
+        The number of page loads after which a driver is recycled
+        default: 200
+    max_rss_mb : int
+        The resident memory in MB after which a driver is recycled
+        default: 1500
+    warm : bool
+        If true, all drivers are started right away, otherwise on first use
+        default: True
+
+    Examples
+    --------
+    with DriverPool(size=4) as pool:
+        with pool.driver() as driver:
+            driver.get(url)
+    """
+
+    def __init__(self, size: int = 2, factory: Callable[[], WebDriver] | None = None, max_pages: int = 200,
+                 max_rss_mb: int = 1500, warm: bool = True) -> None:
+        self.size = size
+        self.factory = factory or (lambda: initialize_new_instance(profile=CrawlProfile()))
+        self.max_pages = max_pages
+        self.max_rss_mb = max_rss_mb
+        self.idle: Queue[WebDriver | None] = Queue()
+        self.pages: Dict[int, int] = {}
+        self.lock = threading.Lock()
+        self.recycled = 0
+        self.closed = False
+
+        if warm:
+            with ThreadPoolExecutor(max_workers=size) as pool:
+                for driver in pool.map(lambda _: self.create(), range(size)):
+                    self.idle.put(driver)
+        else:
+            for _ in range(size):
+                self.idle.put(None)
+
+    def __enter__(self) -> 'DriverPool':
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb) -> None:
+        self.close()
+
+    def create(self) -> WebDriver:
+        """Creates a driver whose page loads are counted by the pool."""
+
+        driver = self.factory()
+        self.pages[id(driver)] = 0
+        get = driver.get
+
+        def counting_get(url: str) -> None:
+            self.pages[id(driver)] += 1
+            get(url)
+
+        driver.get = counting_get  # type: ignore
+        return driver
+
+    @contextmanager
+    def driver(self) -> Iterator[WebDriver]:
+        """Hands out a driver of the pool, blocking until one is available.
+
+        Yields
+        ------
+        WebDriver
+            The driver, which is returned to the pool at the end of the with block
+        """
+
+        driver = self.idle.get()
+        if driver is None:
+            driver = self.create()
+
+        try:
+            yield driver
+        except Exception:
+            # the browser might be in an unknown state, better start over
+            self.retire(driver, 'error')
+            driver = None
+            raise
+        finally:
+            if driver is not None and self.closed:
+                close_driver(driver)
+            else:
+                if driver is not None:
+                    driver = self.check(driver)
+                self.idle.put(driver)
+
+    def check(self, driver: WebDriver) -> WebDriver | None:
+        """Retires the driver if it loaded too many pages or uses too much memory."""
+
+        if self.pages[id(driver)] >= self.max_pages:
+            self.retire(driver, '{} pages'.format(self.pages[id(driver)]))
+            return None
+
+        rss_mb = get_driver_rss(driver) / 1024 / 1024
+        if rss_mb > self.max_rss_mb:
+            self.retire(driver, '{:.0f} MB resident memory'.format(rss_mb))
+            return None
+
+        return driver
+
+    def retire(self, driver: WebDriver, reason: str) -> None:
+        """Tears down the driver, a new one is created on the next use of its slot."""
+
+        logger.info('Recycling driver after %s', reason)
+        with self.lock:
+            self.recycled += 1
+            self.pages.pop(id(driver), None)
+        close_driver(driver)
+
+    def close(self) -> None:
+        """Tears down all idle drivers of the pool. Drivers that are handed out are torn down when returned."""
+
+        self.closed = True
+        while not self.idle.empty():
+            driver = self.idle.get()
+            if driver is not None:
+                close_driver(driver)
+        logger.info('Closed driver pool, recycled %s drivers', self.recycled)
\ No newline at end of file
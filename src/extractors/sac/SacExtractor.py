@@ -4,16 +4,30 @@
 # - open the page and login to the portal
 # - filter the desired hiking pages
 # - opening up all tours on the dynamic webpage
-# - collecting all target tour page links (saving it to SAC_page_links.csv)
-# - scraping the data from all tour page links
+# - collecting all target tour page links on a pool of browsers (saving them to SAC_page_links0.csv as we go)
+# - fetching the data of all tour pages from the route JSON behind them
 # - saving the data in an output file: SAC_data_without_index.csv
 
-from selenium import webdriver
+# Run it from the repository root, so the src package can be imported:
+#   python -m src.extractors.sac.SacExtractor
+# The files are read from and written to the data folder next to this file, whatever the working directory.
+
+from selenium.common import NoSuchElementException
 from selenium.webdriver.common.by import By
 from selenium.webdriver.common.keys import Keys
-import re
+from concurrent.futures import ThreadPoolExecutor, as_completed
+import csv
+import os
 import pandas as pd
 
+from src.extractors import HttpUtil, SeleniumUtil
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.ResponseCache import ResponseCache
+from src.extractors.SacRouteClient import SacRouteClient
+
+# The data folder next to this file
+data_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
 
 ###########################################################################
 # Set up Keyring in GitHub
@@ -50,7 +64,14 @@ while True:
 
 # Get to the target page sign in and filter# Set up webdriver
 print("start")
-driver = webdriver.Chrome()
+# We only read text from the pages: images, fonts, map tiles and trackers are not loaded
+driver = SeleniumUtil.initialize_new_instance(profile=SeleniumUtil.CrawlProfile(headless=False))
+
+# Paces the hut page loads and the route JSON requests on sac-cas.ch, slows down on 429/5xx responses
+rate_limiter = RateLimiter(1, max_rate=4)
+
+# Route JSON read on a previous run within the TTL is taken from the cache
+cache = ResponseCache(os.path.join(data_folder, "cache"))
 
 # Open URL
 url = 'https://www.sac-cas.ch/en/login/?redirect_url=%2Fen%2Fhuts-and-tours%2Fsac-route-portal%2F&cHash=61fe243516fab7669ff192457a7ef6c5'
@@ -101,142 +122,158 @@ for i in range(1,int(dest_num)):
 huts_hikes = driver.find_elements(by=By.XPATH, value='.//a[@class="c-teaser-destination__link"]') #option:by Xpath
 #huts_hikes = driver.find_elements(by=By.CLASS_NAME, value="c-teaser-destination__link") #option:by class
 
-huts_hikes_link_list=[]
-tour_link_list=[]
-
-# Get links from selenium webelements huts & hikes
-for item1 in huts_hikes:
-    href_huts_hikes = item1.get_attribute('href')
-    huts_hikes_link_list.append(href_huts_hikes)
+# Get links from selenium webelements huts & hikes (ordered set: a hut listed twice is visited once)
+huts_hikes_link_list = list(dict.fromkeys(item1.get_attribute('href') for item1 in huts_hikes))
 
 print("We have got ", len(huts_hikes_link_list), " huts and hike page links and visit now each of them.")
 
-# Open subpages and save tour_page links in the tour_link_list.
+# The tour page links of every visited hut page are appended to SAC_page_links0.csv as soon as the page is read.
+# A restart skips the hut pages already in the file, delete the file to discover all tour pages again.
+page_links_path = os.path.join(data_folder, "SAC_page_links0.csv")
+tour_links_by_hut = {}
+if os.path.exists(page_links_path):
+    df_visited = pd.read_csv(page_links_path, sep=';', dtype=str, keep_default_na=False)
+    if 'hut_page' in df_visited.columns:
+        for hut_page, link in zip(df_visited['hut_page'], df_visited['link']):
+            tour_links_by_hut.setdefault(hut_page, [])
+            if link:
+                tour_links_by_hut[hut_page].append(link)
+        print("Skipping ", len(tour_links_by_hut), " huts and hike pages visited on a previous run.")
+    else:
+        # a link list of the former format, without the hut pages it was found on, cannot be resumed
+        os.remove(page_links_path)
+
+hut_pages_to_visit = [hut_page for hut_page in huts_hikes_link_list if hut_page not in tour_links_by_hut]
+login_cookies = driver.get_cookies()
+
+def create_worker_driver():
+    # every worker browser gets the cookies of the logged-in browser
+    worker = SeleniumUtil.initialize_new_instance(profile=SeleniumUtil.CrawlProfile())
+    # the pages are loaded eagerly, elements are waited for like with the login browser
+    worker.implicitly_wait(15)
+    worker.get('https://www.sac-cas.ch/en/')
+    for cookie in login_cookies:
+        try:
+            worker.add_cookie({key: cookie[key] for key in ('name', 'value', 'path', 'domain', 'secure') if key in cookie})
+        except Exception:
+            print("cookie not taken over: ", cookie.get('name'))
+    return worker
+
+def discover_tour_links(hut_page):
+    # Open the hut or hike page and return its tour_page links
+    with pool.driver() as worker:
+        rate_limiter.acquire(hut_page)
+        worker.get(hut_page)
+        # waiting for the page content, without it an empty tour list does not mean the page has no tours
+        loaded = worker.find_elements(by=By.ID, value='poi')
+        tour_page = worker.find_elements(by=By.XPATH, value='.//*[@id="poi"]/div/nav[1]/table/tbody/tr/td[1]/a') if loaded else []
+        tour_links = []
+        for tp in tour_page:
+            try: # Extract tour_page links from webelement
+                tour_links.append(tp.get_attribute('href'))
+            except:
+                print("item3: no href attribute") # Releasing error, in case no tour page on the huts & hikes page
+    if not loaded:
+        # not checkpointed, the page is visited again on the next run
+        raise NoSuchElementException("the page content did not load")
+    return tour_links
+
+# Open subpages on a pool of browsers and save the tour_page links of each of them.
 # These tour pages will be our target pages to crawl information from:
-for item2 in huts_hikes_link_list:
-    driver.get(item2) # Open tour pages
-    tour_page = driver.find_elements(by=By.XPATH, value='.//*[@id="poi"]/div/nav[1]/table/tbody/tr/td[1]/a')
-    for tp in tour_page:
-        try: # Extract tour_page links from webelement
-            href_tour_page = tp.get_attribute('href')
-            if href_tour_page not in tour_link_list: # Check of duplicates / only saving unique tour links
-                tour_link_list.append(href_tour_page)
-            else:
+if hut_pages_to_visit:
+    with SeleniumUtil.DriverPool(size=4, factory=create_worker_driver) as pool, \
+            ThreadPoolExecutor(max_workers=pool.size) as executor, \
+            open(page_links_path, 'a', newline='', encoding='utf-8') as page_links_file:
+        writer = csv.writer(page_links_file, delimiter=';')
+        if page_links_file.tell() == 0:
+            writer.writerow(['hut_page', 'link'])
+        futures = {executor.submit(discover_tour_links, hut_page): hut_page for hut_page in hut_pages_to_visit}
+        for i, future in enumerate(as_completed(futures)):
+            hut_page = futures[future]
+            try:
+                tour_links = future.result()
+            except Exception as error:
+                # not checkpointed, the page is visited again on the next run
+                print("Could not read ", hut_page, ": ", error)
                 continue
-        except:
-            print("item3: no href attribute") # Releasing error, in case no tour page on the huts & hikes page
+            tour_links_by_hut[hut_page] = tour_links
+            # a hut page without tours is checkpointed with an empty link, so it is not visited again either
+            writer.writerows([[hut_page, link] for link in tour_links] or [[hut_page, '']])
+            page_links_file.flush()
+            if i%50 == 0:
+                print("Visited ", i, "/", len(hut_pages_to_visit), " huts and hike pages.")
+
+# The tour_page links in the order of the hut pages, the ordered set only keeps the first of duplicated links
+tour_link_list = list(dict.fromkeys(link for hut_page in huts_hikes_link_list for link in tour_links_by_hut.get(hut_page, [])))
 
 # Summary of our link list & number of target pages:
 print("We have crawled ",len(tour_link_list)," tour_page links:" )
-#print(tour_link_list)
+print(tour_link_list[:10])
 
-# Save the tour_link_list to a separate csv file
-# (useful in case of we have error messages in crawilng the data in the next step, we can run through this csv):
-link_data =[]
-for link in tour_link_list:
-    link_dict = {
-        'link': link}
-    link_data.append(link_dict)
-
-df_tour_page_links = pd.DataFrame(link_data)
-print(df_tour_page_links.head(10))
-
-# Export the DataFrame to a CSV file
-df_tour_page_links.to_csv(f"data\SAC_page_links0.csv",sep=';')
+# The browser is only needed to discover the tour pages, the tour data is read from the route JSON below.
+# One keep-alive session with the cookies of the logged-in browser for all route JSON requests
+session = HttpUtil.create_session_from_driver(driver, pool_size=8)
+SeleniumUtil.close_driver(driver)    # the selenium-controlled chrome browser and all its processes are terminated
 
 print("Now we will crawl the information from all of them.")
 
 ##############################################################################
-#Tour_list contains all tour subsite links, which we are crawling below:
+#Tour_list contains all tour subsite links, the route JSON behind each tour page is fetched concurrently:
+client = SacRouteClient(session, cache, rate_limiter, json_folder=os.path.join(data_folder, "JSON"), concurrency=8)
+
+# A tour listed on several hut pages has several links, its route JSON is fetched once for all of them
+links_by_id = {}
 tour_data=[]
-i=0
-for tour_page in tour_link_list:
-    driver.get(tour_page)
-    # Extract the tour ID from the tout page link:
-    try:
-        tour_id = re.search(r'(\d+)(?!.*\d)', tour_page).group(1)
-    except:
-        tour_id = "na"
-    # Header from which we generate the title and subtitle data:
-    try:
-        header = driver.find_element(by=By.XPATH, value='/html/body/div[4]/div[5]/div[1]/div[2]/h2').text
-        title = header.split("\n")[0]
-        subtitle = header.split("\n")[1]
-    except:
-        header ="na"
-        title = "na"
-        subtitle = "na"
-    # Difficulty level in scale of T1 - T6:
-    try:
-        difficulty = driver.find_element(by=By.XPATH, value='.//*[@id="route"]/div[3]/ul/li[1]/dl/dd/a').text
-    except:
-        difficulty = "na"
-    # Ascent, descent and time we do not have at all pages - we fill missing values with na:
-    try:
-        route_info_a = driver.find_element(by=By.XPATH, value='.//*[@id="route"]/div[3]/ul/li[2]/dl/dd').text
-        time_a = route_info_a.split(",")[0]
-        ascent = route_info_a.split(",")[1]
-    except:
-        route_info_a = "na"
-        time_a = "na"
-        ascent = "na"
-    try:
-        route_info_d = driver.find_element(by=By.XPATH, value='.//*[@id="route"]/div[3]/ul/li[3]/dl/dd').text
-        time_d = route_info_d.split(",")[0]
-        descent = route_info_d.split(",")[1]
-    except:
-        route_info_d = "na"
-        time_d = "na"
-        descent ="na"
-    # Map link which is unique for each tour page:
-    try:
-        map = driver.find_elements(by=By.XPATH, value='.//*[@hreflang="x-default"]')
-        map_link =""
-        for mp in map:
-            map_link = mp.get_attribute('href')
-    except:
-        map ="na"
-    # Description is located in an accordion in html, has different number of rows at each subpage
-    # we extract only first row of description with CSS selector, we do not extract the different variants of the tours:
-    try:
-        description = driver.find_element(By.CSS_SELECTOR,'*>div.m-route-accordion__description.c-rich-text>p').text
-    except:
-        description = "na"
-    tour_dict_item = {
-        'tour_id': tour_id,
-        'title': title,
-        'subtitle': subtitle,
-        'difficulty': difficulty,
-        'time_ascent': time_a,
-        'ascent': ascent,
-        'time_descent': time_d,
-        'descent': descent,
-        'link': tour_page,
-        'map': map_link,
-        'description': description}
-    tour_data.append(tour_dict_item)
-    if i%10 == 0:
-        print("Get infos of ", i ,"/", len(tour_link_list), " hiking tours.")
-    i+=1
+for link in tour_link_list:
+    tour_id = SacRouteClient.get_tour_id(link)
+    if tour_id == 'na':
+        # a link without tour id has no route JSON -> only tour id and links, all other values are missing
+        tour_data.append(SacRouteClient.error_record(link))
+    else:
+        links_by_id.setdefault(tour_id, []).append(link)
+
+records = []
+for i, (tour_id, data, error) in enumerate(client.fetch_all(links_by_id)):
+    for link in links_by_id[tour_id]:
+        if error is not None:
+            # dead tour page links -> only tour id and links, all other values are missing
+            tour_data.append(SacRouteClient.error_record(link))
+            continue
+        try:
+            records.append(SacRouteClient.to_record(link, data))
+        except ValueError as e:
+            print("Could not read ", link, ": ", e)
+            tour_data.append(SacRouteClient.error_record(link))
+    if i%100 == 0:
+        print("Get infos of ", i ,"/", len(links_by_id), " hiking tours.")
+
+# A key of the route JSON that is wrong for all tours stops the extraction instead of writing a column of 'na'
+SacRouteClient.check_records(records)
+tour_data.extend(records)
+
+# the route JSON arrives in any order, we keep the order of the tour page links
+order = {link: i for i, link in enumerate(tour_link_list)}
+tour_data.sort(key=lambda tour: order[tour['link']])
+
+rate_limiter.log_stats()
+print("Response cache: ", cache.stats())
+cache.close()
 
 ###########################################################################
 # Creating and printing a data frame
-df = pd.DataFrame(tour_data)
+df = pd.DataFrame(tour_data, columns=SacRouteClient.columns)
 print(df.head(10))
+print("Missing values per column: ", (df == 'na').sum().to_dict())
 
 # Export the DataFrame to a CSV file, we create 2 files:
 # 1. saves the data in the same file / overwrites database (indexing is included)
 #df.to_csv(f"data\SAC_data_with_index0.csv",sep=';')
 
 # 2. saves the data in the same file / overwrites database (indexing is disabled) -> we can append it later
-df.to_csv(f"data\SAC_data_without_index0.csv",sep=';',index = False)
+df.to_csv(os.path.join(data_folder, "SAC_data_without_index0.csv"),sep=';',index = False)
 
 # 3. appends an existing csv file with new data:
 #df.to_csv("SAC_data_without_index.cs",sep=';', mode ="a", header = False, index = False)
 
-# Closing browser
-driver.quit()    # the selenium-controlled chrome browser is terminated
-#driver.close()    # the you don't see the result
-
 print("end SacExtractor.py")
 print("end")
@@ -1,170 +1,73 @@
 
-# This code is to use the SAC GXP data and calculate the distance of the tours with uploading them to Schweizmobile, and scraping the information.
+# This code is to use the SAC GXP data and calculate the distance of the tours.
+# The metrics used to be scraped by uploading every GPX file to Schweizmobil, they are now computed locally from the GPX files.
 # We follow below steps:
-#  - log in to Schweizmobile
-#  - go to the page import GPX data
-#  - upload all GPX files and scrape the distance, elevation, ascent & descent from all tours
-#  - save the scraped data into Distance_data_without_index.csv
+#  - fill in the elevation of the GPX files from a local elevation model (GeoTIFF tiles in data/DEM, e.g. swissALTI3D)
+#  - read all GPX files and calculate the distance, elevation, ascent & descent of all tours
+#  - compare the calculated data with the data scraped from Schweizmobil before (parity report)
+#  - save the calculated data into Distance_data_without_index.csv
+
+# Run it from the repository root, so the src package can be imported:
+#   python -m src.extractors.sac.SacExtractorDistance
+# The files are read from and written to the data folder next to this file, whatever the working directory.
 
 
-from selenium import webdriver
-from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.webdriver.support import expected_conditions as EC
-from selenium.webdriver.common.keys import Keys
-import pandas as pd
 import os
-import re
-
-###########################################################################
-# Set up Keyring in GitHub
-# - Ask for Username and Password if not already saved in the OS keyring
-# - Store the new Credentials in the Keystore
-
-import keyring
-import getpass
-
-keyringServiceNAme = "SchweizMobil Weblogin"
-
-while True:
-    credentials = keyring.get_credential(keyringServiceNAme, None)
-    if credentials == None:
-        try:
-            username = input('Please enter SAC Username: ')
-        except Exception as error:
-            print('USERNAME READ ERROR', error)
-        try:
-            password = getpass.getpass(prompt='Please enter SAC Password: ')
-        except Exception as error:
-            print('PASSWORD READ ERROR', error)
-        try:
-            keyring.set_password(keyringServiceNAme, username, password)
-        except Exception as error:
-            print('PASSWORD SAVE ERROR', error)
-    else: # we have a username and password
-        break
-#print("Scrapping with user: " + credentials.username)
-#print("and password: "+ credentials.password)
-
-###########################################################################
-
-
-# Get to the target page sign in and filter# Set up webdriver
-print("start")
-driver = webdriver.Chrome()
-
-# Open URL
-url = 'https://map.schweizmobil.ch/?lang=en&showLogin'
-driver.get(url)
-driver.implicitly_wait(10)
-
-# Login
-driver.find_element(by=By.XPATH, value='//*[@id="username"]').send_keys(credentials.username)
-driver.find_element(by=By.XPATH, value='//*[@id="password"]').send_keys(credentials.password)
-driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div/app-user/form/div[4]/button').click()
-
-# "go to you tour list?" Page
-# Wait for complete loading or we are missing the element
-wait = WebDriverWait(driver, 10)
-element = wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="mytracks"]/app-tracks/div/div/app-user/app-user-welcome/div[3]/a')))
-
-try:
-    driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div/app-user/app-user-welcome/div[3]/a').click()
-except:
-    # In case the waiting was not working, just try again.
-    driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div/app-user/app-user-welcome/div[3]/a').click()
-
-# get working directory path and define absolute path to the GPX files:
-basepath = os.getcwd() + "\\data\\GPX\\"
-
-files =[]
-
-for entry in os.listdir(basepath):
-    if os.path.isfile(os.path.join(basepath, entry)):
-        files.append(entry)
-
-distance_data=[]
-
-XPATH_IMPORT_GPS_TRACK = '//*[@id="mytracks"]/app-tracks/div/app-track-list/div[2]/div/a'
-XPATH_THE_TOUR_COULD_NOT_BE_IMPORTEDD_OK_BUTTON = '/html/body/div[11]/div/div/div[2]/button'
-XPATH_GPX_FILE_SELECTION = '//*[@id="gps_import_form"]/div[1]/span[1]/input[2]'
-XPATH_GPX_FILE_UPLOAD_IMPORT_BUTTON = '//*[@id="gps_import_form"]/div[2]/button[1]'
-
-for file in files:
-    # Click on Button Import GPX File
-    try:
-
-        driver.find_element(by=By.XPATH, value=XPATH_IMPORT_GPS_TRACK).click()
-    except:
-        try:
-            driver.find_element(by=By.XPATH, value=XPATH_THE_TOUR_COULD_NOT_BE_IMPORTEDD_OK_BUTTON).click()
-            driver.find_element(by=By.XPATH, value=XPATH_IMPORT_GPS_TRACK).click()
-        except:
-            continue
-    #Input GPX file
-    # File selection
-    driver.find_element(by=By.XPATH, value=XPATH_GPX_FILE_SELECTION).send_keys(basepath + file)
-    # Upload
-    driver.find_element(by=By.XPATH, value=XPATH_GPX_FILE_UPLOAD_IMPORT_BUTTON).click()
-
-    # Collect data from page
-    try:
-        tour_id = re.search(r'(\d+)', file).group(1)
-        distance = driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div[1]/app-track-facts/div/div[3]/span[2]').text
-        elevation = driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div[1]/app-track-facts/div/div[9]/span[2]').text
-        up = elevation.split('/')[0]
-        down = elevation.split('/')[1]
-        height = driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div[1]/app-track-facts/div/div[10]/span[2]').text
-        min = height.split('/')[0]
-        max = height.split('/')[1]
-    except:
-        distance = "na"
-        elevation = "na"
-        up = "na"
-        down = "na"
-        height = "na"
-        min = "na"
-        max = "na"
-
-    distance_dict_item = {
-        'id': tour_id, # get id from GPX file name
-        'distance': distance,
-        'up': up,
-        'down': down,
-        'min': min,
-        'max': max}
-    distance_data.append(distance_dict_item)
-    # click to get back "go to you tour list?" Page
-    try:
-        wait = WebDriverWait(driver, 10)
-        element = wait.until(EC.element_to_be_clickable((By.XPATH, '//*[@id="mytracks"]/app-tracks/div/div[2]/div[11]/a')))
-    except:
-        continue
-    try:
-        driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div[2]/div[11]/a').click()
-    except:
-        # In case the waiting was not working, just try again.
-        driver.find_element(by=By.XPATH, value='//*[@id="mytracks"]/app-tracks/div/div[2]/div[11]/a').click()
-    print("loop end"+ file)
-#for loop end
-
-
-df = pd.DataFrame(distance_data)
-print(df.head(10))
+import shutil
+import pandas as pd
 
-# Export the DataFrame to a CSV file, we create 2 files:
-# 1. saves the data in the same file / overwrites database (indexing is included)
-#df.to_csv("data\\Distance_data_with_index0.csv",sep=';')
+from src.extractors import GpxMetrics
+from src.extractors.ElevationModel import ElevationModel
 
-# 2. saves the data in the same file / overwrites database (indexing is disabled) -> we can append it later
-df.to_csv("data\\Distance_data_without_index0.csv",sep=';',index = False)
+# The data folder next to this file
+data_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
 
-# 3. appends an existing csv file with new data:
-#df.to_csv("SAC_data_without_index.cs",sep=';', mode ="a", header = False, index = False)
+print("start")
+
+distance_path = os.path.join(data_folder, "Distance_data_without_index0.csv")
+scraped_path = os.path.join(data_folder, "Distance_data_scraped.csv")
+gpx_path = os.path.join(data_folder, "GPX")
+dem_path = os.path.join(data_folder, "DEM")
+
+# The data scraped from Schweizmobil is kept once as reference for the parity report
+if not os.path.exists(scraped_path) and os.path.exists(distance_path):
+    shutil.copyfile(distance_path, scraped_path)
+
+# The GPX files of SacExtractorGPX.py contain 2-D points only, their elevation is sampled from the elevation model
+if os.path.isdir(dem_path):
+    elevation_model = ElevationModel(dem_path)
+    for file in sorted(os.listdir(gpx_path)):
+        if file.endswith(".gpx"):
+            elevation_model.enrich_gpx(os.path.join(gpx_path, file))
+    print("Filled in the elevation of the GPX files")
+
+# Calculate the distance, ascent & descent and min & max elevation of all GPX files
+df = GpxMetrics.compute_distance_data(gpx_path)
+
+if os.path.exists(scraped_path):
+    df_scraped = pd.read_csv(scraped_path, sep=';', dtype=str, index_col=False)
+
+    # Parity report: calculated vs. scraped values and their relative difference per tour
+    report = GpxMetrics.parity_report(df, df_scraped)
+    report.to_csv(os.path.join(data_folder, "Distance_parity.csv"), sep=';', index=False)
+    print(report.describe())
+
+    # Tracks without elevation (e.g. GPX files with 2-D points only) keep the scraped elevation data
+    df = df.set_index('id')
+    df_scraped = df_scraped.astype({'id': str}).set_index('id')
+    taken_over = pd.DataFrame(False, index=df.index, columns=['up', 'down', 'min', 'max'])
+    for column in taken_over.columns:
+        missing = df[column] == 'na'
+        df.loc[missing, column] = df_scraped[column].reindex(df.index[missing]).fillna('na')
+        taken_over[column] = missing & (df[column] != 'na')
+    print("Taken over the scraped elevation data of", int(taken_over.any(axis=1).sum()), "tours:",
+          taken_over.sum().to_dict())
+    df = df.reset_index()
+
+print(df.head(10))
 
-# Closing browser
-driver.quit()    # the selenium-controlled chrome browser is terminated
-#driver.close()    # the you don't see the result
+# Export the DataFrame to a CSV file (indexing is disabled)
+df.to_csv(distance_path, sep=';', index=False)
 
 print("end SacExtractorDistance.py")
 print("end")
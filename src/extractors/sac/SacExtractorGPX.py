@@ -12,73 +12,106 @@
 # - we download the GPX information of the first track in a GPX file, which we will use calculating the distance of the tour
 #  - we collect each start and end point coordinates in a separate GPX_start_end.csv, which we will use find duplicates with comparison of tours from other websites
 
-from pyproj import Transformer
+# Run it from the repository root, so the src package can be imported:
+#   python -m src.extractors.sac.SacExtractorGPX
+# The files are read from and written to the data folder next to this file, whatever the working directory.
+
 import gpxpy
 import gpxpy.gpx
-import json
-import requests
 import argparse
 import browser_cookie3
+import os
 import re
 import pandas as pd
 
+from src.extractors import GeoUtil, HttpUtil
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.RecordWriter import RecordWriter
+from src.extractors.ResponseCache import ResponseCache
+from src.extractors.SacRouteClient import SacRouteClient
+
+# The data folder next to this file
+data_folder = os.path.join(os.path.dirname(os.path.abspath(__file__)), "data")
+
+
+# Writing the first track of a route in a GPX file and returning its start and end coordinates
+def write_gpx(tour_id, data):
+    gpx = gpxpy.gpx.GPX()
+    gpx_segment = gpxpy.gpx.GPXTrackSegment()
+
+    # We write the GXP data of the first version of the tour in a GXP file
+    # Remark: we only take the first track, even if multiple track versions are available
+    # Reason: we only scraped the information only about the first tour version previously - keep consistency
+    for seg in data['segments']:
+        try:
+            gpx_track = gpxpy.gpx.GPXTrack(name=re.sub(r'[^A-Za-z0-9\s]+', '', seg['title']),description=re.sub(r'[^A-Za-z0-9\s]+', '', seg['description']))
+        except:
+            gpx_track = gpxpy.gpx.GPXTrack(name='notitle',description='nodescription')
+        gpx.tracks.append(gpx_track)
+        gpx_segment = gpxpy.gpx.GPXTrackSegment()
+        gpx_track.segments.append(gpx_segment)
+
+        if 'geom' in seg and seg['geom']:
+            # All points of the segment are reprojected in a single call
+            points = GeoUtil.lv95_to_wgs84(seg['geom']['coordinates']).tolist()
+            gpx_segment.points = [gpxpy.gpx.GPXTrackPoint(lat, lon) for lat, lon in points]
+        break # Stop, after the first track.
+    # Write the data in a GXP file and save it:
+    with open(os.path.join(data_folder, "GPX", f'SAC-{tour_id}.gpx'),'w', encoding="utf-8") as f:
+        f.write(gpx.to_xml())
+
+    # We save the start and end coordinates of each tour in a separate output csv
+    try:
+        startpoint = str(gpx_segment.points[0].latitude)+";"+str(gpx_segment.points[0].longitude)
+        endpoint = str(gpx_segment.points[-1].latitude)+";"+str(gpx_segment.points[-1].longitude)
+    except:
+        startpoint = "na"
+        endpoint = "na"
+    return {
+        'tour_id': tour_id,
+        'start': startpoint,
+        'end': endpoint}
+
+
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(description='Converts SAC routes to GPX files')
     parser.add_argument('id', metavar='route_id', type=int, help='SAC ID of the route (last part of the URL)')
 
-    args_lang = "en"
-    tour_coord = [] #we create this list - outside of the for loop to save all start and end coordinates, after saving the gxp files
+    # we stream all start and end coordinates into a journal while saving the gxp files and compact it at the end,
+    # tours already in the journal of an interrupted run are skipped
+    tour_coord = RecordWriter(os.path.join(data_folder, "GPX_start_end.csv"), ['tour_id', 'start', 'end'], key='tour_id', sep=';')
 
     # Opening the SAC_data file and extracting the tour id column, which we use below
-    df_sac_id = pd.read_csv(f"data\SAC_data_without_index0.csv" , sep=';', usecols = ['tour_id'], index_col= False)
+    df_sac_id = pd.read_csv(os.path.join(data_folder, "SAC_data_without_index0.csv") , sep=';', usecols = ['tour_id'], index_col= False)
     print(df_sac_id)
+    tour_ids = [tour_id for tour_id in df_sac_id['tour_id'] if tour_id not in tour_coord]
 
-    # we iterate trough all tour id rows to access the GXP information of the tours, write the first section in a separate GXP file
-    for index, id in df_sac_id.iterrows():
-        args_id = id['tour_id']
-        print(args_id)
-        # Access the GXP data
-        cj = browser_cookie3.chrome()
-        with requests.get(f"https://www.sac-cas.ch/en/?type=1567765346410&tx_usersaccas2020_sac2020%5BrouteId%5D={args_id}&output_lang={args_lang}", cookies=cj) as url:
-            data = json.loads(url.content)
-        gpx = gpxpy.gpx.GPX()
-        transformer = Transformer.from_crs('epsg:2056', 'epsg:4326')
-
-        # We write the GXP data of the first version of the tour in a GXP file
-        # Remark: we only take the first track, even if multiple track versions are available
-        # Reason: we only scraped the information only about the first tour version previously - keep consistency
-        for seg in data['segments']:
-            try:
-                gpx_track = gpxpy.gpx.GPXTrack(name=re.sub(r'[^A-Za-z0-9\s]+', '', seg['title']),description=re.sub(r'[^A-Za-z0-9\s]+', '', seg['description']))
-            except:
-                gpx_track = gpxpy.gpx.GPXTrack(name='notitle',description='nodescription')
-            gpx.tracks.append(gpx_track)
-            gpx_segment = gpxpy.gpx.GPXTrackSegment()
-            gpx_track.segments.append(gpx_segment)
-
-            if 'geom' in seg and seg['geom']:
-                for x,y in map(lambda xy: transformer.transform(*xy),seg['geom']['coordinates']):
-                    gpx_segment.points.append(gpxpy.gpx.GPXTrackPoint(x,y))
-            break # Stop, after the first track.
-        # Write the data in a GXP file and save it:
-        with open(f'data\GPX\SAC-{args_id}.gpx','w', encoding="utf-8") as f:
-            f.write(gpx.to_xml())
-
-        # We save the start and end coordinates of each tour in a separate output csv
-        try:
-            startpoint = str(gpx_segment.points[0].latitude)+";"+str(gpx_segment.points[0].longitude)
-            endpoint = str(gpx_segment.points[-1].latitude)+";"+str(gpx_segment.points[-1].longitude)
-        except:
-            startpoint = "na"
-            endpoint = "na"
-        tour_coord_dict = {
-            'tour_id': args_id,
-            'start': startpoint,
-            'end': endpoint}
-        tour_coord.append(tour_coord_dict)
-        df_coord = pd.DataFrame(tour_coord)
-        print(df_coord.head(10))
-        df_coord.to_csv(f"data\GPX_start_end.csv", sep=';', index=False)
+    # Paces the requests to sac-cas.ch, slows down on 429/5xx responses
+    rate_limiter = RateLimiter(2, max_rate=10)
+
+    # Route JSON fetched on a previous run is read from disk or revalidated with a conditional request
+    cache = ResponseCache(os.path.join(data_folder, "cache"))
+
+    # One keep-alive session for all requests. The cookies are read from Chrome once and only for sac-cas.ch
+    session = HttpUtil.create_session(pool_size=8)
+    session.cookies.update(browser_cookie3.chrome(domain_name='sac-cas.ch'))
+    client = SacRouteClient(session, cache, rate_limiter, json_folder=os.path.join(data_folder, "JSON"), concurrency=8)
+
+    # The route JSON of the tours is fetched concurrently, each tour is converted to GPX as soon as its JSON arrived
+    print("Fetching the route JSON of", len(tour_ids), "tours")
+    for i, (tour_id, data, error) in enumerate(client.fetch_all(tour_ids)):
+        if error is not None:
+            print("Could not fetch route", tour_id, error)
+            continue
+        tour_coord.write(write_gpx(tour_id, data))
+        if i % 100 == 0:
+            print("Converted", i, "/", len(tour_ids), "tours")
+
+    # the rows follow the tours of SAC_data_without_index0.csv, tours that are no longer in it are dropped
+    tour_coord.compact(order=df_sac_id['tour_id'])
 
+    rate_limiter.log_stats()
+    cache.log_stats()
+    cache.close()
     print("end SacExtractorGPX.py")
-    print("end")
\ No newline at end of file
+    print("end")
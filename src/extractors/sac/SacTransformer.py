@@ -1,277 +1,303 @@
-
 # we have scraped Data from the SAC Tour Portal page -> SAC_data_without_index.csv
 # we have scraped all gpx tour data, the individual files are in the GPX folder and we have collected all start and end points of the tours -> GXP_start_end.csv
-# the gpx files we have uploaded into the Schweizmobile tour creator page  - where we scraped the distance of all tours- > Distance_data_without_index.csv
+# the distance, ascent & descent of all tours are calculated from the gpx files -> Distance_data_without_index.csv
 
 # Now from these 3 files we create first our stage1 than our stage3 file:
 # - SAC_data_without_index.csv
 # - Distance_data_without_index.csv
 # - GXP_start_end.csv
 
+# Run it from the repository root, so the src package can be imported:
+#   python -m src.extractors.sac.SacTransformer
+# The files are read from and written to the data folder next to this file, whatever the working directory.
+
+import logging
+import os
+from typing import List
+
+import numpy as np
 import pandas as pd
-import random
-import datetime
-
-print("1. We will create our stage1 document for SAC part:")
-####################################################################################
-print(80*"*")
-# 1. We load and join all data in one dataframe, the key is the tour id which is given in all 3 files:
-
-#open and load all 3 csv documents into the dataframes:
-df_sac_data = pd.read_csv(f"data\SAC_data_without_index0.csv", sep=';', index_col=False)
-df_sac_GPX = pd.read_csv(f"data\GPX_start_end.csv", sep=';', index_col=False)
-df_sac_distance = pd.read_csv(f"data\Distance_data_without_index0.csv", sep=';', index_col=False)
-
-# join GPX_start_end with Distance_data
-df_sac_stage1 = df_sac_GPX.join(df_sac_distance.set_index('id'), on='tour_id', how = "outer")
-
-# join stage1_joined with SAC_data
-df_sac_stage1 = df_sac_stage1.join(df_sac_data.set_index('tour_id'), on='tour_id', how = "outer")
-
-print(df_sac_stage1)
-df_sac_stage1.to_csv("data\\Sac_stage1.csv",sep=',',index = False, encoding="utf-8")
-
-# Remark:
-# We have decided to join the csv documents in this order, in order the longer text input are towards the eind of the table
-# which creates a better overview at the first sight.
-
-print(" 2. Transformation - creating our artificial stage2 file:")
-###################################################################################
-print(80*"*")
-
-# The below natural impurities were available in the stage1 file:
-# - NaN values: there were some dead tour page links, we have some NaN data -> we need to remove those rows
-# - wrong inputs/clean format: difficulty: clean values containing only T1-T6 (no other values, or no + or -)
-# - multiple inputs: time ascent and descent: keep only the longer input if there is a range e.g.: 09:00-09:15 - remove h and transform to time
-# - number format: min, max, up, down: remove ' and metric (m or km) transform to integer.
-# - start and end: remove ""
-
-# Injecting artificial impurities  in stage2:
-# - outliers: min, max outliers
-
-def myrandom(seed):
-    random.seed(seed)
-    x = [random.randint(1,1100) for i in range(1,11)]
-    return x
-
-df_sac_stage2 = df_sac_stage1
-for number in myrandom(9001):
-    #df_sac_stage2['min'][ number] = "99"+df_sac_stage2['min'][ number]
-    df_sac_stage2['min'] = df_sac_stage2['min'].replace(df_sac_stage2['min'][number],"99" + df_sac_stage2['min'][number])
-for number in myrandom(9003):
-    df_sac_stage2['max'] = df_sac_stage2['max'].replace(df_sac_stage2['max'][number], "-" + df_sac_stage2['max'][number])
-df_sac_stage2.to_csv("data\\Sac_stage2.csv" ,sep=',',index = False, encoding="utf-8")
-
-print("3. Filtering and removing missing values and not mountain hiking tours:")
-# ###############################################################################################
-print(80*"*")
-
-print("\n check duplicates: \n")
-print(df_sac_stage2[df_sac_stage2.duplicated(keep=False)])
-# -> We do not have duplicate rows
-
-#Removing na-s not relevant tours:
-df_sac_stage2.info()
-# We see that all columns contain 1373 values except map and description.
-# We assume these rows are the tours, where dead link or no information could be scraped.
-# We look at missing map values more closely:
-def get_null_value(df,column):
-    df_null_value = df[df[column].isnull()]
-    #df_null_value.to_csv("data\\"+column +"_null.csv" ,sep=',',index = False) -> makes easier inspecting the files.
-    print(df_null_value)
-    return df_null_value
-
-def get_specific_value(df,column,value,boolean):
-    df_specific_value = df[df[column].str.contains(value) == boolean]
-    #df_specific_value.to_csv("data\\"+column + "_" + value + "_" + str(boolean) +".csv" ,sep=',',index = False)  -> makes easier inspecting the files.
-    print(df_specific_value)
-    return df_specific_value
-
-print("3.1 NAN values in map")
-get_null_value(df_sac_stage2,'map')
-# If we look at the page link we can see they are all snowshoeing tours NOT hiking tours, so we can drop them from our database.
-df_sac_stage2v1 = df_sac_stage2[df_sac_stage2.map.notnull()]
-# our new dataframe is stage2 version 1:
-df_sac_stage2v1.info()
-
-print("3.2 NaN values in description")
-get_null_value(df_sac_stage2v1,'description')
-# here we have 2 mountain hiking tours and 6 via ferrata rows -> we need further investigation on tour types:
-
-print(80*"*")
-print("We are filtering out all NON-mountain-hiking tours:")
-df_sac_stage2_NoMountainHiking = get_specific_value(df_sac_stage2v1, 'link','mountain-hiking', False)
-# we check the unique values of tour type:
-print("\n In Non-hikig-tour list are below tour types:\n ")
-print(df_sac_stage2_NoMountainHiking.link.str.extract(r'^(?:[^\/]*\/){7}\s*([\w-]+)')[0].unique())
-# we see there is no mountain hiking, so we can drop all this values
-
-print(80*"*")
-print("We filter all tours containing mountain hiking values and store in our stage2v2 dataframe:")
-df_sac_stage2v2 = get_specific_value(df_sac_stage2v1, 'link','mountain-hiking', True)
-df_sac_stage2v2.info()
-
-# we have still missing values in description column:
-get_null_value(df_sac_stage2v2,'description')
-# Missing description is ok, we decide to keep those tours.
-
-print("4. Inspecting, cleaning na values")
-###############################################################################################
-print(80*"*")
-
-# 4.1 Checking "na" values in start and end coordinates:
-get_specific_value(df_sac_stage2v2, 'start','na', True) # -> We have 10 rows
-# Given we do not have the GPX coordinates, we do not have distance and start and end dates,
-# we will not be able to join them in the overall database (stage3 merge) and calculating of fitness level wil not be possible
-# so we exclude them from our dataframe.
-
-# Our new dataframe going forward is:
-df_sac_stage2v3 = get_specific_value(df_sac_stage2v2, 'start','na', False)
-
-# 4.2 Inspecting rows where we have added "na" values while the scraping process:
-
-# We filter rows which are NOT connected to elevation, ascent and descent and any values are "na"
-# This is an empty list -> no more na values in these columns.
-df_sac_stage2v3.query('tour_id =="na" | start =="na" | end =="na" | distance =="na" | title =="na" | subtitle =="na" | difficulty =="na" | link =="na" | map =="na" | description =="na"')#.to_csv("data\\query1.csv" ,sep=';',index = False)
-
-# We filter rows which are connected to elevation:
-df_sac_stage2v3.query('time_ascent =="na" | ascent =="na" | time_descent =="na" | descent =="na" | up =="na" | down =="na" | min =="na" | max =="na"')#.to_csv("data\\query2.csv" ,sep=',',index = False)
-# We keep all the remaining "na" values in the data frame, given there are often either ascent or descent data available.
-
-print("5 Removing metrics & outliers")
-###############################################################################################
-
-# 5.1 Remove metric & time units: m, km and h and format numbers
-def remove_metrics(df, column, metrics, dtype):
-    return df.join( df[column].str.replace(metrics, "", regex=True).astype(dtype=dtype, errors="ignore"), rsuffix='_clean')
-
-# Align time format
-def convert_time(value):
-    if len(value) == 1:
-        value = "0"+value + ":00"
-    elif value == "na":
-        value = "00:00"
-    return value
-
-df_sac_stage2v4 = df_sac_stage2v3
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'distance','km',float) #remove metrics km and format number to float
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'up','[^\\d]',int) #remove metrics m and format number to integer
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'down','[^\\d]',int) #remove metrics m and format number to integer
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'min','[^\\d]',int) #remove metrics m and format number to integer, outliers negative values already corrected
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'max','[^\\d]',int) #remove metrics m and format number to integer, outliers negative values already corrected
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'ascent','m',int) #remove metrics m and format number to integer
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'descent','m',int) #remove metrics m and format number to integer
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'difficulty','[^T\\d]',str) #remove + or - in string
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'time_ascent','(?!(\w)|\d*\:?\d+).*',str) #remove h and take the last duration if multiple available
-df_sac_stage2v4 = remove_metrics(df_sac_stage2v4,'time_descent','(?!(\w)|\d*\:?\d+).*',str) #remove h and take the last duration if multiple available
-
-# Convert the string column to a time column
-df_sac_stage2v4['time_ascent_clean'] = df_sac_stage2v4['time_ascent_clean'].apply(convert_time)
-df_sac_stage2v4['time_ascent_clean'] = pd.to_datetime(df_sac_stage2v4['time_ascent_clean'], format='%H:%M').dt.time
-
-df_sac_stage2v4['time_descent_clean'] = df_sac_stage2v4['time_descent_clean'].apply(convert_time)
-df_sac_stage2v4['time_descent_clean'] = pd.to_datetime(df_sac_stage2v4['time_descent_clean'], format='%H:%M').dt.time
-
-#Optional to inspect csv document:
-#df_sac_stage2v4.to_csv("data\\clean.csv" ,sep=',',index = False, encoding="utf-8")
-
-# 5.2. Checking further outliers
-# We take as borders the highest and lowers point of Switzerland
-# - Dufourspitze is with 4.634 m
-# - Lago Maggiore is with 193 m
-# For Ascent and descent we take the difference as maximum ascent (as it is a trail running, if someone is climbing more than this elevation in a tour / one day).
-# For diestance we take as upper limit 50km as it is longer as marathon distance and very demanding distance for hiking tours for 1 day.
-
-def outliers_CH(df, column,min_value, max_value):
-    print(80 * "*")
-    print("Outliers "+ column)
-    print(df[(df[column] < min_value) | (df[column] > max_value )][column])
-    return df[(df[column] < min_value) | (df[column] > max_value )]
-
-print(outliers_CH(df_sac_stage2v4, 'min_clean', 193, 4634))
-print(outliers_CH(df_sac_stage2v4, 'max_clean', 193, 4634))
-print(outliers_CH(df_sac_stage2v4, 'distance_clean', 0, 50))
-print(outliers_CH(df_sac_stage2v4, 'up_clean', 0, 4634-193))
-print(outliers_CH(df_sac_stage2v4, 'down_clean', 0, 4634-193))
-
-# We can see we do only have outliers in min_clean column -> where we have the lowest points of the tours.
-# We see a pattern that all outliers begin with a pattern of 99 - so we decide to remove this 2 digits in front of the numbers:
-
-def clean_99(value):
-    if str(value).startswith("99") and value > 9000: # min high is over 100m, a dirty value must be over 9000
-        value_str = str(value)[2:]
-        value = int(value_str)
-    return value
-
-df_sac_stage2v5 = df_sac_stage2v4
-df_sac_stage2v5['min_clean'] = df_sac_stage2v5['min_clean'].apply(clean_99)
-
-#Optional to inspect csv document:
-#df_sac_stage2v5.to_csv("data\\clean2.csv" ,sep=',',index = False, encoding="utf-8")
-
-print("6. Calculated fields")
-###############################################################################################
-print(80*"*")
-
-# We will calculate below fields with conditions:
-#  - difficulty: easy(T1), medium(T2+T3), difficult(T4+T5+T6)
-#  - fitness level:
-#    easy: distance ≤ 12 km ,elevation difference ≤ 400 hm, total time: ≤ 3 h
-#    medium: distance ≤ 20 km ,elevation difference ≤ 900 hm, total time: ≤ 5 h
-#    difficult: distance > 20 km ,elevation difference > 900 hm, total time: > 5 h
-
-print("6.1 Difficulty levels -> calculated column 1")
-
-def difficulty(value):
-    if value == "T1":
-        value = "easy"
-    elif value == "T2" or value == "T3":
-        value = "medium"
-    else:
-        value = "difficult"
-    return value
-
-df_sac_stage2v5['difficulty_calc1'] = df_sac_stage2v5['difficulty_clean'].apply(difficulty)
-print(df_sac_stage2v5['difficulty_calc1'])
-
-print(" 6.2 Fitness level -> calculated column 2")
-
-def fitness(distance,ascent,time_ascent, time_descent):
-    try:
-        if distance<= 12 and int(ascent) <= 400 and (time_ascent <= datetime.time(3, 0) or time_descent <= datetime.time(3, 0)):
-            value = "easy"
-        elif distance <= 20 and int(ascent) <= 900 and (time_ascent <= datetime.time(5, 0) or time_descent <= datetime.time(5, 0)):
-            value = "medium"
+
+from src.transformers.ImpurityInjector import Corruption, ImpurityInjector
+
+
+class SacTransformer:
+    """Transforms the data extracted from the SAC route portal into the stage 1, 2 and 3 files.
+
+    All derived columns are computed on whole columns, so the transformation takes
+    milliseconds and scales with the number of tours.
+
+    Parameters
+    ----------
+    data_folder : str (optional)
+        The folder with the extracted csv files, the stage files are written to it
+        default: 'data'
+    verbose : bool (optional)
+        If true, the intermediate data frames are printed to inspect the cleaning steps
+        default: False
+    impurities : List[Corruption] (optional)
+        The artificial impurities of stage 2
+        default: 10 min elevations with a 99 prefix and 10 max elevations with a minus sign
+    seed : int (optional)
+        The seed of the rows the impurities are injected into
+        default: 9001
+
+    Attributes
+    ----------
+    manifest : pd.DataFrame
+        The impurities injected into stage 2, see ImpurityInjector.inject
+    logger : logging.Logger
+        The logger for this class.
+    """
+
+    stage3_columns = ['tour_id', 'start', 'end', 'distance_clean', 'ascent_clean', 'descent_clean', 'time_ascent_clean',
+                      'time_descent_clean', 'difficulty', 'difficulty_calc1', 'fitness_calc2', 'leistungskm_calc3',
+                      'min_clean', 'max_clean', 'title', 'subtitle', 'link', 'map', 'description']
+
+    # The highest and lowest point of Switzerland: Dufourspitze 4'634 m and Lago Maggiore 193 m.
+    # The difference is the maximum ascent and descent of a tour, 50 km (longer than a marathon) its maximum distance.
+    lowest_point = 193
+    highest_point = 4634
+    max_distance = 50
+
+    manifest: pd.DataFrame
+
+    def __init__(self, data_folder: str = 'data', verbose: bool = False, impurities: List[Corruption] | None = None,
+                 seed: int = 9001) -> None:
+        self.data_folder = data_folder
+        self.verbose = verbose
+        self.impurities = impurities if impurities is not None else [Corruption('min', count=10, prefix='99'),
+                                                                     Corruption('max', count=10, prefix='-')]
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+
+    def transform(self) -> pd.DataFrame:
+        """Creates the stage 1, 2 and 3 files.
+
+        Returns
+        -------
+        pd.DataFrame
+            The stage 3 data
+        """
+
+        stage1 = self.join_sources()
+        self.write(stage1, 'Sac_stage1.csv')
+
+        stage2 = self.inject_impurities(stage1)
+        self.write(stage2, 'Sac_stage2.csv')
+        self.write(self.manifest, 'Sac_stage2_manifest.csv')
+
+        stage3 = self.filter_tours(stage2)
+        stage3 = self.clean_units(stage3)
+        self.report_outliers(stage3)
+        stage3 = self.remove_outliers(stage3)
+        stage3 = self.calculate_fields(stage3)
+        self.check_impurities(stage3)
+        stage3 = stage3.loc[:, self.stage3_columns]
+        for column in ['time_ascent_clean', 'time_descent_clean']:
+            stage3[column] = stage3[column].dt.time
+        self.write(stage3, 'Sac_stage3.csv')
+        return stage3
+
+    def join_sources(self) -> pd.DataFrame:
+        """Joins the tour data, the start & end points and the distance data on the tour id.
+
+        The longer text columns end up towards the end of the table.
+        """
+
+        sac_data = self.read('SAC_data_without_index0.csv')
+        sac_gpx = self.read('GPX_start_end.csv')
+        sac_distance = self.read('Distance_data_without_index0.csv')
+
+        stage1 = sac_gpx.join(sac_distance.set_index('id'), on='tour_id', how='outer')
+        stage1 = stage1.join(sac_data.set_index('tour_id'), on='tour_id', how='outer')
+        self.show('Stage 1', stage1)
+        return stage1
+
+    def inject_impurities(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Injects the artificial impurities into a copy of the data and keeps the manifest of the changes.
+
+        The natural impurities of stage 1 are NaN values of dead tour page links, difficulties
+        with + or -, time ranges such as 09:00-09:15 and numbers with ' and units.
+        """
+
+        df, self.manifest = ImpurityInjector(self.impurities, seed=self.seed).inject(df)
+        self.show('Injected impurities', self.manifest)
+        return df
+
+    def check_impurities(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Checks that the cleaning restored the original values of the injected impurities.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The cleaned data with the <column>_clean columns
+
+        Returns
+        -------
+        pd.DataFrame
+            The manifest rows of the tours kept in stage 3 whose cleaned value differs from the original value
+        """
+
+        changes = self.manifest[self.manifest['row'].isin(df.index)]
+        # only the columns cleaned into a <column>_clean counterpart can be checked
+        unchecked = [column for column in changes['column'].unique() if column + '_clean' not in df.columns]
+        if unchecked:
+            self.logger.info('Impurities in {} have no cleaned column to check'.format(', '.join(unchecked)))
+            changes = changes[~changes['column'].isin(unchecked)]
+
+        mismatches = []
+        for column, group in changes.groupby('column'):
+            expected = pd.to_numeric(group['original'].astype(str).str.replace('[^\\d]', '', regex=True), errors='coerce')
+            cleaned = pd.to_numeric(df.loc[group['row'], column + '_clean'], errors='coerce').to_numpy()
+            mismatches.append(group[expected.to_numpy() != cleaned])
+
+        mismatches = pd.concat(mismatches) if mismatches else changes
+        if len(mismatches) > 0:
+            self.logger.warning('{} of {} injected impurities were not cleaned'.format(len(mismatches), len(changes)))
+            self.show('Impurities not cleaned', mismatches)
         else:
-            value = "difficult"
-    except:
-        value = "na"
-    return value
-
-df_sac_stage2v5['fitness_calc2'] = df_sac_stage2v5.apply(lambda x: fitness(x['distance_clean'],x['ascent_clean'], x['time_ascent_clean'], x['time_descent_clean']), axis=1)
-print(df_sac_stage2v5['fitness_calc2'])
-
-print("6.3  'leistungskilometer' -> calculated column 3")
-# Calculation: Distance + total ascent / 100m
-
-def leistungskm(distance, ascent):
-    try:
-        value = round(distance + int(ascent)/100)
-    except:
-        value = round(distance)
-    return value
-
-df_sac_stage2v5['leistungskm_calc3'] = df_sac_stage2v5.apply(lambda x: leistungskm(x['distance_clean'],x['ascent_clean']), axis=1)
-print(df_sac_stage2v5['leistungskm_calc3'])
-
-print("7. Remove unwanted columns and print stage3 csv")
-###############################################################################################
-print(80*"*")
-
-# Drop the original string column
-df_sac_stage3 = df_sac_stage2v5.drop(['distance','up','down','min','max','time_ascent','ascent','time_descent','descent','difficulty_clean', 'up_clean','down_clean',], axis=1)
-df_sac_stage3 = df_sac_stage3.loc[:,['tour_id','start','end','distance_clean','ascent_clean','descent_clean','time_ascent_clean','time_descent_clean','difficulty','difficulty_calc1','fitness_calc2','leistungskm_calc3','min_clean','max_clean','title','subtitle', 'link','map','description']]
-df_sac_stage3.to_csv("data\\Sac_stage3.csv" ,sep=',',index = False, encoding="utf-8")
-
-print("end SacTransformer.py")
-print("end")
+            self.logger.info('All {} injected impurities were cleaned'.format(len(changes)))
+        return mismatches
+
+    def filter_tours(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Removes the tours that are not mountain hiking tours or have no GPX data."""
+
+        if self.verbose:
+            print('Duplicated rows:')
+            print(df[df.duplicated(keep=False)])
+            df.info()
+
+        # tours without map are snowshoeing tours, dead tour page links have no data at all
+        self.show('Tours without map', df[df['map'].isnull()])
+        df = df[df['map'].notnull()]
+
+        # via ferrata and the other tour types are given by the link
+        is_hiking = df['link'].str.contains('mountain-hiking') == True
+        if self.verbose:
+            tour_types = df.loc[~is_hiking, 'link'].str.extract(r'^(?:[^\/]*\/){7}\s*([\w-]+)')[0].unique()
+            print('Tour types removed: ', tour_types)
+        df = df[is_hiking]
+
+        # a missing description is ok, the tours are kept
+        self.show('Tours without description', df[df['description'].isnull()])
+
+        # without GPX coordinates, there is no distance and the tour cannot be merged in stage 3
+        no_start = df['start'].str.contains('na') == True
+        self.show('Tours without start', df[no_start])
+        df = df[df['start'].str.contains('na') == False]
+
+        # the remaining 'na' values are kept, often either ascent or descent data is available
+        self.logger.info('Kept {} mountain hiking tours'.format(len(df)))
+        return df
+
+    def clean_units(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Removes the units m, km and h and the ' of the numbers, and converts the times."""
+
+        df = df.copy()
+        df['distance_clean'] = self.strip_units(df['distance'], 'km', float)
+        for column in ['up', 'down', 'min', 'max']:
+            df[column + '_clean'] = self.strip_units(df[column], '[^\\d]', int)
+        df['ascent_clean'] = self.strip_units(df['ascent'], 'm', int)
+        df['descent_clean'] = self.strip_units(df['descent'], 'm', int)
+        # T1-T6 without + or -
+        df['difficulty_clean'] = self.strip_units(df['difficulty'], '[^T\\d]', str)
+        for column in ['time_ascent', 'time_descent']:
+            # removes h and takes the last duration if a range is given
+            df[column + '_clean'] = self.to_time(self.strip_units(df[column], '(?!(\\w)|\\d*\\:?\\d+).*', str))
+        return df
+
+    def report_outliers(self, df: pd.DataFrame) -> None:
+        """Prints the values outside of the Swiss borders, see lowest_point and highest_point."""
+
+        if not self.verbose:
+            return
+
+        max_elevation = self.highest_point - self.lowest_point
+        for column, min_value, max_value in [('min_clean', self.lowest_point, self.highest_point),
+                                             ('max_clean', self.lowest_point, self.highest_point),
+                                             ('distance_clean', 0, self.max_distance),
+                                             ('up_clean', 0, max_elevation),
+                                             ('down_clean', 0, max_elevation)]:
+            values = pd.to_numeric(df[column], errors='coerce')
+            print(80 * '*')
+            print('Outliers ' + column)
+            print(df.loc[(values < min_value) | (values > max_value), column])
+
+    def remove_outliers(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Removes the 99 prefix of the outliers in the min elevation, the negative max elevations lost their - in clean_units."""
+
+        # the lowest point of a tour is over 100 m, a value with a 99 prefix is over 9000
+        min_clean = df['min_clean']
+        prefixed = min_clean.astype(str).str.startswith('99') & (min_clean > 9000)
+        df = df.copy()
+        df['min_clean'] = min_clean.where(~prefixed, min_clean.astype(str).str[2:].astype(min_clean.dtype))
+        self.logger.info('Removed the 99 prefix of {} outliers'.format(int(prefixed.sum())))
+        return df
+
+    def calculate_fields(self, df: pd.DataFrame) -> pd.DataFrame:
+        """Calculates the difficulty and fitness levels and the 'Leistungskilometer'.
+
+        - difficulty: easy (T1), medium (T2, T3), difficult (T4, T5, T6)
+        - fitness level:
+          easy: distance ≤ 12 km, ascent ≤ 400 m, ascent or descent time ≤ 3 h
+          medium: distance ≤ 20 km, ascent ≤ 900 m, ascent or descent time ≤ 5 h
+          difficult: all other tours, na if the ascent is not known
+        - Leistungskilometer: distance + ascent / 100 m
+        """
+
+        df = df.copy()
+        difficulty = df['difficulty_clean']
+        df['difficulty_calc1'] = np.select([difficulty == 'T1', difficulty.isin(['T2', 'T3'])], ['easy', 'medium'],
+                                           'difficult')
+
+        distance = df['distance_clean']
+        ascent = pd.to_numeric(df['ascent_clean'], errors='coerce')
+        hours = [df[column].dt.hour + df[column].dt.minute / 60 for column in ['time_ascent_clean', 'time_descent_clean']]
+        within_3h = (hours[0] <= 3) | (hours[1] <= 3)
+        within_5h = (hours[0] <= 5) | (hours[1] <= 5)
+        df['fitness_calc2'] = np.select(
+            [ascent.isna(), (distance <= 12) & (ascent <= 400) & within_3h, (distance <= 20) & (ascent <= 900) & within_5h],
+            ['na', 'easy', 'medium'], 'difficult')
+
+        df['leistungskm_calc3'] = np.round(distance + np.trunc(ascent.fillna(0)) / 100).astype(int)
+
+        self.show('Calculated fields', df[['difficulty_calc1', 'fitness_calc2', 'leistungskm_calc3']])
+        return df
+
+    @staticmethod
+    def strip_units(values: pd.Series, pattern: str, dtype: type) -> pd.Series:
+        """Removes the pattern from the values and converts them, the values stay strings if any of them cannot be converted."""
+
+        stripped = values.str.replace(pattern, '', regex=True)
+        try:
+            return stripped.astype(dtype)
+        except (ValueError, TypeError):
+            return stripped
+
+    @staticmethod
+    def to_time(values: pd.Series) -> pd.Series:
+        """Converts durations such as '7' or '02:30' to times of day on 1900-01-01, 'na' to 00:00."""
+
+        values = values.where(values.str.len() != 1, '0' + values + ':00')
+        values = values.mask(values == 'na', '00:00')
+        return pd.to_datetime(values, format='%H:%M')
+
+    def read(self, file_name: str) -> pd.DataFrame:
+        return pd.read_csv(os.path.join(self.data_folder, file_name), sep=';', index_col=False)
+
+    def write(self, df: pd.DataFrame, file_name: str) -> None:
+        self.logger.info('Writing {} rows to {}'.format(len(df), file_name))
+        df.to_csv(os.path.join(self.data_folder, file_name), sep=',', index=False, encoding='utf-8')
+
+    def show(self, title: str, df: pd.DataFrame) -> None:
+        if self.verbose:
+            print(80 * '*')
+            print(title)
+            print(df)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    SacTransformer(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data'), verbose=True).transform()
+    print("end SacTransformer.py")
@@ -1,172 +1,303 @@
-from time import sleep
+# Extracting, transforming and loading the hiking routes of schweizmobil.ch
+# Run it from the repository root, so the src package can be imported:
+#   python -m src.extractors.schweizmobil.SchweizmobilExtractor
+# The stage files and the output folder of the checkpoints and the cache are next to this file,
+# whatever the working directory.
+
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
 
 import pandas as pd
 import mariadb
-from selenium import webdriver
+from selenium.common import NoSuchElementException
 from selenium.webdriver.common.by import By
 
+from src.extractors import SeleniumUtil
+from src.extractors.PageSnapshot import FieldSelector, PageSnapshot
+from src.extractors.RateLimiter import RateLimiter
+from src.extractors.RecordWriter import RecordWriter
+from src.extractors.ResponseCache import ResponseCache
+from src.extractors.SchweizmobilCatalog import SchweizmobilCatalog
+from src.transformers.UnitNormalizer import UnitNormalizer
 
-# Extracting route data from the website schweizmobil.ch
-def extract():
-    driver = webdriver.Chrome()
-    driver.implicitly_wait(30)
-
-    routes = []
-
-    # Local routes
-    driver.get('https://schweizmobil.ch/de/wanderland/lokale-routen')
-
-    # Scrolling down to load all routes
-    for i in range(1, 150):
-        driver.execute_script(f"document.getElementById('main').scrollTop = {i * 500};")
-        sleep(1)
-
-    # Extracting route URLs and names
-    box = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-card-it"]')
-    for b in box:
-        url = b.get_attribute('href')
-        name = b.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
-        routes.append({'url': url, 'name': name})
-
-    # Regional routes
-    driver.get('https://schweizmobil.ch/de/wanderland/regionale-routen')
-
-    # Scrolling down to load all routes
-    for i in range(1, 40):
-        driver.execute_script(f"document.getElementById('main').scrollTop = {i * 500};")
-        sleep(1)
-
-    regionale_routen = []
-    box = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-card-it"]')
-    for b in box:
-        url = b.get_attribute('href')
-        name = b.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
-        regionale_routen.append({'url': url, 'name': name})
-
-    # Extracting sub-routes for regional routes
-    for rr in regionale_routen:
-        driver.get(rr['url'])
-
-        etappen = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-list-it"]')
-        for etappe in etappen:
-            etappe_url = etappe.get_attribute('href')
-            etappe_name = etappe.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
-
-            routes.append({'url': etappe_url, 'name': f"{rr['name']} {etappe_name}"})
 
-    # National routes
-    driver.get('https://schweizmobil.ch/de/wanderland/nationale-routen')
+# The folder of this file, holding the stage files, and the folder of the checkpoints, the cache and the JSON
+folder = os.path.dirname(os.path.abspath(__file__))
+output_folder = os.path.join(folder, 'output')
 
-    # Scrolling down to load all routes
-    for i in range(1, 5):
-        driver.execute_script(f"document.getElementById('main').scrollTop = {i * 500};")
-        sleep(1)
+# The cards of the infinite-scroll route lists
+route_card_selector = 'a[data-cy="route-card-it"]'
 
-    nationale_routen = []
-    box = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-card-it"]')
-    for b in box:
-        url = b.get_attribute('href')
-        name = b.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
-        nationale_routen.append({'url': url, 'name': name})
 
-    # Extracting sub-routes for national routes
-    for nr in nationale_routen:
-        driver.get(nr['url'])
+# Creating a headless driver with the lean crawl profile for the driver pool
+# The network events are logged, so the JSON behind the route lists can be captured
+def create_driver():
+    driver = SeleniumUtil.initialize_new_instance(profile=SeleniumUtil.CrawlProfile(capture_network=True))
+    driver.implicitly_wait(30)
+    return driver
 
-        # Find all elements with the specified CSS selector
-        etappen = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-list-it"]')
-        for etappe in etappen:
-            etappe_url = etappe.get_attribute('href')
-            etappe_name = etappe.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
 
-            # Append the sub-route URL and name to the 'routes' list
-            routes.append({'url': etappe_url, 'name': f"{nr['name']} {etappe_name}"})
+# Extracting route data from the website schweizmobil.ch
+# By default the route cards and every route page are read. With from_json, the routes, stages and their facts
+# are read from the JSON the route lists are rendered from, see SchweizmobilCatalog for the keys it reads.
+# The JSON path stays opt-in until captured responses of the website are checked in and tested.
+# The stage lists and the route pages are read on a pool of drivers, finished ones are checkpointed,
+# so an interrupted crawl continues where it stopped.
+def extract(from_json=False, workers=4):
+    # Paces page loads, slows down when elements cannot be found
+    rate_limiter = RateLimiter(1, max_rate=4)
+
+    # Route pages read on a previous run within the TTL are taken from the cache instead of the browser
+    cache = ResponseCache(os.path.join(output_folder, 'cache'))
+
+    # Checkpoints of the stage lists and of the facts of the routes
+    stages_writer = RecordWriter(os.path.join(output_folder, 'schweizmobil_stages.csv'), ['key', 'parent', 'url', 'name'],
+                                 key='key', batch_size=1)
+    facts_writer = RecordWriter(os.path.join(output_folder, 'schweizmobil_facts.csv'), SchweizmobilCatalog.columns,
+                                key='url', batch_size=1)
+
+    # Warm drivers, each recycled every 100 pages to keep the memory of the browsers flat over the whole crawl
+    with SeleniumUtil.DriverPool(size=workers, factory=create_driver, max_pages=100) as pool:
+        routes = []
+        if from_json:
+            catalog = SchweizmobilCatalog(json_folder=os.path.join(output_folder, 'schweizmobil_json'), rate_limiter=rate_limiter)
+            with pool.driver() as driver:
+                catalog.capture(driver)
+            routes = catalog.routes()
+            print('Found', len(routes), 'routes in the JSON of the route lists')
+
+        failed = 0
+        if not routes:
+            routes, failed = extract_route_lists(pool, rate_limiter, stages_writer)
+
+        failed += extract_facts(pool, rate_limiter, cache, routes, facts_writer)
+
+    if failed:
+        # The journals are kept, the next run only reads the failed pages again
+        print(failed, 'pages could not be read, run again to continue the crawl')
+        stages_writer.close()
+        facts_writer.close()
+    else:
+        # The crawl is complete, the checkpoints are merged into their files
+        stages_writer.compact()
+        facts_writer.compact()
 
-    # This loop iterates over each route in the routes list.
-    # For each iteration, it retrieves the URL of the route from the current route dictionary and instructs the web driver to navigate to that URL using driver.get().
-    # It then prints the URL using print(route['url']).
-    for route in routes:
-        driver.get(route['url'])
-        print(route['url'])
-
-        # Extract route details such as distance, altitude up, altitude down, and more
-        route['distance'] = driver.find_element(By.XPATH,
-                                                '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[1]/div[2]/div/span').text
-        route['altitude_up'] = driver.find_element(By.XPATH,
-                                                   '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[1]/div[3]/span').text
-        route['altitude_down'] = driver.find_element(By.XPATH,
-                                                     '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[1]/div[4]/span').text
-
-        group2 = driver.find_element(By.XPATH,
-                                     '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]')
-        items = group2.find_elements(By.CLASS_NAME, 'items-stretch')
-
-        # Check the number of items in the group
-        if len(items) == 2:
-            # If there are two items, extract difficulty level and fitness level
-            route['difficulty_level'] = driver.find_element(By.XPATH,
-                                                            '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]/div[2]/span').text
-            route['fitness_level'] = driver.find_element(By.XPATH,
-                                                         '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]/div[3]/span').text
-
-        if len(items) == 3:
-            # If there are three items, extract duration, difficulty level, and fitness level
-            route['duration'] = driver.find_element(By.XPATH,
-                                                    '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]/div[2]/span').text
-            route['difficulty_level'] = driver.find_element(By.XPATH,
-                                                            '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]/div[3]/span').text
-            route['fitness_level'] = driver.find_element(By.XPATH,
-                                                         '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts/div[2]/div[4]/span').text
+    rate_limiter.log_stats()
+    print('Response cache:', cache.stats())
+    cache.close()
 
     # Create a pandas DataFrame from the 'routes' list and save it to a CSV file
     df = pd.DataFrame(routes)
-    df.to_csv('schweizmobil_stage_1.csv', index=False)
+    df.to_csv(os.path.join(folder, 'schweizmobil_stage_1.csv'), index=False)
+
+
+# Running a task for each item on the threads of the pool, the results are handed to on_result as they complete
+# and returned in the order of the items, None for the items that failed
+def map_on_pool(pool, task, items, on_result=None):
+    results = [None] * len(items)
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        futures = {executor.submit(task, item): i for i, item in enumerate(items)}
+        for future in as_completed(futures):
+            i = futures[future]
+            try:
+                results[i] = future.result()
+            except Exception as e:
+                print('Could not read', items[i]['url'], e)
+                continue
+            if on_result is not None:
+                on_result(items[i], results[i])
+    return results
+
+
+# Extracting the URLs and names of all local routes and of the stages of all regional and national routes
+# Returns the routes and the number of regional and national routes whose stages could not be read
+def extract_route_lists(pool, rate_limiter, writer):
+    with pool.driver() as driver:
+        # Local routes
+        routes = extract_route_cards(driver, rate_limiter, 'https://schweizmobil.ch/de/wanderland/lokale-routen')
+
+        # Regional and national routes, they are listed by their stages
+        parents = extract_route_cards(driver, rate_limiter, 'https://schweizmobil.ch/de/wanderland/regionale-routen')
+        parents += extract_route_cards(driver, rate_limiter, 'https://schweizmobil.ch/de/wanderland/nationale-routen')
+
+    # The stages of the routes finished by an interrupted crawl are read from the checkpoint
+    stages_by_parent = {}
+    for record in writer.read(writer.journal_path):
+        stages = stages_by_parent.setdefault(record['parent'], [])
+        if record['url']:
+            stages.append({'url': record['url'], 'name': record['name']})
+    todo = [parent for parent in parents if parent['url'] not in stages_by_parent]
+    print('Reading the stages of', len(todo), 'of', len(parents), 'regional and national routes')
+
+    def read_stages(parent):
+        with pool.driver() as driver:
+            return extract_route_stages(driver, rate_limiter, parent)
+
+    def checkpoint(parent, stages):
+        stages_by_parent[parent['url']] = stages
+        for i, stage in enumerate(stages):
+            writer.write({'key': f"{parent['url']}#{i}", 'parent': parent['url'], 'url': stage['url'], 'name': stage['name']})
+        if not stages:
+            # A route without stages is checkpointed too, so it is not read again
+            writer.write({'key': f"{parent['url']}#", 'parent': parent['url'], 'url': '', 'name': ''})
+
+    results = map_on_pool(pool, read_stages, todo, on_result=checkpoint)
+
+    # The stages in the order of their routes
+    for parent in parents:
+        routes.extend(stages_by_parent.get(parent['url'], []))
+    return routes, results.count(None)
+
+
+# Extracting the facts of all routes without facts from their route pages
+# Returns the number of routes whose facts could not be read
+def extract_facts(pool, rate_limiter, cache, routes, writer):
+    # The facts read by an interrupted crawl are taken from the checkpoint
+    checkpointed = {record['url']: record for record in writer.read(writer.journal_path)}
+    todo = []
+    for route in routes:
+        if route['url'] in checkpointed:
+            route.update({k: v for k, v in checkpointed[route['url']].items() if v != ''})
+        # Routes of the JSON have their facts already
+        if not all(route.get(fact) is not None for fact in ['distance', 'altitude_up', 'altitude_down']):
+            todo.append(route)
+    print('Reading the facts of', len(todo), 'of', len(routes), 'routes')
+
+    # The facts are written into the route dictionaries, so the routes keep their order
+    def read_facts(route):
+        snapshot = PageSnapshot.from_cache(cache, route['url'], 'route')
+        cached = snapshot is not None
+        if not cached:
+            with pool.driver() as driver:
+                rate_limiter.acquire(route['url'])
+                driver.get(route['url'])
+                # Waiting for the facts, the route page is rendered client-side
+                if driver.find_elements(By.XPATH, facts_path):
+                    snapshot = PageSnapshot.from_driver(driver, url=route['url'])
+
+        try:
+            extract_route_facts(snapshot, route)
+        except NoSuchElementException:
+            print('Could not extract the facts of route', route['url'])
+            if not cached:
+                rate_limiter.failure(route['url'])
+            return False
+
+        if not cached:
+            snapshot.store(cache, 'route')
+            rate_limiter.success(route['url'])
+        return True
+
+    def checkpoint(route, found):
+        if found:
+            writer.write(route)
+
+    results = map_on_pool(pool, read_facts, todo, on_result=checkpoint)
+    return sum(1 for found in results if not found)
+
+
+# Extracting the URLs and names of the route cards of a route list
+def extract_route_cards(driver, rate_limiter, url):
+    rate_limiter.acquire(url)
+    driver.get(url)
+
+    # Scrolling down until no more routes are loaded, instead of a fixed number of scroll steps.
+    # Scroll steps are no page loads, they are paced by the polling of the list, not by the rate limiter
+    SeleniumUtil.scroll_until_stable(driver, route_card_selector, container_selector='#main')
+
+    cards = []
+    box = driver.find_elements(By.CSS_SELECTOR, route_card_selector)
+    for b in box:
+        card_url = b.get_attribute('href')
+        name = b.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
+        cards.append({'url': card_url, 'name': name})
+    print('Found', len(cards), 'routes on', url)
+    return cards
+
+
+# Extracting the URLs and names of the stages of a regional or national route
+def extract_route_stages(driver, rate_limiter, route):
+    rate_limiter.acquire(route['url'])
+    driver.get(route['url'])
+
+    stages = []
+    etappen = driver.find_elements(By.CSS_SELECTOR, 'a[data-cy="route-list-it"]')
+    for etappe in etappen:
+        etappe_url = etappe.get_attribute('href')
+        etappe_name = etappe.find_element(By.CSS_SELECTOR, 'p[data-cy="route-title"]').text
+
+        # The stage name is prefixed with the name of its route
+        stages.append({'url': etappe_url, 'name': f"{route['name']} {etappe_name}"})
+    return stages
+
+
+# Extracting the facts of the route page currently loaded in the driver into the route dictionary
+# The facts box of a route page, read from a single snapshot of the page
+facts_path = '//*[@id="main"]/div[2]/page-segment/div[2]/div[4]/div[2]/element-facts'
+facts_fields = [
+    FieldSelector('distance', xpath=facts_path + '/div[1]/div[2]/div/span'),
+    FieldSelector('altitude_up', xpath=facts_path + '/div[1]/div[3]/span'),
+    FieldSelector('altitude_down', xpath=facts_path + '/div[1]/div[4]/span'),
+    FieldSelector('items', multiple=True, required=False,
+                  xpath=facts_path + '/div[2]//*[contains(concat(" ", normalize-space(@class), " "), " items-stretch ")]'),
+    FieldSelector('group2_2', xpath=facts_path + '/div[2]/div[2]/span', required=False),
+    FieldSelector('group2_3', xpath=facts_path + '/div[2]/div[3]/span', required=False),
+    FieldSelector('group2_4', xpath=facts_path + '/div[2]/div[4]/span', required=False),
+]
+
+
+def extract_route_facts(snapshot, route):
+    # Extract route details such as distance, altitude up, altitude down, and more.
+    # One snapshot of the page replaces a WebDriver round-trip per field.
+    if snapshot is None:
+        raise NoSuchElementException('No facts on {}'.format(route['url']))
+    record = snapshot.extract(facts_fields)
+    if not record.complete:
+        raise NoSuchElementException('Missing facts {} on {}'.format(record.misses, route['url']))
+
+    route['distance'] = record['distance']
+    route['altitude_up'] = record['altitude_up']
+    route['altitude_down'] = record['altitude_down']
+
+    # Check the number of items in the group
+    items = record.get('items', [])
+    if len(items) == 2:
+        # If there are two items, extract difficulty level and fitness level
+        route['difficulty_level'] = record['group2_2']
+        route['fitness_level'] = record['group2_3']
+
+    if len(items) == 3:
+        # If there are three items, extract duration, difficulty level, and fitness level
+        route['duration'] = record['group2_2']
+        route['difficulty_level'] = record['group2_3']
+        route['fitness_level'] = record['group2_4']
 
 
 # Transforming the extracted data by cleaning and formatting it
+# The units, thousands separators and parenthetical qualifiers such as ' (Bergwanderweg)' are removed,
+# the durations such as '2 h 49 min' are converted to minutes
 def transform():
-    df = pd.read_csv('schweizmobil_stage_1.csv')
-    df['distance'] = df.apply(lambda row: row.distance.replace(' km', ''), axis=1)
-    df['altitude_up'] = df.apply(lambda row: row.altitude_up.replace(' m', '').replace('’', ''), axis=1)
-    df['altitude_down'] = df.apply(lambda row: row.altitude_down.replace(' m', '').replace('’', ''), axis=1)
-    df['difficulty_level'] = df.apply(
-        lambda row: row.difficulty_level.replace(' (Wanderweg)', '')
-        .replace(' (Bergwanderweg)', '')
-        .replace(' ( Bergwanderweg)', '')
-        .replace(' (Wanderweg; Lägerengrat: Bergwanderweg)', ''), axis=1)
+    df = pd.read_csv(os.path.join(folder, 'schweizmobil_stage_1.csv'))
 
-    df['fitness_level'] = df.apply(
-            lambda row: row.difficulty_level.replace(' (Ohne Aufstieg nach Braunwald: mittel)', ''), axis=1)
+    normalizer = UnitNormalizer()
+    df = normalizer.normalize(df, {
+        'distance': 'km',
+        'altitude_up': 'm',
+        'altitude_down': 'm',
+        'duration': 'duration',
+        'difficulty_level': 'label',
+        'fitness_level': 'label',
+    })
+    if normalizer.issues:
+        print('Could not parse these values:')
+        print(normalizer.report())
 
-
-    df['duration'] = df.apply(lambda row: clean_duration(row), axis=1)
-
-    df.to_csv('schweizmobil_stage_3.csv', index=False)
-
-
-# Cleaning the duration value and convert it to minutes
-def clean_duration(row):
-    if type(row.duration) is not str:
-        return None
-
-    # 2 h 49 min
-    values = row.duration.split(' ')
-
-    # ['2', 'h', '49', 'min']
-    hours = values[0]
-
-    # Calculating the duration of a route in minutes.
-    # It first checks if the values list, which contains the duration components, has a length greater than 2.
-    if len(values) > 2:
-        minutes = values[2]
-        return int(hours) * 60 + int(minutes)
-    else:
-        return int(hours) * 60
+    df.to_csv(os.path.join(folder, 'schweizmobil_stage_3.csv'), index=False)
 
 
 # Loading the transformed data into a database table
 def load():
-    df = pd.read_csv('schweizmobil_stage_3.csv')
+    df = pd.read_csv(os.path.join(folder, 'schweizmobil_stage_3.csv'))
 
     # connection parameters
     conn_params = {
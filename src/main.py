@@ -1,8 +1,9 @@
 import logging
 import sys
 
-from extractors import SeleniumUtil
+from extractors import HttpUtil, SeleniumUtil
 from extractors.KomootExtractor import KomootExtractor
+from extractors.ResponseCache import ResponseCache
 from src.database.MariaDBProvider import MariaDBProvider
 from src.loaders.KomootLoader import KomootLoader
 from src.transformers.MergeTransformer import MergeTransformer
@@ -25,14 +26,20 @@ def main() -> None:
     logger = logging.getLogger(__name__)
     logger.info('Starting main.py')
 
-    driver = SeleniumUtil.initialize_new_instance()
+    # no images, fonts, map tiles and trackers, the window stays visible for the login
+    driver = SeleniumUtil.initialize_new_instance(profile=SeleniumUtil.CrawlProfile(headless=False))
 
     stage1_path = 'output/komoot_stage_1.csv'
     stage3_path = 'output/komoot_stage_3.csv'
     gpx_download_path = 'output/komoot_gpx'
 
-    komoot_ext = KomootExtractor(driver, stage1_path, gpx_download_path)
+    # tour pages are fetched over HTTP, the browser is only needed for the discover and region pages.
+    # Pages fetched on a previous run are read from the cache or revalidated with conditional requests
+    cache = ResponseCache('output/cache')
+    komoot_ext = KomootExtractor(driver, stage1_path, gpx_download_path, workers=4, requests_per_minute=30,
+                                 http_session=HttpUtil.create_session(pool_size=4), cache=cache)
     komoot_ext.extract()
+    cache.close()
     komoot_ext.extract_gpx()
     SeleniumUtil.close_driver(driver)
 
@@ -0,0 +1,165 @@
+import logging
+from time import perf_counter
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class Corruption:
+    """Declares how the values of a column are corrupted.
+
+    Parameters
+    ----------
+    column : str
+        The column to corrupt
+    count : int (optional)
+        The number of rows to corrupt, capped at the number of rows with a value
+        default: 10
+    fraction : float (optional)
+        The share of the rows with a value to corrupt, replaces count if given
+    prefix : str (optional)
+        Put in front of the value, e.g. '99' for an outlier
+        default: ''
+    suffix : str (optional)
+        Appended to the value
+        default: ''
+    value : str (optional)
+        Replaces the value, prefix and suffix are added to it
+    """
+
+    def __init__(self, column: str, count: int = 10, fraction: float | None = None, prefix: str = '',
+                 suffix: str = '', value: str | None = None) -> None:
+        self.column = column
+        self.count = count
+        self.fraction = fraction
+        self.prefix = prefix
+        self.suffix = suffix
+        self.value = value
+
+    def __repr__(self) -> str:
+        parts = ['prefix {!r}'.format(self.prefix) if self.prefix else '',
+                 'value {!r}'.format(self.value) if self.value is not None else '',
+                 'suffix {!r}'.format(self.suffix) if self.suffix else '']
+        return '{}: {}'.format(self.column, ', '.join(part for part in parts if part))
+
+    def size(self, eligible: int) -> int:
+        if self.fraction is not None:
+            return min(eligible, int(round(eligible * self.fraction)))
+        return min(eligible, self.count)
+
+    def apply(self, values: pd.Series) -> pd.Series:
+        """Returns the corrupted values."""
+
+        values = values.astype(str) if self.value is None else pd.Series(self.value, index=values.index)
+        return self.prefix + values + self.suffix
+
+
+class ImpurityInjector:
+    """Injects artificial impurities into exact rows of a data frame, reproducibly for a given seed.
+
+    The rows of every corruption are drawn without replacement from the rows that have a
+    value in its column and changed in one assignment per corruption. Every change is
+    recorded in a manifest, so a cleaning step can be checked against it.
+
+    Parameters
+    ----------
+    corruptions : Sequence[Corruption]
+        The corruptions, applied in order
+    seed : int (optional)
+        The seed of the row selection
+        default: 0
+
+    Examples
+    --------
+    injector = ImpurityInjector([Corruption('min', count=10, prefix='99')], seed=9001)
+    dirty, manifest = injector.inject(df)
+    """
+
+    manifest_columns = ['row', 'position', 'column', 'corruption', 'original', 'corrupted']
+
+    def __init__(self, corruptions: Sequence[Corruption], seed: int = 0) -> None:
+        self.corruptions = list(corruptions)
+        self.seed = seed
+        self.logger = logging.getLogger(__name__)
+
+    def inject(self, df: pd.DataFrame) -> Tuple[pd.DataFrame, pd.DataFrame]:
+        """Injects the impurities into a copy of the data frame.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The clean data
+
+        Returns
+        -------
+        Tuple[pd.DataFrame, pd.DataFrame]
+            The corrupted copy and the manifest with the row label, position, column, corruption,
+            original and corrupted value of every change
+        """
+
+        rng = np.random.default_rng(self.seed)
+        df = df.copy()
+        changes: List[pd.DataFrame] = []
+
+        for corruption in self.corruptions:
+            column = df.columns.get_loc(corruption.column)
+            eligible = np.flatnonzero(df[corruption.column].notna().to_numpy())
+            positions = np.sort(rng.choice(eligible, size=corruption.size(len(eligible)), replace=False))
+
+            original = df.iloc[positions, column]
+            corrupted = corruption.apply(original)
+            if not pd.api.types.is_string_dtype(df[corruption.column]):
+                # the corrupted values of a numeric column are strings
+                df[corruption.column] = df[corruption.column].astype(object)
+            df.iloc[positions, column] = corrupted.to_numpy()
+
+            changes.append(pd.DataFrame({
+                'row': original.index,
+                'position': positions,
+                'column': corruption.column,
+                'corruption': repr(corruption),
+                'original': original.to_numpy(),
+                'corrupted': corrupted.to_numpy(),
+            }))
+
+        manifest = pd.concat(changes, ignore_index=True) if changes else pd.DataFrame(columns=self.manifest_columns)
+        self.logger.info('Injected {} impurities into {} columns'.format(len(manifest), manifest['column'].nunique()))
+        return df, manifest
+
+
+def benchmark_injection(n_rows: int = 1000000, n_corruptions: int = 100000, seed: int = 0) -> Dict[str, float]:
+    """Measures the injection on a synthetic data frame of elevation strings such as "1'264 m".
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of rows
+        default: 1000000
+    n_corruptions : int
+        The number of rows corrupted per column
+        default: 100000
+    seed : int
+        The seed of the data and of the injection
+        default: 0
+
+    Returns
+    -------
+    Dict[str, float]
+        rows, impurities and seconds
+    """
+
+    rng = np.random.default_rng(seed)
+    elevation = pd.Series(rng.integers(193, 4634, n_rows)).map('{:,} m'.format).str.replace(',', "'", regex=False)
+    df = pd.DataFrame({'min': elevation, 'max': elevation})
+    injector = ImpurityInjector([Corruption('min', count=n_corruptions, prefix='99'),
+                                 Corruption('max', count=n_corruptions, prefix='-')], seed=seed)
+
+    start = perf_counter()
+    _, manifest = injector.inject(df)
+    return {'rows': n_rows, 'impurities': len(manifest), 'seconds': round(perf_counter() - start, 4)}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(benchmark_injection())
@@ -4,8 +4,12 @@ import re
 from typing import Dict, List
 
 import gpxpy
+import numpy as np
 from rapidfuzz import process, fuzz, utils
 import pandas as pd
+from scipy.optimize import linear_sum_assignment
+
+from src.extractors.GpxManifest import GpxManifest
 
 
 class KomootTransformer:
@@ -34,6 +38,12 @@ class KomootTransformer:
 
     routes: pd.DataFrame
     emoji_pattern = re.compile(r"[\U00010000-\U0010FFFF]")
+    # the minimum similarity of a route title and a gpx file name
+    min_match_score = 60
+    # the date, id and 'GPX Download_' in front of the route title in a gpx file name of the browser downloads
+    gpx_prefix_pattern = re.compile(r'^.*GPX Download_\s*')
+    # the tour id of a route link, as in KomootExtractor
+    link_id_pattern = re.compile(r'/smarttour/\D*(\d+)')
 
     def __init__(self, routes_file: str, gpx_folder: str, output_path: str) -> None:
         self.routes_file = routes_file
@@ -86,8 +96,10 @@ class KomootTransformer:
 
     def load_data_from_gpx(self):
         self.logger.info('Loading data from gpx files')
+        # routes without a matching gpx file have no gpx distance
         self.routes['distance_gpx'] = self.routes.apply(
-            lambda row: self.read_distance_from_gpx(os.path.join(self.gpx_folder, row.gpx_file)), axis=1)
+            lambda row: self.read_distance_from_gpx(os.path.join(self.gpx_folder, row.gpx_file))
+            if isinstance(row.gpx_file, str) else None, axis=1)
 
     def convert_units(self):
         """Convert the units of the routes.
@@ -199,10 +211,12 @@ class KomootTransformer:
             os.rename(old_filepath, new_filepath)
 
         # reload the gpx files after renaming
-        gpx_files = [x for x in os.listdir(self.gpx_folder) if x.endswith('.gpx')]
+        gpx_files = sorted(x for x in os.listdir(self.gpx_folder) if x.endswith('.gpx'))
 
         self.logger.info(f'Matching gpx files to routes')
-        self.routes['gpx_file'] = self.routes.apply(lambda row: self.find_gpx_file(row, gpx_files), axis=1)
+        self.routes['gpx_file'] = self.assign_gpx_files(self.routes['title'].tolist(), gpx_files, self.min_match_score,
+                                                        links=self.routes['link'].tolist())
+        self.logger.info(f'Matched {self.routes["gpx_file"].notna().sum()} of {len(self.routes)} routes')
 
     def strip_emojis(self, text: str) -> str:
         """Strips all emojis from text.
@@ -238,37 +252,76 @@ class KomootTransformer:
         length_km = round(length_m / 1000, 2)
         return length_km
 
-    @staticmethod
-    def find_gpx_file(row, files: List[str]) -> str | None:
-        """Find the gpx file that matches the route title best.
-        Pops the file from the list, so it can't be matched again.
+    @classmethod
+    def assign_gpx_files(cls, titles: List[str], files: List[str], min_score: float = 60,
+                         links: List[str] | None = None) -> List[str | None]:
+        """Assigns each route title at most one gpx file, so that the total similarity of all pairs is the highest.
+
+        The files named by KomootExtractor.get_gpx_file_name end with the tour id, e.g.
+        'Mettlenalp loop from Riedbad-1805125.gpx', they are matched to the route with the same
+        tour id in its link. The remaining routes are matched by their title to the 'GPX Download_'
+        files downloaded by the browser, whose names only contain the german title.
+
+        The similarity of all titles and the titles in the file names is computed in one multithreaded
+        cdist call, and the assignment is solved globally, so a route cannot take the file of a later
+        route with a better match. The indel similarity (fuzz.ratio) is used, WRatio found slightly
+        more exact matches but takes about 40 times longer.
 
         Parameters
         ----------
-        row : pandas.Series
-            The row of the route dataframe.
+        titles : List[str]
+            The route titles.
         files : List[str]
-            The list of gpx files.
+            The names of the gpx files.
+        min_score : float
+            The minimum similarity (0-100) of a match, routes without a match get None.
+            default: 60
+        links : List[str] (optional)
+            The route links, to match the files named with a tour id.
+            default: None, only the titles are matched
 
         Returns
         -------
-        str
-            The name of the gpx file that matches the route title best.
+        List[str | None]
+            The name of the gpx file of each route title.
         """
 
-        if files is None or len(files) == 0:
-            return None
-
-        # replace common english words with german words
-        title = row.title.replace('loop', 'Runde').replace('from', 'von').replace('to', 'nach')
+        matches: List[str | None] = [None] * len(titles)
+
+        # the files named with a tour id are matched by the id only
+        by_id = {}
+        for file in files:
+            match = GpxManifest.tour_id_pattern.search(file)
+            if match is not None and not cls.gpx_prefix_pattern.match(file):
+                by_id[match.group(1)] = file
+        for i, link in enumerate(links or []):
+            match = cls.link_id_pattern.search(str(link))
+            if match is not None:
+                matches[i] = by_id.get(match.group(1))
+
+        # the other routes are matched by title to the browser downloads
+        todo = [i for i, match in enumerate(matches) if match is None]
+        downloads = [file for file in files if cls.gpx_prefix_pattern.match(file)]
+        if len(todo) == 0 or len(downloads) == 0:
+            return matches
+
+        queries = [utils.default_process(cls.translate_title(titles[i])) for i in todo]
+        choices = [utils.default_process(cls.gpx_prefix_pattern.sub('', os.path.splitext(file)[0]))
+                   for file in downloads]
+        scores = process.cdist(queries, choices, scorer=fuzz.ratio, workers=-1)
+
+        # pairs below the threshold add nothing to the total and are dropped after the assignment
+        rows, cols = linear_sum_assignment(np.where(scores >= min_score, scores, 0), maximize=True)
+        for row, col in zip(rows, cols):
+            if scores[row, col] >= min_score:
+                matches[todo[row]] = downloads[col]
+        return matches
 
-        # find gpx file where the file name best matches the route title
-        (best_match, score, idx) = process.extractOne(title, files, scorer=fuzz.WRatio, processor=utils.default_process)
-
-        # pop the file from the list, so it can't be matched again
-        files.pop(idx)
+    @staticmethod
+    def translate_title(title: str) -> str:
+        """Replaces common english words of a route title with the german words of the browser downloads."""
 
-        return best_match
+        return str(title).replace('loop', 'Runde').replace('from', 'von').replace('to', 'nach')
 
     @staticmethod
     def convert_mi_to_km(mi: float) -> float:
@@ -0,0 +1,182 @@
+import logging
+import re
+from time import perf_counter
+from typing import Dict, List, Tuple
+
+import numpy as np
+import pandas as pd
+
+
+class UnitNormalizer:
+    """Parses scraped quantities, durations and labels into typed columns.
+
+    Every column is parsed with a single vectorized regex extraction. Scraped columns repeat
+    few distinct values, so only the distinct values are parsed and the results are mapped
+    back to the rows. Values that are present but do not match are left empty and reported,
+    see report.
+
+    Column kinds
+    ------------
+    'km', 'm' : quantities such as '12.5 km', "1'234 m" or '1’234 m', converted to the given unit,
+                meters must be whole numbers
+    'duration' : durations such as '2 h 49 min', '3 h' or '45 min', converted to minutes
+    'label' : labels with any parenthetical qualifier removed, e.g. 'mittel (Bergwanderweg)' -> 'mittel'
+
+    Attributes
+    ----------
+    issues : List[Tuple[str, str]]
+        The column and value of every value that could not be parsed
+    logger : logging.Logger
+        The logger for this class.
+
+    Examples
+    --------
+    normalizer = UnitNormalizer()
+    df = normalizer.normalize(df, {'distance': 'km', 'altitude_up': 'm', 'duration': 'duration'})
+    print(normalizer.report())
+    """
+
+    # the thousands separators of the Swiss number format are ', ’ and spaces
+    quantity_pattern = re.compile(r"^\s*(?P<number>-?\d[\d'’ ]*(?:[.,]\d+)?)\s*(?P<unit>km|m)?\s*$", re.IGNORECASE)
+    duration_pattern = re.compile(r'^\s*(?=\d)(?:(?P<hours>\d+)\s*h)?\s*(?:(?P<minutes>\d+)\s*min)?\s*$')
+    qualifier_pattern = re.compile(r'\s*\([^()]*\)')
+    meters = {'m': 1.0, 'km': 1000.0}
+
+    def __init__(self) -> None:
+        self.issues: List[Tuple[str, str]] = []
+        self.logger = logging.getLogger(__name__)
+
+    def normalize(self, df: pd.DataFrame, columns: Dict[str, str]) -> pd.DataFrame:
+        """Parses the given columns of a copy of the data frame.
+
+        Parameters
+        ----------
+        df : pd.DataFrame
+            The scraped data
+        columns : Dict[str, str]
+            The kind of each column to parse: 'km', 'm', 'duration' or 'label'
+
+        Returns
+        -------
+        pd.DataFrame
+            The data with the parsed columns
+        """
+
+        df = df.copy()
+        for column, kind in columns.items():
+            if kind in self.meters:
+                parse = lambda values: self.quantity(values, kind)
+            elif kind == 'duration':
+                parse = self.duration
+            elif kind == 'label':
+                parse = self.label
+            else:
+                raise ValueError('Unknown kind {} of column {}'.format(kind, column))
+
+            codes, uniques = pd.factorize(df[column])
+            parsed = parse(pd.Series(uniques, name=column))
+            # the code of a missing value is -1, the appended missing value is taken for it
+            result = pd.concat([parsed, pd.Series([None], dtype=parsed.dtype)], ignore_index=True) \
+                .take(codes).set_axis(df.index)
+            self.collect(df[column], result)
+            df[column] = result
+
+        if self.issues:
+            self.logger.warning('Could not parse {} values, see report'.format(len(self.issues)))
+        return df
+
+    def quantity(self, values: pd.Series, unit: str = 'm') -> pd.Series:
+        """Parses quantities and converts them to the given unit, a value without unit is taken to be in it.
+
+        Returns
+        -------
+        pd.Series
+            Floats for 'km', nullable integers for 'm', empty for values with a fractional number of meters
+        """
+
+        parts = values.astype('string').str.extract(self.quantity_pattern)
+        number = pd.to_numeric(parts['number'].str.replace(r"['’ ]", '', regex=True).str.replace(',', '.'),
+                               errors='coerce')
+        factor = parts['unit'].str.lower().map(self.meters).fillna(self.meters[unit]).astype(float) / self.meters[unit]
+        result = number * factor
+        if unit == 'km':
+            return result.astype(float)
+        # meters are whole numbers, a fractional value such as '1,234 m' or '1.234 m' is a misread
+        # thousands separator and is left empty and reported instead of being rounded
+        whole = result.round()
+        return whole.where((result - whole).abs() < 1e-6).astype('Int64')
+
+    def duration(self, values: pd.Series) -> pd.Series:
+        """Parses durations to minutes as nullable integers."""
+
+        parts = values.astype('string').str.extract(self.duration_pattern)
+        hours = pd.to_numeric(parts['hours'], errors='coerce')
+        minutes = pd.to_numeric(parts['minutes'], errors='coerce')
+        result = (hours.fillna(0) * 60 + minutes.fillna(0)).where(hours.notna() | minutes.notna())
+        return result.astype('Int64')
+
+    def label(self, values: pd.Series) -> pd.Series:
+        """Removes the parenthetical qualifiers of labels, also nested ones, and normalizes the whitespace."""
+
+        labels = values.astype('string')
+        while True:
+            stripped = labels.str.replace(self.qualifier_pattern, '', regex=True)
+            if stripped.equals(labels):
+                break
+            labels = stripped
+        labels = labels.str.split().str.join(' ')
+        result = labels.mask(labels == '')
+        return result.astype(object).where(result.notna(), None)
+
+    def collect(self, values: pd.Series, result: pd.Series) -> None:
+        # a value that is present but has no result could not be parsed, empty strings are missing values
+        candidates = values[result.isna() & values.notna()].astype(str)
+        failed = candidates[candidates.str.strip() != '']
+        self.issues.extend((str(values.name), value) for value in failed)
+
+    def report(self) -> pd.DataFrame:
+        """Returns the values that could not be parsed with their number of occurrences per column."""
+
+        issues = pd.DataFrame(self.issues, columns=['column', 'value'])
+        return issues.value_counts().rename('count').reset_index()
+
+
+def benchmark_normalizer(n_rows: int = 100000, seed: int = 0) -> Dict[str, float]:
+    """Measures the normalizer on synthetic Schweizmobil facts.
+
+    Parameters
+    ----------
+    n_rows : int
+        The number of rows
+        default: 100000
+    seed : int
+        The seed of the synthetic data
+        default: 0
+
+    Returns
+    -------
+    Dict[str, float]
+        rows, issues and seconds
+    """
+
+    rng = np.random.default_rng(seed)
+    minutes = rng.integers(30, 600, n_rows)
+    altitude = pd.Series(rng.integers(0, 3000, n_rows)).map('{:,} m'.format).str.replace(',', '’', regex=False)
+    qualifiers = np.array(['', ' (Wanderweg)', ' (Bergwanderweg)', ' (Ohne Aufstieg nach Braunwald: mittel)'])
+    df = pd.DataFrame({
+        'distance': pd.Series(rng.uniform(1, 40, n_rows)).map('{:.1f} km'.format),
+        'altitude_up': altitude,
+        'duration': ['{} h {} min'.format(m // 60, m % 60) if m % 60 else '{} h'.format(m // 60) for m in minutes],
+        'difficulty_level': np.char.add(rng.choice(['leicht', 'mittel', 'schwer'], n_rows),
+                                        rng.choice(qualifiers, n_rows)),
+    })
+
+    normalizer = UnitNormalizer()
+    start = perf_counter()
+    normalizer.normalize(df, {'distance': 'km', 'altitude_up': 'm', 'duration': 'duration', 'difficulty_level': 'label'})
+    return {'rows': n_rows, 'issues': len(normalizer.issues), 'seconds': round(perf_counter() - start, 4)}
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO)
+    print(benchmark_normalizer())
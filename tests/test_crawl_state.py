@@ -0,0 +1,71 @@
+import json
+import sqlite3
+
+from src.extractors.CrawlState import CrawlState
+from src.extractors.RecordWriter import RecordWriter
+
+
+def test_links_are_canonicalized():
+    assert CrawlState.canonical(' http://WWW.Komoot.com/smarttour/1805125/?ref=wtd#map ') \
+        == 'https://www.komoot.com/smarttour/1805125'
+
+
+def test_add_skips_known_links(tmp_path):
+    state = CrawlState(str(tmp_path / 'state.sqlite'))
+
+    assert state.add(['https://www.komoot.com/smarttour/1', 'https://www.komoot.com/smarttour/2/']) \
+        == ['https://www.komoot.com/smarttour/1', 'https://www.komoot.com/smarttour/2']
+    assert state.add(['http://www.komoot.com/smarttour/1?ref=wtd', 'https://www.komoot.com/smarttour/3']) \
+        == ['https://www.komoot.com/smarttour/3']
+    assert 'https://WWW.komoot.com/smarttour/2' in state
+    assert len(state) == 3
+    state.close()
+
+
+def test_pending_returns_pending_links_then_failed_links_to_retry(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    state = CrawlState(path)
+    links = ['https://www.komoot.com/smarttour/{}'.format(i) for i in range(5)]
+    state.add(links)
+    state.mark_failed(links[0], 'timeout')
+    state.mark_done(links[1])
+    state.mark_failed(links[2], 'timeout')
+    state.mark_failed(links[2], 'timeout')
+    state.close()
+
+    # the state is read again by a resumed crawl
+    state = CrawlState(path)
+    assert state.pending() == links[3:]
+    assert state.pending(max_attempts=2) == links[3:] + links[:1]
+    assert state.pending(max_attempts=3) == links[3:] + [links[0], links[2]]
+    assert state.counts() == {'pending': 2, 'done': 1, 'failed': 2}
+    state.close()
+
+
+def test_migrate_records_moves_the_legacy_record_column_to_the_journal(tmp_path):
+    path = str(tmp_path / 'state.sqlite')
+    # the database of an older crawl, which kept the record of every done link
+    connection = sqlite3.connect(path)
+    connection.execute('CREATE TABLE pages (link TEXT PRIMARY KEY, status TEXT NOT NULL, '
+                       'attempts INTEGER NOT NULL DEFAULT 0, last_fetched REAL, error TEXT, record TEXT)')
+    connection.executemany('INSERT INTO pages (link, status, record) VALUES (?, ?, ?)', [
+        ('https://www.komoot.com/smarttour/1', 'done', json.dumps({'link': 'https://www.komoot.com/smarttour/1',
+                                                                   'title': 'Lake loop'})),
+        ('https://www.komoot.com/smarttour/2', 'pending', None),
+        ('https://www.komoot.com/smarttour/3', 'done', json.dumps({'link': 'https://www.komoot.com/smarttour/3',
+                                                                   'title': 'Walk to Aare'})),
+    ])
+    connection.commit()
+    connection.close()
+
+    state = CrawlState(path)
+    writer = RecordWriter(str(tmp_path / 'stage_1.csv'), ['link', 'title'], key='link')
+
+    assert state.migrate_records(writer) == 2
+    assert [record['title'] for record in writer.read(writer.journal_path)] == ['Lake loop', 'Walk to Aare']
+    columns = [row[1] for row in state.connection.execute('PRAGMA table_info(pages)')]
+    assert 'record' not in columns
+    assert state.pending() == ['https://www.komoot.com/smarttour/2']
+    assert state.migrate_records(writer) == 0
+    writer.close()
+    state.close()
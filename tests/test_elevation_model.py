@@ -0,0 +1,74 @@
+import numpy as np
+import pytest
+import tifffile
+
+from src.extractors.ElevationModel import ElevationModel
+
+# two tiles of 100 x 100 pixels of 10 m next to each other, the elevation is a plane
+pixel_size = 10.0
+tile_pixels = 100
+tile_size = pixel_size * tile_pixels
+origin_x = 2600000.0
+origin_y = 1200000.0
+nodata = -9999.0
+
+
+def plane(x, y):
+    return 500 + 0.02 * (x - origin_x) + 0.05 * (y - origin_y)
+
+
+def write_tile(path, xmin, ymax, nodata_pixel=None):
+    # the elevation of every pixel is the plane at the pixel center
+    cols = xmin + (np.arange(tile_pixels) + 0.5) * pixel_size
+    rows = ymax - (np.arange(tile_pixels) + 0.5) * pixel_size
+    raster = plane(cols[np.newaxis, :], rows[:, np.newaxis]).astype(np.float32)
+    if nodata_pixel is not None:
+        raster[nodata_pixel] = nodata
+
+    tifffile.imwrite(path, raster, extratags=[
+        (33550, 'd', 3, (pixel_size, pixel_size, 0.0), True),  # ModelPixelScaleTag
+        (33922, 'd', 6, (0.0, 0.0, 0.0, xmin, ymax, 0.0), True),  # ModelTiepointTag
+        (42113, 's', 0, str(nodata), True),  # GDAL_NODATA
+    ])
+
+
+@pytest.fixture
+def dem_folder(tmp_path):
+    write_tile(str(tmp_path / 'west.tif'), origin_x, origin_y + tile_size, nodata_pixel=(50, 50))
+    write_tile(str(tmp_path / 'east.tif'), origin_x + tile_size, origin_y + tile_size)
+    return tmp_path
+
+
+def test_sample_interpolates_bilinearly(dem_folder):
+    model = ElevationModel(str(dem_folder))
+    rng = np.random.default_rng(0)
+    x = rng.uniform(origin_x + 5, origin_x + 2 * tile_size - 5, 10000)
+    y = rng.uniform(origin_y + 5, origin_y + tile_size - 5, 10000)
+    # points within half a pixel of a tile edge take the edge pixels, the nodata pixel has no value
+    far = (np.abs(x - (origin_x + tile_size)) > pixel_size / 2) \
+        & ((np.abs(x - (origin_x + 505)) > 20) | (np.abs(y - (origin_y + tile_size - 505)) > 20))
+
+    elevation = model.sample(x[far], y[far])
+    np.testing.assert_allclose(elevation, plane(x[far], y[far]), atol=1e-3)
+
+
+def test_sample_is_nan_outside_the_raster_and_on_nodata(dem_folder):
+    model = ElevationModel(str(dem_folder))
+    x = np.array([origin_x - 1, origin_x + 2 * tile_size + 1, origin_x + 500, origin_x + 505])
+    y = np.array([origin_y + 500, origin_y + 500, origin_y - 1, origin_y + tile_size - 505])
+
+    assert np.isnan(model.sample(x, y)).all()
+
+
+def test_rasters_are_memory_mapped(dem_folder):
+    model = ElevationModel(str(dem_folder))
+    model.sample(np.array([origin_x + 100]), np.array([origin_y + 100]))
+
+    assert all(isinstance(raster, np.memmap) for raster in model.rasters.values())
+
+
+def test_rejects_tiles_off_the_grid(dem_folder):
+    write_tile(str(dem_folder / 'shifted.tif'), origin_x + 2 * tile_size + 250, origin_y + tile_size)
+
+    with pytest.raises(ValueError, match='not aligned'):
+        ElevationModel(str(dem_folder))
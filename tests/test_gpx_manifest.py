@@ -0,0 +1,56 @@
+import json
+import os
+
+from src.extractors.GpxManifest import GpxManifest
+
+
+def write(folder, file_name, content):
+    with open(os.path.join(folder, file_name), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def test_build_indexes_files_by_tour_id_and_title(tmp_path):
+    write(tmp_path, 'Lake loop-101.gpx', '<gpx>lake</gpx>')
+    write(tmp_path, 'Walk to Aare.gpx', '<gpx>aare</gpx>')
+    write(tmp_path, 'notes.txt', 'not a track')
+
+    manifest = GpxManifest(str(tmp_path))
+
+    assert '101' in manifest and 101 in manifest
+    assert manifest.entries['101']['file'] == 'Lake loop-101.gpx'
+    assert manifest.has_title('Walk to Aare') and not manifest.has_title('Lake loop')
+    with open(tmp_path / 'manifest.json', encoding='utf-8') as f:
+        assert set(json.load(f)['entries']) == {'101'}
+
+
+def test_loading_drops_missing_and_changed_files(tmp_path):
+    write(tmp_path, 'Lake loop-101.gpx', '<gpx>lake</gpx>')
+    write(tmp_path, 'Sunset loop-102.gpx', '<gpx>sunset</gpx>')
+    write(tmp_path, 'Ridge walk-103.gpx', '<gpx>ridge</gpx>')
+    write(tmp_path, 'Walk to Aare.gpx', '<gpx>aare</gpx>')
+    GpxManifest(str(tmp_path))
+
+    os.remove(tmp_path / 'Sunset loop-102.gpx')
+    # same size, other content
+    write(tmp_path, 'Ridge walk-103.gpx', '<gpx>RIDGE</gpx>')
+    os.remove(tmp_path / 'Walk to Aare.gpx')
+    manifest = GpxManifest(str(tmp_path))
+
+    assert '101' in manifest
+    assert '102' not in manifest and '103' not in manifest
+    assert not manifest.has_title('Walk to Aare')
+    # the dropped entries are saved, so the next load does not verify them again
+    assert GpxManifest(str(tmp_path)).verify() == 0
+
+
+def test_add_is_saved_every_save_every_additions(tmp_path):
+    manifest = GpxManifest(str(tmp_path), save_every=2)
+    manifest.add('101', 'https://www.komoot.com/smarttour/101', 'Lake loop-101.gpx', b'<gpx>lake</gpx>')
+    with open(tmp_path / 'manifest.json', encoding='utf-8') as f:
+        assert json.load(f)['entries'] == {}
+
+    manifest.add('102', 'https://www.komoot.com/smarttour/102', 'Walk to Aare-102.gpx', b'<gpx>aare</gpx>')
+    with open(tmp_path / 'manifest.json', encoding='utf-8') as f:
+        entries = json.load(f)['entries']
+    assert entries['102']['link'] == 'https://www.komoot.com/smarttour/102'
+    assert entries['102']['size'] == len(b'<gpx>aare</gpx>')
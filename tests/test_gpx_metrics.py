@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.extractors import GpxMetrics
+
+# a track to the north along a meridian, 0.001 degrees of latitude between the points
+step_degrees = 0.001
+step_m = GpxMetrics.earth_radius_m * np.radians(step_degrees)
+
+
+def track(ele):
+    lat = 46.5 + step_degrees * np.arange(len(ele))
+    lon = np.full(len(ele), 8.0)
+    return lat, lon, np.asarray(ele, dtype=float)
+
+
+def profile():
+    # plateaus of a full smoothing window around a climb of 500 m and a descent of 300 m
+    return np.concatenate((np.full(5, 400.0), np.linspace(450, 850, 9), np.full(5, 900.0),
+                           np.linspace(850, 650, 5), np.full(5, 600.0)))
+
+
+def write_gpx(path, lat, lon, ele=None):
+    elements = ['<ele>{}</ele>'.format(e) for e in ele] if ele is not None else [''] * len(lat)
+    points = ''.join('<trkpt lat="{}" lon="{}">{}</trkpt>'.format(*point) for point in zip(lat, lon, elements))
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write('<?xml version="1.0"?><gpx version="1.1" xmlns="http://www.topografix.com/GPX/1/1">'
+                '<trk><trkseg>{}</trkseg></trk></gpx>'.format(points))
+
+
+def test_track_metrics_of_a_known_profile():
+    ele = profile()
+    metrics = GpxMetrics.track_metrics(*track(ele))
+
+    assert metrics['distance'] == pytest.approx((len(ele) - 1) * step_m / 1000, rel=1e-9)
+    assert metrics['distance'] == pytest.approx(3.113, abs=1e-3)
+    assert metrics['up'] == pytest.approx(500)
+    assert metrics['down'] == pytest.approx(300)
+    assert (metrics['min'], metrics['max']) == (400, 900)
+
+
+def test_smoothing_window_keeps_the_noise_out_of_the_gain():
+    # a flat track with +-3 m of noise on every point
+    ele = 500 + 3 * (-1.0) ** np.arange(41)
+
+    raw = GpxMetrics.track_metrics(*track(ele), window=1)
+    smoothed = GpxMetrics.track_metrics(*track(ele), window=5)
+
+    assert raw['up'] == pytest.approx(120)
+    assert smoothed['up'] < raw['up'] / 4
+    # the extremes are taken from the raw elevation
+    assert (smoothed['min'], smoothed['max']) == (497, 503)
+
+
+def test_missing_elevations_are_filled_from_their_neighbours():
+    ele = profile()
+    ele[[7, 20]] = np.nan
+
+    metrics = GpxMetrics.track_metrics(*track(ele))
+
+    assert metrics['up'] == pytest.approx(500)
+    assert metrics['down'] == pytest.approx(300)
+
+
+def test_track_without_elevation_has_a_distance_only(tmp_path):
+    lat, lon, ele = track(profile())
+    write_gpx(str(tmp_path / 'SAC-41507.gpx'), lat, lon, ele)
+    write_gpx(str(tmp_path / 'SAC-7152.gpx'), lat, lon)
+
+    df = GpxMetrics.compute_distance_data(str(tmp_path))
+
+    assert df.to_dict('records') == [
+        {'id': '41507', 'distance': '3.11 km', 'up': '500 m', 'down': '300 m', 'min': '400 m', 'max': '900 m'},
+        {'id': '7152', 'distance': '3.11 km', 'up': 'na', 'down': 'na', 'min': 'na', 'max': 'na'},
+    ]
+
+
+def test_parity_report_compares_with_the_reference():
+    computed = pd.DataFrame([{'id': '1', 'distance': '5.29 km', 'up': "1'210 m", 'down': 'na', 'min': '400 m',
+                              'max': '900 m'}])
+    reference = pd.DataFrame([{'id': 1, 'distance': '5.00 km', 'up': "1'100 m", 'down': '300 m', 'min': '400 m',
+                               'max': '0 m'}])
+
+    report = GpxMetrics.parity_report(computed, reference).iloc[0]
+
+    assert report['distance_rel_diff'] == pytest.approx(0.058)
+    assert report['up_rel_diff'] == pytest.approx(0.1)
+    assert np.isnan(report['down_rel_diff']) and np.isnan(report['max_rel_diff'])
+    assert report['min_rel_diff'] == 0
@@ -0,0 +1,77 @@
+import numpy as np
+import pandas as pd
+
+from src.extractors.sac.SacTransformer import SacTransformer
+from src.transformers.ImpurityInjector import Corruption, ImpurityInjector
+
+
+def frame(n_rows=200):
+    rng = np.random.default_rng(1)
+    elevation = rng.integers(193, 4634, (2, n_rows))
+    df = pd.DataFrame({'min': pd.Series(elevation[0]).map('{:,} m'.format).str.replace(',', "'", regex=False),
+                       'max': elevation[1].astype(float),
+                       'title': ['Tour {}'.format(i) for i in range(n_rows)]})
+    df.index = np.arange(n_rows) * 3 + 7
+    # dead tour page links have no values
+    df.loc[df.index[::4], ['min', 'max']] = np.nan
+    return df
+
+
+corruptions = [Corruption('min', count=30, prefix='99'), Corruption('max', fraction=0.1, value='-'),
+               Corruption('title', count=1000, suffix=' (copy)')]
+
+
+def test_same_seed_gives_the_same_rows():
+    df = frame()
+    first, first_manifest = ImpurityInjector(corruptions, seed=9001).inject(df)
+    second, second_manifest = ImpurityInjector(corruptions, seed=9001).inject(df)
+    _, other_manifest = ImpurityInjector(corruptions, seed=9002).inject(df)
+
+    pd.testing.assert_frame_equal(first, second)
+    pd.testing.assert_frame_equal(first_manifest, second_manifest)
+    assert not first_manifest['row'].equals(other_manifest['row'])
+
+
+def test_rows_are_drawn_without_replacement_from_rows_with_a_value():
+    df = frame()
+    _, manifest = ImpurityInjector(corruptions, seed=9001).inject(df)
+
+    sizes = manifest.groupby('column').size().to_dict()
+    # the count is capped at the rows with a value, the fraction is taken of them
+    assert sizes == {'min': 30, 'max': 15, 'title': 200}
+    for column, group in manifest.groupby('column'):
+        assert group['row'].is_unique
+        assert df.loc[group['row'], column].notna().all()
+
+
+def test_manifest_matches_the_frames():
+    df = frame()
+    dirty, manifest = ImpurityInjector(corruptions, seed=9001).inject(df)
+
+    for change in manifest.itertuples():
+        assert df.index[change.position] == change.row
+        assert df.loc[change.row, change.column] == change.original
+        assert dirty.loc[change.row, change.column] == change.corrupted
+    assert dirty.loc[manifest.loc[manifest['column'] == 'min', 'row'], 'min'].str.startswith('99').all()
+    assert (dirty.loc[manifest.loc[manifest['column'] == 'max', 'row'], 'max'] == '-').all()
+
+    # all other cells are unchanged
+    changed = pd.DataFrame(False, index=df.index, columns=df.columns)
+    for change in manifest.itertuples():
+        changed.loc[change.row, change.column] = True
+    assert dirty.astype(str).where(~changed).equals(df.astype(str).where(~changed))
+
+
+def test_check_impurities_skips_columns_without_cleaned_counterpart(tmp_path):
+    df = frame()
+    transformer = SacTransformer(str(tmp_path), impurities=corruptions, seed=9001)
+    dirty = transformer.inject_impurities(df)
+    # the cleaning restores min but misses one row, max and title have no cleaned column
+    cleaned = dirty.assign(min_clean=pd.to_numeric(df['min'].str.replace("[^\\d]", '', regex=True)))
+    missed = transformer.manifest.loc[transformer.manifest['column'] == 'min', 'row'].iloc[0]
+    cleaned.loc[missed, 'min_clean'] = 0
+
+    mismatches = transformer.check_impurities(cleaned)
+
+    assert mismatches['row'].tolist() == [missed]
+    assert set(transformer.manifest['column']) == {'min', 'max', 'title'}
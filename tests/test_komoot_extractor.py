@@ -0,0 +1,161 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pandas as pd
+import pytest
+import requests
+
+from src.extractors import HttpUtil
+from src.extractors.GpxManifest import GpxManifest
+from src.extractors.KomootExtractor import KomootExtractor
+from src.extractors.RateLimiter import RateLimiter
+from src.model.Komoot.Route import KomootRoute
+
+fixture_folder = os.path.join(os.path.dirname(__file__), 'fixtures', 'komoot')
+stage1_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'output', 'komoot_stage_1.csv')
+
+
+class FixtureHandler(BaseHTTPRequestHandler):
+    """Serves the saved pages of the fixture folder as utf-8 HTML, like komoot.com does."""
+
+    def do_GET(self) -> None:
+        path = os.path.join(fixture_folder, self.path.lstrip('/'))
+        if not os.path.isfile(path):
+            self.send_error(404)
+            return
+        with open(path, 'rb') as f:
+            body = f.read()
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url():
+    server = ThreadingHTTPServer(('127.0.0.1', 0), FixtureHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def extractor(server_url, tmp_path):
+    extractor = KomootExtractor(mock.Mock(), str(tmp_path / 'komoot_stage_1.csv'), str(tmp_path / 'gpx'),
+                                rate_limiter=RateLimiter(100), http_session=requests.Session())
+    extractor.route_url = server_url + '/smarttour'
+    return extractor
+
+
+def test_extract_route_http_matches_rendered_row(extractor, server_url):
+    url = server_url + '/smarttour/1805125'
+    route = extractor.extract_route_http(url)
+
+    # the same tour as extracted from the rendered page
+    stage1 = pd.read_csv(stage1_path)
+    expected = stage1[stage1['link'] == 'https://www.komoot.com/smarttour/1805125'].iloc[0]
+    actual = route.as_dict()
+    for column in ['title', 'difficulty', 'distance', 'elevation_up', 'elevation_down', 'duration', 'speed']:
+        assert actual[column] == expected[column], column
+    assert actual['link'] == url
+
+
+def test_extract_route_http_rejects_missing_page(extractor, server_url):
+    with pytest.raises(requests.HTTPError):
+        extractor.extract_route_http(server_url + '/smarttour/404')
+
+
+@pytest.mark.parametrize('meters, expected', [(0, '0 ft'), (372.4, '1,225 ft'), (366.9, '1,200 ft'),
+                                              (1425, '4,675 ft')])
+def test_format_elevation_rounds_to_25_feet(meters, expected):
+    assert KomootExtractor.format_elevation(meters) == expected
+
+
+class GpxHandler(BaseHTTPRequestHandler):
+    """Serves a GPX export for every tour id, like the komoot API, and records the requested ids."""
+
+    requested = []
+
+    def do_GET(self) -> None:
+        tour_id = os.path.basename(self.path)[:-len('.gpx')]
+        self.requested.append(tour_id)
+        body = '<?xml version="1.0"?><gpx version="1.1"><trk><name>{}</name></trk></gpx>'.format(tour_id).encode()
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/gpx+xml')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def gpx_extractor(tmp_path):
+    GpxHandler.requested = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), GpxHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+
+    extractor = KomootExtractor(mock.Mock(), str(tmp_path / 'komoot_stage_1.csv'), str(tmp_path / 'gpx'),
+                                rate_limiter=RateLimiter(100))
+    extractor.gpx_export_url = 'http://127.0.0.1:{}/api/{{tour_id}}.gpx'.format(server.server_port)
+    extractor.handle_komoot_login = mock.Mock()
+    with mock.patch.object(HttpUtil, 'create_session_from_driver', return_value=requests.Session()):
+        yield extractor
+    server.shutdown()
+    server.server_close()
+
+
+def write_gpx(folder, file_name, content):
+    os.makedirs(folder, exist_ok=True)
+    with open(os.path.join(folder, file_name), 'w', encoding='utf-8') as f:
+        f.write(content)
+
+
+def test_extract_gpx_downloads_missing_and_changed_files_only(gpx_extractor, tmp_path):
+    gpx_folder = str(tmp_path / 'gpx')
+    links = ['https://www.komoot.com/smarttour/101', 'https://www.komoot.com/smarttour/102',
+             'https://www.komoot.com/smarttour/103', 'https://www.komoot.com/smarttour/104',
+             'https://www.komoot.com/discover/hiking-trails']
+    titles = ['Lake loop', 'Walk to Aare', 'Sunset loop', 'Ridge walk', 'No tour']
+    pd.DataFrame({'link': links, 'title': titles, 'difficulty': 'Easy', 'distance': '4.26 mi',
+                  'elevation_up': '1,225 ft', 'elevation_down': '1,200 ft', 'duration': '02:23',
+                  'speed': '1.8 mph'}).to_csv(tmp_path / 'komoot_stage_1.csv', index=False)
+    write_gpx(gpx_folder, 'Lake loop-101.gpx', '<gpx>lake</gpx>')
+    # an older download without tour id in its name
+    write_gpx(gpx_folder, 'Walk to Aare.gpx', '<gpx>aare</gpx>')
+    write_gpx(gpx_folder, 'Ridge walk-104.gpx', '<gpx>ridge</gpx>')
+    GpxManifest(gpx_folder)
+    write_gpx(gpx_folder, 'Ridge walk-104.gpx', '<gpx>RIDGE</gpx>')
+
+    gpx_extractor.extract_gpx()
+
+    # the link without tour id is skipped, the changed file is downloaded again
+    assert sorted(GpxHandler.requested) == ['103', '104']
+    manifest = GpxManifest(gpx_folder)
+    assert {'101', '103', '104'} <= set(manifest.entries)
+    assert manifest.entries['103']['file'] == 'Sunset loop-103.gpx'
+    assert not [file_name for file_name in os.listdir(gpx_folder) if file_name.endswith('.tmp')]
+
+
+def test_download_gpx_removes_the_temporary_file_when_the_move_fails(gpx_extractor, tmp_path):
+    gpx_folder = str(tmp_path / 'gpx')
+    os.makedirs(gpx_folder)
+    manifest = GpxManifest(gpx_folder)
+    route = KomootRoute('https://www.komoot.com/smarttour/103', 'Sunset loop', 'Easy', None, '4.26 mi',
+                        '1,225 ft', '1,200 ft', '02:23', '1.8 mph')
+
+    with mock.patch('os.replace', side_effect=OSError('disk full')):
+        assert not gpx_extractor.download_gpx(requests.Session(), route, manifest)
+
+    assert os.listdir(gpx_folder) == ['manifest.json']
+    assert '103' not in manifest
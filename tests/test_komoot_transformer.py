@@ -0,0 +1,22 @@
+from src.transformers.KomootTransformer import KomootTransformer
+
+
+def test_assign_gpx_files_matches_tour_ids_first():
+    titles = ['Lake loop', 'Walk to Aare', 'Mettlenalp – Stächelegg loop from Riedbad', 'Sunset loop']
+    links = ['https://www.komoot.com/smarttour/101', 'https://www.komoot.com/smarttour/e102/walk-to-aare',
+             'https://www.komoot.com/smarttour/1805125', 'https://www.komoot.com/smarttour/103']
+    files = ['Walk to Aare-102.gpx', 'Lake loop-101.gpx', 'Sunset loop-999.gpx',
+             '2023-05-01_1805125_GPX Download_ Mettlenalp – Stächelegg Runde von Riedbad.gpx']
+
+    matches = KomootTransformer.assign_gpx_files(titles, files, links=links)
+
+    # a file of another tour is not taken by title
+    assert matches == ['Lake loop-101.gpx', 'Walk to Aare-102.gpx', files[3], None]
+
+
+def test_assign_gpx_files_matches_browser_downloads_by_title():
+    titles = ['Mettlenalp – Stächelegg loop from Riedbad', 'Rämisgummehoger loop from Eggiwil']
+    files = ['2023-05-01_1_GPX Download_ Rämisgummehoger Runde von Eggiwil.gpx',
+             '2023-05-01_2_GPX Download_ Mettlenalp – Stächelegg Runde von Riedbad.gpx']
+
+    assert KomootTransformer.assign_gpx_files(titles, files) == [files[1], files[0]]
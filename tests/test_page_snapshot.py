@@ -0,0 +1,28 @@
+from unittest import mock
+
+from src.extractors.PageSnapshot import PageSnapshot
+from src.extractors.ResponseCache import ResponseCache
+
+page_source = '<html><body><h1 class="title">Mettlenalp loop</h1></body></html>'
+
+
+def test_snapshot_is_stored_under_the_requested_url(tmp_path):
+    cache = ResponseCache(str(tmp_path / 'cache'))
+    url = 'https://www.komoot.com/smarttour/1805125'
+    # the browser ended up on another url than the requested one
+    driver = mock.Mock(current_url='https://www.komoot.com/de-de/smarttour/1805125/?ref=wtd', page_source=page_source)
+
+    assert PageSnapshot.from_cache(cache, url, 'tour') is None
+    PageSnapshot.from_driver(driver, url=url).store(cache, 'tour')
+    snapshot = PageSnapshot.from_cache(cache, url, 'tour')
+
+    assert snapshot is not None
+    assert snapshot.document.cssselect('h1.title')[0].text == 'Mettlenalp loop'
+    assert cache.stats()['hits'] == 1
+    cache.close()
+
+
+def test_snapshot_without_requested_url_takes_the_current_url():
+    driver = mock.Mock(current_url='https://schweizmobil.ch/de/wanderland/route-101', page_source=page_source)
+
+    assert PageSnapshot.from_driver(driver).url == 'https://schweizmobil.ch/de/wanderland/route-101'
@@ -0,0 +1,102 @@
+import threading
+from time import monotonic
+from unittest import mock
+
+import pytest
+
+from src.extractors.RateLimiter import RateLimiter, TokenBucket
+
+
+class FakeClock:
+    """A monotonic clock that only moves when the code under test sleeps."""
+
+    def __init__(self) -> None:
+        self.now = 1000.0
+        self.slept = []
+
+    def monotonic(self) -> float:
+        return self.now
+
+    def sleep(self, seconds: float) -> None:
+        self.slept.append(seconds)
+        self.now += seconds
+
+
+@pytest.fixture
+def clock():
+    clock = FakeClock()
+    with mock.patch('src.extractors.RateLimiter.monotonic', clock.monotonic), \
+            mock.patch('src.extractors.RateLimiter.sleep', clock.sleep):
+        yield clock
+
+
+def test_rate_increases_additively_and_decreases_multiplicatively(clock):
+    bucket = TokenBucket(1.0)
+
+    for _ in range(5):
+        bucket.success()
+    assert bucket.rate == pytest.approx(1.5)
+    bucket.failure()
+    assert bucket.rate == pytest.approx(0.75)
+
+    # the rate stays within min_rate and max_rate
+    for _ in range(10):
+        bucket.failure()
+    assert bucket.rate == pytest.approx(0.1)
+    for _ in range(100):
+        bucket.success()
+    assert bucket.rate == pytest.approx(4.0)
+
+
+def test_acquire_waits_for_the_next_token(clock):
+    bucket = TokenBucket(2.0, capacity=1)
+
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert bucket.acquire() == pytest.approx(0.5)
+    clock.now += 10
+    # an idle bucket refills up to its capacity only
+    assert bucket.acquire() == 0
+    assert bucket.acquire() == pytest.approx(0.5)
+    assert clock.slept == pytest.approx([0.5, 0.5, 0.5])
+
+    # a slower rate after a failure spaces the requests further apart
+    bucket.failure()
+    assert bucket.acquire() == pytest.approx(1.0)
+    assert bucket.stats()['throttled'] == 4
+
+
+def test_buckets_and_counters_are_per_host(clock):
+    limiter = RateLimiter(1.0, host_rates={'www.komoot.com': 0.2})
+
+    limiter.record('https://www.komoot.com/smarttour/1', 200)
+    limiter.record('https://www.komoot.com/smarttour/2', 404)
+    limiter.record('https://www.sac-cas.ch/en/huts-and-tours/', 429)
+    limiter.record('https://www.sac-cas.ch/en/huts-and-tours/', 503)
+    limiter.success('https://schweizmobil.ch/de/wanderland/route-101')
+
+    stats = limiter.stats()
+    assert set(stats) == {'www.komoot.com', 'www.sac-cas.ch', 'schweizmobil.ch'}
+    assert (stats['www.komoot.com']['successes'], stats['www.komoot.com']['failures']) == (2, 0)
+    assert (stats['www.sac-cas.ch']['successes'], stats['www.sac-cas.ch']['failures']) == (0, 2)
+    assert stats['schweizmobil.ch']['successes'] == 1
+    assert stats['www.komoot.com']['rate'] == pytest.approx(0.24)
+    assert stats['www.sac-cas.ch']['rate'] == pytest.approx(0.25)
+    # the host of a request decides its bucket, not the rest of the url
+    assert limiter.bucket('https://www.komoot.com/discover') is limiter.bucket('https://www.komoot.com/guide')
+
+
+def test_concurrent_acquires_keep_the_rate():
+    rate = 1000.0
+    bucket = TokenBucket(rate, capacity=1)
+    start = monotonic()
+
+    threads = [threading.Thread(target=lambda: [bucket.acquire() for _ in range(25)]) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    # the first token is in the bucket, every further one takes 1 / rate seconds
+    assert monotonic() - start >= 199 / rate * 0.95
+    assert bucket.stats()['allowed'] == 200
@@ -0,0 +1,79 @@
+import csv
+
+from src.extractors.RecordWriter import RecordWriter
+
+fieldnames = ['id', 'title']
+
+
+def read(path):
+    with open(path, newline='', encoding='utf-8') as f:
+        return list(csv.DictReader(f))
+
+
+def test_resume_skips_journaled_keys_and_compact_keeps_the_last_record(tmp_path):
+    path = str(tmp_path / 'stage_1.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write('id,title\r\n1,old\r\n2,kept\r\n')
+
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    writer.write({'id': '1', 'title': 'first'})
+    writer.write({'id': '3', 'title': 'new'})
+    writer.close()
+
+    # an interrupted run is resumed with the keys of its journal
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    assert '1' in writer and '3' in writer and '2' not in writer
+    writer.write({'id': '1', 'title': 'second'})
+
+    assert writer.compact() == 3
+    assert read(path) == [{'id': '1', 'title': 'second'}, {'id': '2', 'title': 'kept'},
+                          {'id': '3', 'title': 'new'}]
+    assert not (tmp_path / 'stage_1.csv.part').exists()
+
+
+def test_resume_cuts_a_torn_last_record(tmp_path):
+    path = str(tmp_path / 'stage_1.csv')
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    writer.write({'id': '1', 'title': 'Lake loop'})
+    writer.write({'id': '2', 'title': 'Walk to Aare'})
+    writer.close()
+    # the run was killed while the last record was written
+    with open(path + '.part', 'r+b') as f:
+        f.truncate(f.seek(0, 2) - 5)
+
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    assert '1' in writer and '2' not in writer
+    writer.write({'id': '2', 'title': 'Walk to Aare'})
+    writer.close()
+
+    assert read(path + '.part') == [{'id': '1', 'title': 'Lake loop'}, {'id': '2', 'title': 'Walk to Aare'}]
+
+
+def test_resume_keeps_line_breaks_within_quoted_values(tmp_path):
+    path = str(tmp_path / 'stage_1.csv')
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    writer.write({'id': '1', 'title': 'Lake\nloop'})
+    writer.write({'id': '2', 'title': 'Walk "to"\nAare'})
+    writer.close()
+    with open(path + '.part', 'r+b') as f:
+        # the torn journal ends with the line break within the quoted title
+        f.truncate(f.seek(0, 2) - 7)
+
+    writer = RecordWriter(path, fieldnames, key='id', batch_size=1)
+    writer.close()
+
+    assert read(path + '.part') == [{'id': '1', 'title': 'Lake\nloop'}]
+
+
+def test_compact_follows_the_given_order_and_drops_other_keys(tmp_path):
+    path = str(tmp_path / 'GPX_start_end.csv')
+    with open(path, 'w', newline='', encoding='utf-8') as f:
+        f.write('id,title\r\n9,removed tour\r\n2,kept\r\n')
+    writer = RecordWriter(path, fieldnames, key='id')
+    # written in the order the concurrent fetches completed
+    for record in [{'id': 3, 'title': 'c'}, {'id': 1, 'title': 'a'}]:
+        writer.write(record)
+
+    # the input lists a tour once per link
+    assert writer.compact(order=[1, 2, 2, 3, 4]) == 3
+    assert [record['id'] for record in read(path)] == ['1', '2', '3']
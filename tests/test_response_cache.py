@@ -0,0 +1,107 @@
+import os
+import threading
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from unittest import mock
+
+import pytest
+import requests
+
+from src.extractors.ResponseCache import ResponseCache
+
+etag = '"v1"'
+
+
+class ValidatingHandler(BaseHTTPRequestHandler):
+    """Serves a body of 600 bytes per path with an ETag, a matching If-None-Match gets a 304."""
+
+    requests = []
+
+    def do_GET(self) -> None:
+        self.requests.append((self.path, self.headers.get('If-None-Match')))
+        if self.headers.get('If-None-Match') == etag:
+            self.send_response(304)
+            self.send_header('ETag', etag)
+            self.end_headers()
+            return
+        body = (self.path * 600).encode('utf-8')[:600]
+        self.send_response(200)
+        self.send_header('Content-Type', 'text/html; charset=utf-8')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('ETag', etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+
+@pytest.fixture
+def server_url():
+    ValidatingHandler.requests = []
+    server = ThreadingHTTPServer(('127.0.0.1', 0), ValidatingHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield 'http://127.0.0.1:{}'.format(server.server_port)
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def cache(tmp_path):
+    # 'fresh' pages never expire, 'stale' pages are revalidated on every read
+    cache = ResponseCache(str(tmp_path / 'cache'), ttls={'fresh': 3600, 'stale': 0})
+    yield cache
+    cache.close()
+
+
+def test_fresh_entry_is_served_from_disk(cache, server_url):
+    session = requests.Session()
+    first = cache.get(session, server_url + '/tour', 'fresh')
+    second = cache.get(session, server_url + '/tour', 'fresh')
+
+    assert not first.from_cache and second.from_cache
+    assert second.content == first.content
+    assert len(ValidatingHandler.requests) == 1
+    assert cache.stats()['hits'] == 1
+
+
+def test_expired_entry_is_revalidated_and_a_304_serves_the_stored_body(cache, server_url):
+    session = requests.Session()
+    first = cache.get(session, server_url + '/tour', 'stale')
+    second = cache.get(session, server_url + '/tour', 'stale')
+
+    assert second.from_cache and second.status_code == 200
+    assert second.content == first.content
+    assert ValidatingHandler.requests == [('/tour', None), ('/tour', etag)]
+    assert cache.stats()['revalidated'] == 1
+
+
+def test_evicted_body_is_fetched_again_after_a_304(cache, server_url):
+    session = requests.Session()
+    rate_limiter = mock.Mock()
+    first = cache.get(session, server_url + '/tour', 'stale')
+    os.remove(cache.object_path(cache.entry(server_url + '/tour')['digest']))
+
+    second = cache.get(session, server_url + '/tour', 'stale', rate_limiter=rate_limiter)
+
+    assert not second.from_cache and second.content == first.content
+    # the unconditional request is paced like the conditional one
+    assert ValidatingHandler.requests[1:] == [('/tour', etag), ('/tour', None)]
+    assert rate_limiter.acquire.call_count == 2 and rate_limiter.record.call_count == 2
+    assert cache.lookup(server_url + '/tour', 'fresh') == first.content
+
+
+def test_least_recently_read_entries_are_evicted_beyond_max_mb(tmp_path, server_url):
+    # room for two bodies of 600 bytes
+    cache = ResponseCache(str(tmp_path / 'cache'), max_mb=1300 / 1024 / 1024)
+    session = requests.Session()
+    cache.get(session, server_url + '/a')
+    cache.get(session, server_url + '/b')
+    cache.get(session, server_url + '/a')
+    cache.get(session, server_url + '/c')
+
+    assert cache.size <= cache.max_bytes
+    assert cache.entry(server_url + '/b') is None
+    assert cache.lookup(server_url + '/a') is not None and cache.lookup(server_url + '/c') is not None
+    assert sum(len(files) for _, _, files in os.walk(cache.objects_path)) == 2
+    cache.close()
@@ -0,0 +1,80 @@
+import csv
+import random
+import threading
+import time
+from collections import Counter
+
+from src.extractors.RetryQueue import RetryQueue
+
+
+def test_workers_drain_the_queue_with_random_failures(tmp_path):
+    dead_letter_path = str(tmp_path / 'dead_letter.csv')
+    good = ['https://www.komoot.com/smarttour/{}'.format(i) for i in range(200)]
+    bad = ['https://www.komoot.com/smarttour/bad-{}'.format(i) for i in range(5)]
+    queue = RetryQueue(good + bad, max_attempts=3, base_delay=0.001, max_delay=0.01,
+                       dead_letter_path=dead_letter_path)
+    rng = random.Random(0)
+    lock = threading.Lock()
+    done = Counter()
+    failed_once = set()
+
+    def worker():
+        while (link := queue.get()) is not None:
+            with lock:
+                # a good link fails at most once, a bad link always
+                fail = 'bad' in link or (link not in failed_once and rng.random() < 0.5)
+                if fail:
+                    failed_once.add(link)
+            if fail:
+                queue.retry(link, 'HTTP 503')
+            else:
+                with lock:
+                    done[link] += 1
+                queue.done(link)
+
+    threads = [threading.Thread(target=worker) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join(timeout=10)
+
+    assert not any(thread.is_alive() for thread in threads)
+    assert done == Counter(good)
+    assert sorted(queue.dead) == sorted(bad)
+    assert len(queue) == 0
+    with open(dead_letter_path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert sorted(row['link'] for row in rows) == sorted(bad)
+    assert {(row['attempts'], row['error']) for row in rows} == {('3', 'HTTP 503')}
+
+
+def test_close_unblocks_waiting_workers():
+    queue = RetryQueue(['https://www.komoot.com/smarttour/1'])
+    # the link stays in flight, the next get waits for it to be done or to come back
+    assert queue.get() == 'https://www.komoot.com/smarttour/1'
+    results = []
+    waiter = threading.Thread(target=lambda: results.append(queue.get()))
+    waiter.start()
+    time.sleep(0.05)
+    assert waiter.is_alive()
+
+    queue.close()
+    waiter.join(timeout=2)
+
+    assert not waiter.is_alive()
+    assert results == [None]
+
+
+def test_failed_link_comes_back_after_its_backoff():
+    queue = RetryQueue(['a', 'b'], base_delay=0.05, jitter=0)
+    assert queue.get() == 'a'
+    assert queue.retry('a', 'timeout')
+    # the other links go first while the failed one waits
+    assert queue.get() == 'b'
+    queue.done('b')
+    start = time.monotonic()
+
+    assert queue.get() == 'a'
+    assert time.monotonic() - start >= 0.04
+    queue.done('a')
+    assert queue.get() is None
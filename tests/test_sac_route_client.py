@@ -0,0 +1,50 @@
+import glob
+import json
+import os
+
+import pandas as pd
+import pytest
+
+from src.extractors.SacRouteClient import SacRouteClient
+
+# route JSON as written by SacRouteClient to its json_folder, named SAC-<tour id>.json
+fixture_paths = sorted(glob.glob(os.path.join(os.path.dirname(__file__), 'fixtures', 'sac', 'SAC-*.json')))
+sac_data_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'extractors', 'sac', 'data',
+                             'SAC_data_without_index0.csv')
+
+
+@pytest.fixture(scope='module')
+def sac_data():
+    return pd.read_csv(sac_data_path, sep=';', dtype=str, keep_default_na=False).set_index('tour_id', drop=False)
+
+
+@pytest.mark.parametrize('path', fixture_paths, ids=os.path.basename)
+def test_to_record_reproduces_scraped_row(path, sac_data):
+    tour_id = os.path.basename(path)[len('SAC-'):-len('.json')]
+    with open(path, encoding='utf-8') as f:
+        data = json.load(f)
+    expected = sac_data.loc[tour_id].to_dict()
+
+    assert SacRouteClient.to_record(expected['link'], data) == expected
+
+
+def test_to_record_rejects_payload_without_route():
+    with pytest.raises(ValueError, match='segments'):
+        SacRouteClient.to_record('https://www.sac-cas.ch/en/tour-1/', {'title': 'Not a route'})
+
+
+def test_error_record_matches_dead_tour_page_row(sac_data):
+    expected = sac_data.loc['1864'].to_dict()
+
+    assert SacRouteClient.error_record(expected['link']) == expected
+    assert SacRouteClient.error_record('https://www.sac-cas.ch/en/tour/')['tour_id'] == 'na'
+
+
+def test_check_records_rejects_column_without_values(sac_data):
+    records = sac_data.head(50).to_dict('records')
+    SacRouteClient.check_records(records)
+
+    for record in records:
+        record['difficulty'] = 'na'
+    with pytest.raises(ValueError, match='difficulty'):
+        SacRouteClient.check_records(records)
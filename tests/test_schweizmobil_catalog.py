@@ -0,0 +1,51 @@
+import os
+
+import pandas as pd
+import pytest
+
+from src.extractors.SchweizmobilCatalog import SchweizmobilCatalog
+
+# payloads as recorded by SchweizmobilCatalog.add, replayed with load
+fixture_folder = os.path.join(os.path.dirname(__file__), 'fixtures', 'schweizmobil')
+stage1_path = os.path.join(os.path.dirname(__file__), '..', 'src', 'extractors', 'schweizmobil',
+                           'schweizmobil_stage_1.csv')
+
+
+@pytest.fixture(scope='module')
+def routes():
+    catalog = SchweizmobilCatalog()
+    catalog.load(fixture_folder)
+    return catalog.routes()
+
+
+def test_replayed_routes_match_stage1_rows(routes):
+    stage1 = pd.read_csv(stage1_path, dtype=str, keep_default_na=False).set_index('url', drop=False)
+    base_url = 'https://schweizmobil.ch/de/wanderland/'
+    expected = [base_url + url for url in ['route-101', 'route-102', 'route-22/etappe-1', 'route-22/etappe-2',
+                                           'route-22/etappe-3']]
+
+    assert [route['url'] for route in routes] == expected
+    for route in routes:
+        assert {column: value or '' for column, value in route.items()} == stage1.loc[route['url']].to_dict()
+
+
+def test_replayed_routes_skip_links_without_route_url_or_facts(routes):
+    urls = {route['url'] for route in routes}
+
+    assert not urls & {'https://schweizmobil.ch/de/wanderland', 'https://schweizmobil.ch/route-998',
+                       'https://schweizmobil.ch/de/wanderland/route-997',
+                       'https://schweizmobil.ch/de/wanderland/route-22'}
+    assert not any(route['name'] == 'Route ohne url' for route in routes)
+
+
+@pytest.mark.parametrize('column, value, expected', [
+    ('distance', 20350, '20 km'),
+    ('distance', 150, '0 km'),
+    ('altitude_up', 1050, '1’050 m'),
+    ('duration', 324, '5 h 24 min'),
+    ('duration', 180, '3 h'),
+    ('duration', '2024-05-01T10:00:00Z', None),
+    ('difficulty_level', 'leicht (Wanderweg)', 'leicht (Wanderweg)'),
+])
+def test_format_writes_facts_like_the_route_pages(column, value, expected):
+    assert SchweizmobilCatalog.format(column, value) == expected
@@ -0,0 +1,21 @@
+import pandas as pd
+
+from src.transformers.UnitNormalizer import UnitNormalizer
+
+
+def test_meters_with_fractional_part_are_reported():
+    df = pd.DataFrame({'altitude_up': ['1’234 m', "1'234 m", '1,234 m', '1.234 m', '1.5 km', '460 m', None]})
+    normalizer = UnitNormalizer()
+
+    result = normalizer.normalize(df, {'altitude_up': 'm'})
+
+    assert result['altitude_up'].tolist() == [1234, 1234, pd.NA, pd.NA, 1500, 460, pd.NA]
+    assert normalizer.issues == [('altitude_up', '1,234 m'), ('altitude_up', '1.234 m')]
+
+
+def test_kilometers_keep_their_fraction():
+    df = pd.DataFrame({'distance': ['12.5 km', '12,5 km', '800 m']})
+
+    result = UnitNormalizer().normalize(df, {'distance': 'km'})
+
+    assert result['distance'].tolist() == [12.5, 12.5, 0.8]